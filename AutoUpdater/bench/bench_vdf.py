@@ -0,0 +1,139 @@
+"""
+Benchmark of reading build IDs from a large steamcmd app_info_print dump:
+the old line scanner (one scan per branch), vdf.query (all branches in one
+pass) and a full vdf.parse, plus reading TargetBuildID from an appmanifest.
+
+Usage: python bench/bench_vdf.py [--depots N] [--branches N] [--seconds S]
+"""
+
+import argparse
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import update_checker  # noqa: E402
+import vdf  # noqa: E402
+
+
+def make_app_info(depot_count, branch_count):
+    """Builds app_info_print output shaped like steamcmd's, with many depots and branches."""
+    lines = [
+        "Redirecting stderr to '/home/steam/Steam/logs/stderr.txt'",
+        "Loading Steam API...OK",
+        "AppID : 3930080, change number : 31337/0, last change : Fri Oct 17 12:00:00 2026",
+        '"3930080"', "{",
+        '\t"common"', "\t{",
+        '\t\t"name"\t\t"Nuclear Option Dedicated Server"',
+        '\t\t"type"\t\t"Tool"',
+        "\t}",
+        '\t"depots"', "\t{",
+    ]
+    for depot in range(depot_count):
+        lines += [
+            f'\t\t"{3930081 + depot}"', "\t\t{",
+            '\t\t\t"config"', "\t\t\t{", '\t\t\t\t"oslist"\t\t"linux"', "\t\t\t}",
+            '\t\t\t"manifests"', "\t\t\t{",
+        ]
+        for branch in range(branch_count):
+            lines += [
+                f'\t\t\t\t"branch{branch}"', "\t\t\t\t{",
+                f'\t\t\t\t\t"gid"\t\t"{1234567890123456789 + branch}"',
+                f'\t\t\t\t\t"size"\t\t"{4000000000 + depot}"',
+                f'\t\t\t\t\t"download"\t\t"{1000000000 + depot}"',
+                "\t\t\t\t}",
+            ]
+        lines += ["\t\t\t}", "\t\t}"]
+    lines += ['\t\t"branches"', "\t\t{"]
+    for branch in range(branch_count):
+        lines += [
+            f'\t\t\t"branch{branch}"', "\t\t\t{",
+            f'\t\t\t\t"buildid"\t\t"{20000000 + branch}"',
+            f'\t\t\t\t"description"\t\t"Branch {branch} \\"testing\\""',
+            '\t\t\t\t"timeupdated"\t\t"1760000000"',
+            "\t\t\t}",
+        ]
+    lines += ["\t\t}", "\t}", "}", "Unloading Steam API...OK"]
+    return "\n".join(lines) + "\n"
+
+
+def legacy_parse_build_id(app_info, branch):
+    """The line scanner update_checker used before vdf.py, without its error printing."""
+    in_branches_section = False
+    in_target_branch_section = False
+    for line in app_info.splitlines():
+        stripped_line = line.strip()
+        if not in_branches_section:
+            if stripped_line == '"branches"':
+                in_branches_section = True
+            continue
+        if not in_target_branch_section:
+            if stripped_line == f'"{branch}"':
+                in_target_branch_section = True
+            continue
+        if '"buildid"' in stripped_line:
+            match = re.search(r'"buildid"\s+"(\d+)"', stripped_line)
+            if match:
+                return match.group(1)
+        if stripped_line == '}':
+            break
+    return None
+
+
+def rate(function, seconds):
+    """Calls function repeatedly for about seconds and returns calls per second."""
+    calls = 0
+    batch = 1
+    started = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            function()
+        calls += batch
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return calls / elapsed
+        batch *= 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--depots', type=int, default=20, help="depots in the app_info dump")
+    parser.add_argument('--branches', type=int, default=50, help="branches in the app_info dump")
+    parser.add_argument('--seconds', type=float, default=1.0, help="time spent on each case")
+    args = parser.parse_args()
+
+    app_info = make_app_info(args.depots, args.branches)
+    branches = [f"branch{i}" for i in range(args.branches)]
+    print(f"app_info dump: {len(app_info) / 1024:.0f} KiB, {args.depots} depots, {args.branches} branches")
+
+    expected = {branch: legacy_parse_build_id(app_info, branch) for branch in branches}
+    assert update_checker.parse_build_ids(app_info) == expected
+
+    cases = {
+        "legacy, one branch": lambda: legacy_parse_build_id(app_info, branches[-1]),
+        "legacy, every branch": lambda: [legacy_parse_build_id(app_info, branch) for branch in branches],
+        "vdf.query, every branch": lambda: update_checker.parse_build_ids(app_info),
+        "vdf.parse, full tree": lambda: vdf.parse(update_checker.app_info_vdf(app_info)),
+    }
+    for name, function in cases.items():
+        per_second = rate(function, args.seconds)
+        print(f"{name:<26} {per_second:>10.1f}/s {1000 / per_second:>9.3f} ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        manifest_path = os.path.join(directory, "appmanifest_3930080.acf")
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            f.write('"AppState"\n{\n\t"appid"\t\t"3930080"\n\t"buildid"\t\t"20000000"\n'
+                    '\t"TargetBuildID"\t\t"20000000"\n\t"InstalledDepots"\n\t{\n')
+            for depot in range(args.depots):
+                f.write(f'\t\t"{3930081 + depot}"\n\t\t{{\n\t\t\t"manifest"\t\t"{1234567890 + depot}"\n'
+                        f'\t\t\t"size"\t\t"{4000000000 + depot}"\n\t\t}}\n')
+            f.write("\t}\n}\n")
+        per_second = rate(lambda: update_checker.get_local_build_id(manifest_path), args.seconds)
+        print(f"{'appmanifest TargetBuildID':<26} {per_second:>10.1f}/s {1000 / per_second:>9.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Fuzzer for vdf.py. Generates random KeyValues trees and large app_info dumps,
+writes them with random formatting, feeds them to the parser in random chunk
+sizes and checks parse, query and first against the tree; then mutates the
+text at random and checks nothing but VDFError is ever raised and chunking
+never changes the result.
+
+Usage: python bench/fuzz_vdf.py [--iterations N] [--seed S]
+"""
+
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import update_checker  # noqa: E402
+import vdf  # noqa: E402
+from bench_vdf import legacy_parse_build_id, make_app_info  # noqa: E402
+
+KEY_CHARS = "abcdefgAB0123_ .-"
+VALUE_CHARS = KEY_CHARS + '"\\\n\t{}/[]$'
+
+
+def random_string(rng, chars, max_length):
+    return "".join(rng.choice(chars) for _ in range(rng.randint(0, max_length)))
+
+
+def random_tree(rng, depth=0):
+    """A random dict of unique (case-insensitively) keys with str or dict values."""
+    tree = {}
+    seen = set()
+    for _ in range(rng.randint(0, 6)):
+        key = random_string(rng, KEY_CHARS, 8)
+        if key.lower() in seen:
+            continue
+        seen.add(key.lower())
+        if depth < 4 and rng.random() < 0.35:
+            tree[key] = random_tree(rng, depth + 1)
+        else:
+            tree[key] = random_string(rng, VALUE_CHARS, 12)
+    return tree
+
+
+def quote(value):
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n').replace('\t', '\\t') + '"'
+
+
+def space(rng):
+    return rng.choice([" ", "\t", "\n", "\t\t", "\n\t", " // comment\n", "\r\n"])
+
+
+def write(rng, tree, out, depth=0):
+    """Writes tree as KeyValues with random whitespace, comments and conditionals."""
+    for key, value in tree.items():
+        out.append(space(rng) + quote(key) + space(rng))
+        if isinstance(value, dict):
+            out.append("{")
+            write(rng, value, out, depth + 1)
+            out.append(space(rng) + "}")
+        else:
+            out.append(quote(value))
+            if rng.random() < 0.05:
+                out.append(" [$WIN32]")
+    out.append(space(rng))
+
+
+def chunked(rng, text):
+    """Splits text into random sized chunks, including empty and one character ones."""
+    chunks = []
+    position = 0
+    while position < len(text):
+        size = rng.choice([0, 1, 2, 7, 64, 4096])
+        chunks.append(text[position:position + size])
+        position += size
+    return chunks
+
+
+def paths(tree, prefix=()):
+    for key, value in tree.items():
+        yield prefix + (key,), value
+        if isinstance(value, dict):
+            yield from paths(value, prefix + (key,))
+
+
+def check_tree(rng):
+    tree = random_tree(rng)
+    out = []
+    write(rng, tree, out)
+    text = "".join(out)
+
+    assert vdf.parse(text) == tree, text
+    assert vdf.parse(iter(chunked(rng, text))) == tree, text
+
+    every = list(paths(tree))
+    if not every:
+        return
+    path, value = rng.choice(every)
+    pattern = "/".join("*" if rng.random() < 0.3 else key.upper() for key in path)
+    expected = [(match_path, match) for match_path, match in vdf._walk(tree, vdf._compile(pattern), ())]
+    found = [(match_path, match)
+             for _, match_path, match in vdf.query(iter(chunked(rng, text)), [pattern])]
+    assert sorted(map(repr, found)) == sorted(map(repr, expected)), (pattern, text)
+    assert vdf.first(text, pattern) in [match for _, match in expected]
+
+
+def check_app_info(rng):
+    depots = rng.randint(1, 40)
+    branches = rng.randint(1, 80)
+    app_info = make_app_info(depots, branches)
+    expected = {f"branch{i}": legacy_parse_build_id(app_info, f"branch{i}") for i in range(branches)}
+    assert update_checker.parse_build_ids(app_info) == expected
+    tree = vdf.parse(iter(chunked(rng, update_checker.app_info_vdf(app_info))))
+    assert len(tree["3930080"]["depots"]) == depots + 1
+
+
+def check_mutation(rng):
+    tree = random_tree(rng)
+    out = []
+    write(rng, tree, out)
+    text = list("".join(out) or '"a" "b"')
+    for _ in range(rng.randint(1, 4)):
+        position = rng.randrange(len(text) + 1)
+        action = rng.random()
+        if action < 0.4:
+            text.insert(position, rng.choice('"{}\\/\n '))
+        elif action < 0.7 and position < len(text):
+            del text[position]
+        elif position < len(text):
+            text[position] = rng.choice('"{}\\')
+    text = "".join(text)
+    results = []
+    for source in (text, iter(chunked(rng, text))):
+        try:
+            results.append(vdf.parse(source))
+        except vdf.VDFError as e:
+            results.append(type(e))
+    # chunk boundaries must never change the result
+    assert results[0] == results[1], text
+    try:
+        list(vdf.query(text, ["*/*", "a/*/b"]))
+    except vdf.VDFError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    seed = args.seed if args.seed is not None else random.randrange(2 ** 32)
+    print(f"Fuzzing vdf.py with seed {seed}")
+    rng = random.Random(seed)
+    for iteration in range(args.iterations):
+        check_tree(rng)
+        check_mutation(rng)
+        if iteration % 50 == 0:
+            check_app_info(rng)
+    print(f"{args.iterations} iterations passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+
+# inotify event flags from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+
+# The directory is watched rather than the file, because steam may replace the manifest
+WATCH_MASK = (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR)
+
+_EVENT = struct.Struct('iIII')
+
+
+def _load_inotify():
+    """Returns libc if it has inotify, otherwise None."""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or None, use_errno=True)
+        libc.inotify_init1
+        libc.inotify_add_watch
+        libc.inotify_rm_watch
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+def _signature(path):
+    """Returns what stat says about path, changing whenever the file is rewritten or replaced."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class ManifestWatcher:
+    """
+    Caches the TargetBuildID of appmanifest files and only parses them again
+    after they change. Uses inotify on each manifest's directory when it is
+    available and falls back to comparing mtime/size from stat every
+    poll_interval seconds otherwise (or while the directory doesn't exist yet).
+
+    on_change(manifest_path, old_build_id, new_build_id) is called from the
+    watcher thread whenever a manifest's build ID changes, for example after
+    steamcmd app_update finishes.
+    """
+
+    def __init__(self, parse, on_change=None, poll_interval=5):
+        self.parse = parse
+        self.on_change = on_change
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        # manifest path -> [stat signature, cached build id, last known build id]
+        self._manifests = {}
+        # inotify watch descriptor -> directory, and directory -> watch descriptor
+        self._watched_dirs = {}
+        self._dir_watches = {}
+        self._libc = _load_inotify()
+        self._fd = None
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+            else:
+                print(f"inotify unavailable ({os.strerror(ctypes.get_errno())}), polling manifests instead.")
+        self._wake_read, self._wake_write = os.pipe()
+        self._closed = False
+        self._thread = None
+
+    @property
+    def using_inotify(self):
+        return self._fd is not None
+
+    def watch(self, manifest_path):
+        """Starts watching manifest_path and parses it once."""
+        manifest_path = os.path.abspath(manifest_path)
+        with self._lock:
+            if manifest_path in self._manifests:
+                return
+            build_id = self.parse(manifest_path)
+            self._manifests[manifest_path] = [_signature(manifest_path), build_id, build_id]
+            self._add_dir_watch(os.path.dirname(manifest_path))
+
+    def build_id(self, manifest_path):
+        """
+        Returns the cached build ID of a watched manifest. Without an inotify
+        watch on its directory the file is stat-ed and only parsed again if it changed.
+        """
+        manifest_path = os.path.abspath(manifest_path)
+        if manifest_path not in self._manifests:
+            self.watch(manifest_path)
+        if os.path.dirname(manifest_path) not in self._dir_watches:
+            self._refresh(manifest_path, check_signature=True)
+        return self._manifests[manifest_path][1]
+
+    def start(self):
+        """Starts the background thread that handles inotify events and stat polling."""
+        self._thread = threading.Thread(target=self._run, name="manifest-watcher", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Stops the watcher thread and closes the inotify descriptor."""
+        if self._closed:
+            return
+        self._closed = True
+        os.write(self._wake_write, b'x')
+        if self._thread is not None:
+            self._thread.join()
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        os.close(self._wake_read)
+        os.close(self._wake_write)
+
+    def _add_dir_watch(self, directory):
+        if self._fd is None or directory in self._dir_watches:
+            return
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            # usually the directory doesn't exist yet, stat polling covers it until it does
+            return
+        self._watched_dirs[wd] = directory
+        self._dir_watches[directory] = wd
+
+    def _refresh(self, manifest_path, check_signature=False):
+        """Parses the manifest again (if its stat changed when check_signature) and reports a new build."""
+        with self._lock:
+            entry = self._manifests[manifest_path]
+            signature = _signature(manifest_path)
+            if check_signature and signature == entry[0]:
+                return
+            build_id = self.parse(manifest_path)
+            entry[0] = signature
+            entry[1] = build_id
+            old_build_id = entry[2]
+            # a missing or half written manifest isn't a change of build
+            if not build_id or build_id == old_build_id:
+                return
+            entry[2] = build_id
+        if self.on_change is not None:
+            self.on_change(manifest_path, old_build_id, build_id)
+
+    def _run(self):
+        readable = [self._wake_read] + ([self._fd] if self._fd is not None else [])
+        while not self._closed:
+            ready, _, _ = select.select(readable, [], [], self.poll_interval)
+            if self._closed:
+                return
+            if self._fd is not None and self._fd in ready:
+                self._read_events()
+            self._poll_unwatched()
+
+    def _read_events(self):
+        try:
+            data = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        changed = set()
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+            offset += _EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # events were lost, check everything
+                changed.update(self._manifests)
+                continue
+            directory = self._watched_dirs.get(wd)
+            if directory is None:
+                continue
+            if mask & (IN_IGNORED | IN_DELETE_SELF | IN_MOVE_SELF):
+                # the directory went away, stat polling takes over until it is back
+                if mask & IN_MOVE_SELF:
+                    self._libc.inotify_rm_watch(self._fd, wd)
+                with self._lock:
+                    del self._watched_dirs[wd]
+                    del self._dir_watches[directory]
+                changed.update(path for path in self._manifests if os.path.dirname(path) == directory)
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if path in self._manifests:
+                changed.add(path)
+
+        for path in changed:
+            self._refresh(path)
+
+    def _poll_unwatched(self):
+        for path in list(self._manifests):
+            directory = os.path.dirname(path)
+            if directory in self._dir_watches:
+                continue
+            with self._lock:
+                self._add_dir_watch(directory)
+            self._refresh(path, check_signature=directory not in self._dir_watches)
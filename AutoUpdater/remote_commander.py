@@ -21,6 +21,7 @@ class StatusCode(IntEnum):
 
     InternalServerError = 5000
     CommandError = 5001
+    ConfigError = 5002
 
 
 class RemoteCommander:
@@ -29,9 +30,10 @@ class RemoteCommander:
     with built-in protocol handling for the response header (status/length).
     """
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, timeout: Optional[float] = None):
         self.host = host
         self.port = port
+        self.timeout = timeout
 
     def send_command(self, command_name: str, arguments: List[str] = []) -> Tuple[str, Optional[Dict]]:
         """
@@ -48,6 +50,7 @@ class RemoteCommander:
             message = struct.pack('<i', len(json_data)) + json_data
 
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.settimeout(self.timeout)
                 s.connect((self.host, self.port))
                 s.sendall(message)
 
@@ -0,0 +1,173 @@
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from remote_commander import RemoteCommander
+
+# How servers are picked: fewest players first, least mission time left first, or config order
+ORDERS = ("players", "time_left", "config")
+
+DEFAULT_WARNING_MESSAGE = "<color=#ff0000><b>Server update:</b></color> restarting in {time}."
+
+# Seconds to wait for a game server to answer a status command
+STATUS_TIMEOUT = 5
+
+
+def format_duration(seconds):
+    """Formats a warning lead time like "5 minutes" or "30 seconds"."""
+    if seconds >= 60 and seconds % 60 == 0:
+        minutes = seconds // 60
+        return f"{minutes} minute{'s' if minutes != 1 else ''}"
+    return f"{seconds} second{'s' if seconds != 1 else ''}"
+
+
+def server_load(port):
+    """
+    Returns (players, seconds of mission time left) for the server on port,
+    or None if it doesn't answer. The game reports 0 for both times on an empty server.
+    """
+    commander = RemoteCommander("localhost", port, timeout=STATUS_TIMEOUT)
+    status_code, players = commander.send_command("get-player-list")
+    if status_code != "Success":
+        return None
+    status_code, mission_time = commander.send_command("get-mission-time")
+    time_left = 0
+    if status_code == "Success" and mission_time:
+        time_left = max(0, mission_time.get('maxTime', 0) - mission_time.get('currentTime', 0))
+    return len((players or {}).get('Players') or []), time_left
+
+
+def is_listening(port):
+    """Returns True if something accepts connections on port."""
+    try:
+        with socket.create_connection(("localhost", port), timeout=STATUS_TIMEOUT):
+            return True
+    except OSError:
+        return False
+
+
+class RollingUpdate:
+    """
+    Rolls an update through several servers a few at a time instead of
+    restarting them all at once, so their steamcmd app_update runs don't
+    fight over disk and network.
+
+    Before each pick the waiting servers are ranked by order using
+    get-player-list and get-mission-time. Players on a server get chat
+    warnings at each of warnings (seconds before restart), then the server
+    gets update-ready. The slot is freed once the server stopped accepting
+    connections, local_build_id(manifest_path) shows the new build and the
+    server accepts connections again, or after restart_timeout seconds.
+    """
+
+    def __init__(self, local_build_id, concurrency=1, order="players", warnings=(300, 60, 10),
+                 warning_message=DEFAULT_WARNING_MESSAGE, restart_timeout=900, check_interval=1):
+        if order not in ORDERS:
+            raise ValueError(f"Unknown rolling update order '{order}', expected one of {', '.join(ORDERS)}.")
+        self.local_build_id = local_build_id
+        self.concurrency = max(1, concurrency)
+        self.order = order
+        self.warnings = sorted(set(warnings), reverse=True)
+        self.warning_message = warning_message
+        self.restart_timeout = restart_timeout
+        self.check_interval = check_interval
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stops starting new restarts and cuts the current waits short."""
+        self._stop.set()
+
+    def rank(self, outdated):
+        """
+        Returns outdated sorted by order, best candidate first.
+        Servers that don't answer go first, restarting them bothers nobody.
+        """
+        if self.order == "config":
+            return list(outdated)
+        with ThreadPoolExecutor(max_workers=len(outdated)) as executor:
+            loads = list(executor.map(
+                lambda item: server_load(item[0].remote_command_port), outdated))
+
+        def key(index):
+            load = loads[index]
+            if load is None:
+                return (0, 0, index)
+            players, time_left = load
+            if self.order == "time_left":
+                return (time_left, players, index)
+            return (players, time_left, index)
+
+        return [outdated[index] for index in sorted(range(len(outdated)), key=key)]
+
+    def run(self, outdated, prepare=None):
+        """
+        Updates every (install, build_id) in outdated, at most concurrency at a time.
+        prepare(install, build_id) is called right before each update-ready, if given.
+        Returns the installs that were told to update.
+        """
+        remaining = list(outdated)
+        updated = []
+        print(f"Rolling update of {len(remaining)} server(s), {self.concurrency} at a time, "
+              f"ordered by {self.order}.")
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            running = set()
+            while (remaining or running) and not self._stop.is_set():
+                while remaining and len(running) < self.concurrency:
+                    # rank again before every pick, players come and go during a long rollout
+                    install, build_id = self.rank(remaining)[0]
+                    remaining.remove((install, build_id))
+                    running.add(executor.submit(self.update_server, install, build_id, prepare))
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    install = future.result()
+                    if install is not None:
+                        updated.append(install)
+            for future in running:
+                install = future.result()
+                if install is not None:
+                    updated.append(install)
+        print(f"Rolling update finished, {len(updated)} of {len(outdated)} server(s) updated.")
+        return updated
+
+    def update_server(self, install, build_id, prepare=None):
+        """
+        Warns the players, sends update-ready and waits for the restart.
+        Returns install if update-ready was sent, otherwise None.
+        """
+        port = install.remote_command_port
+        commander = RemoteCommander("localhost", port, timeout=STATUS_TIMEOUT)
+
+        load = server_load(port)
+        if load is not None and load[0] > 0:
+            print(f"Port {port}: {load[0]} player(s) online, warning before restart.")
+            for index, lead_time in enumerate(self.warnings):
+                commander.send_command("send-chat-message",
+                                       [self.warning_message.format(time=format_duration(lead_time))])
+                next_lead_time = self.warnings[index + 1] if index + 1 < len(self.warnings) else 0
+                if self._stop.wait(lead_time - next_lead_time):
+                    return None
+
+        if prepare is not None:
+            prepare(install, build_id)
+        status_code, _ = commander.send_command("update-ready")
+        if status_code != "Success":
+            print(f"Port {port}: update-ready failed with status: {status_code}")
+            return None
+        with install.lock:
+            install.notified_build_id = build_id
+        print(f"Port {port}: Told to update to build {build_id}, waiting for it to come back.")
+
+        # the manifest may already show the new build when it was staged, so wait for the restart too
+        went_down = False
+        deadline = time.monotonic() + self.restart_timeout
+        while not self._stop.wait(self.check_interval):
+            if not is_listening(port):
+                went_down = True
+            elif went_down and self.local_build_id(install.manifest_path) == build_id:
+                print(f"Port {port}: Back up on build {build_id}.")
+                return install
+            if time.monotonic() >= deadline:
+                print(f"Port {port}: Not back on build {build_id} after {self.restart_timeout} seconds, moving on.")
+                return install
+        return install
@@ -0,0 +1,112 @@
+import os
+import re
+import subprocess
+import threading
+import time
+
+STEAMCMD_PATH = "/usr/games/steamcmd"
+
+# steamcmd prints this when it is ready for the next command
+PROMPT = "Steam>"
+
+# strips the color codes steamcmd adds around its prompt
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*m')
+
+
+class SteamCmdError(Exception):
+    """Raised when the steamcmd session dies or does not answer in time."""
+
+
+class SteamCmdSession:
+    """
+    Keeps one steamcmd process logged in and sends it commands over stdin,
+    so each update check doesn't pay for starting steamcmd and logging in again.
+    """
+
+    def __init__(self, install_dir, steamcmd_path=STEAMCMD_PATH, timeout=120):
+        self.install_dir = install_dir
+        self.steamcmd_path = steamcmd_path
+        self.timeout = timeout
+        self._process = None
+        self._output = ""
+        self._output_changed = threading.Condition()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._process is not None and self._process.poll() is None
+
+    def start(self):
+        """Starts steamcmd, logs in anonymously and waits for the first prompt."""
+        self.close()
+        print("Starting steamcmd session...")
+        self._output = ""
+        self._process = subprocess.Popen(
+            [self.steamcmd_path,
+             "+force_install_dir", self.install_dir,
+             "+login", "anonymous"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            cwd=self.install_dir)
+        threading.Thread(target=self._read_output, args=(self._process,),
+                         name="steamcmd-output", daemon=True).start()
+        self._wait_for_prompt()
+        print("steamcmd session ready.")
+
+    def run(self, command):
+        """Sends one command and returns everything it printed before the next prompt."""
+        with self._lock:
+            if not self.running:
+                self.start()
+            with self._output_changed:
+                self._output = ""
+            try:
+                self._process.stdin.write(f"{command}\n".encode('utf-8'))
+                self._process.stdin.flush()
+            except OSError as e:
+                self.close()
+                raise SteamCmdError(f"Could not send command to steamcmd: {e}")
+            return self._wait_for_prompt()
+
+    def app_info(self, app_id):
+        """Refreshes steamcmd's app info cache and returns the app_info_print output for app_id."""
+        self.run("app_info_update 1")
+        return self.run(f"app_info_print {app_id}")
+
+    def close(self):
+        """Asks steamcmd to quit, killing it if it doesn't."""
+        process, self._process = self._process, None
+        if process is None or process.poll() is not None:
+            return
+        try:
+            process.stdin.write(b"quit\n")
+            process.stdin.flush()
+            process.wait(timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+            process.wait()
+
+    def _read_output(self, process):
+        fd = process.stdout.fileno()
+        while True:
+            chunk = os.read(fd, 65536)
+            with self._output_changed:
+                if not chunk:
+                    self._output_changed.notify_all()
+                    return
+                self._output += chunk.decode('utf-8', errors='ignore')
+                self._output_changed.notify_all()
+
+    def _wait_for_prompt(self):
+        deadline = time.monotonic() + self.timeout
+        with self._output_changed:
+            while True:
+                output = ANSI_ESCAPE.sub('', self._output)
+                if output.rstrip().endswith(PROMPT):
+                    return output.rstrip()[:-len(PROMPT)]
+                if not self.running:
+                    raise SteamCmdError("steamcmd exited unexpectedly.")
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.close()
+                    raise SteamCmdError("Timed out waiting for steamcmd.")
+                self._output_changed.wait(min(remaining, 1.0))
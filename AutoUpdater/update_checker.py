@@ -1,17 +1,37 @@
+import argparse
 import json
 import subprocess
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from remote_commander import RemoteCommander
+from manifest_watcher import ManifestWatcher
+from rolling_update import DEFAULT_WARNING_MESSAGE, STATUS_TIMEOUT, RollingUpdate
+from steamcmd_session import SteamCmdError, SteamCmdSession
+from update_stager import UpdateStager
+import vdf
+
+# KeyValues paths of the branch build IDs in app_info and the installed build in appmanifest
+BRANCH_BUILD_IDS = "*/depots/branches/*/buildid"
+MANIFEST_BUILD_ID = "AppState/TargetBuildID"
 
 
 def get_latest_build_id(app_id, branch, install_dir):
     """
     Gets the latest build ID for a given app and branch from SteamCMD.
     """
-    if not branch:
-        branch = "public"
+    app_info = fetch_app_info(app_id, install_dir)
+    if app_info is None:
+        return None
+    return parse_build_id(app_info, branch)
 
+
+def fetch_app_info(app_id, install_dir):
+    """
+    Runs steamcmd once and returns its app_info_print output, or None if steamcmd failed.
+    """
     try:
         command = [
             "/usr/games/steamcmd",
@@ -22,49 +42,56 @@ def get_latest_build_id(app_id, branch, install_dir):
         ]
         process = subprocess.run(
             command, capture_output=True, text=True, check=True, encoding='utf-8', cwd=install_dir)
+        return process.stdout
 
-        lines = process.stdout.splitlines()
-        in_branches_section = False
-        in_target_branch_section = False
+    except (subprocess.CalledProcessError, FileNotFoundError) as e:
+        print(f"Error running steamcmd: {e}")
+        print("Please ensure steamcmd is installed and in your system's PATH.")
+        return None
 
-        for line in lines:
-            # print(line)
-            stripped_line = line.strip()
 
-            if not in_branches_section:
-                if stripped_line == '"branches"':
-                    in_branches_section = True
-                continue
+def parse_build_ids(app_info):
+    """
+    Finds the build ID of every branch in steamcmd app_info_print output in one pass.
+    Returns a dict of branch name -> build ID.
+    """
+    build_ids = {}
+    try:
+        for _, path, build_id in vdf.query(app_info_vdf(app_info), [BRANCH_BUILD_IDS]):
+            build_ids[path[-2]] = build_id
+    except vdf.VDFError as e:
+        print(f"Could not parse app_info: {e}")
+    return build_ids
 
-            # We are inside the "branches" section.
-            if not in_target_branch_section:
-                if stripped_line == f'"{branch}"':
-                    in_target_branch_section = True
-                continue
 
-            # We are inside the target branch's section.
-            if '"buildid"' in stripped_line:
-                match = re.search(r'"buildid"\s+"(\d+)"', stripped_line)
-                if match:
-                    return match.group(1)
+def app_info_vdf(app_info):
+    """
+    Cuts the KeyValues document out of app_info_print output,
+    dropping the log lines steamcmd prints around it.
+    """
+    start = re.search(r'^\s*"', app_info, re.MULTILINE)
+    end = app_info.rfind('}')
+    if start is None or end < start.start():
+        return ""
+    return app_info[start.start():end + 1]
 
-            # If we see a '}' this could be the end of our section.
-            if stripped_line == '}':
-                # We were in the target branch, but we're leaving.
-                # The buildid was not found.
-                if in_target_branch_section:
-                    break
 
-        print(
-            f"Could not find build ID for branch '{branch}'. full result below:")
-        for line in lines:
-            print(line)
-        return None
+def parse_build_id(app_info, branch):
+    """
+    Finds the build ID of a branch in steamcmd app_info_print output.
+    """
+    if not branch:
+        branch = "public"
 
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        print(f"Error running steamcmd: {e}")
-        print("Please ensure steamcmd is installed and in your system's PATH.")
-        return None
+    build_id = parse_build_ids(app_info).get(branch)
+    if build_id:
+        return build_id
+
+    print(
+        f"Could not find build ID for branch '{branch}'. full result below:")
+    for line in app_info.splitlines():
+        print(line)
+    return None
 
 
 def get_local_build_id(manifest_path):
@@ -72,24 +99,280 @@ def get_local_build_id(manifest_path):
     Gets the local build ID from the appmanifest file.
     """
     try:
-        with open(manifest_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                # check TargetBuildID instead, because buildid might be a merged build id from multiple depots
-                if '"TargetBuildID"' in line:
-                    match = re.search(r'"TargetBuildID"\s+"(\d+)"', line)
-                    if match:
-                        return match.group(1)
-        print("Could not parse build ID from appmanifest file.")
-        return None
+        with open(manifest_path, 'r', encoding='utf-8', errors='ignore') as f:
+            # check TargetBuildID instead, because buildid might be a merged build id from multiple depots
+            build_id = vdf.first(f, MANIFEST_BUILD_ID)
     except FileNotFoundError:
         print(f"Could not find appmanifest file at: {manifest_path}")
         return None
+    except vdf.VDFError as e:
+        print(f"Could not parse appmanifest file: {e}")
+        return None
+    if not build_id or not build_id.isdigit():
+        print("Could not parse build ID from appmanifest file.")
+        return None
+    return build_id
+
+
+class Install:
+    """
+    One server install to keep up to date.
+    """
+
+    def __init__(self, install_dir, branch, remote_command_port, manifest_path):
+        self.install_dir = install_dir
+        self.branch = branch or "public"
+        self.remote_command_port = remote_command_port
+        self.manifest_path = manifest_path
+        # latest build update-ready was already sent for, guarded by lock: the
+        # daemon's checks, rolling updates and the manifest watcher all update it
+        self.notified_build_id = None
+        self.lock = threading.Lock()
+
+
+def load_installs(config, app_id):
+    """
+    Reads the installs from config.json. Uses the "installs" list if there is one,
+    otherwise the top level install_dir/steam_beta_branch/RemoteCommandPort.
+    Returns None if an install is missing its directory or port.
+    """
+    entries = config.get("installs") or [config]
+    installs = []
+    for entry in entries:
+        install_dir = entry.get("install_dir")
+        remote_command_port = entry.get("RemoteCommandPort")
+        if not all([install_dir, remote_command_port]):
+            return None
+        manifest_path = entry.get("manifest_path") or os.path.join(
+            install_dir, "steamapps", f"appmanifest_{app_id}.acf")
+        installs.append(Install(install_dir, entry.get("steam_beta_branch"),
+                                remote_command_port, manifest_path))
+    return installs
+
+
+def find_outdated(installs, build_ids, local_build_id=get_local_build_id):
+    """
+    Compares every install's manifest with the latest build IDs and returns
+    the installs that need update-ready, with the build they should update to.
+    local_build_id(manifest_path) reads an install's build, by default by parsing its manifest.
+    """
+    outdated = []
+    for install in installs:
+        latest_build_id = build_ids.get(install.branch)
+        if not latest_build_id:
+            print(
+                f"Port {install.remote_command_port}: Could not find build ID for branch '{install.branch}'.")
+            continue
+        installed_build_id = local_build_id(install.manifest_path)
+        if not installed_build_id:
+            continue
+
+        with install.lock:
+            notified_build_id = install.notified_build_id
+            if latest_build_id == installed_build_id:
+                install.notified_build_id = None
+        if latest_build_id == installed_build_id:
+            if notified_build_id:
+                print(
+                    f"Port {install.remote_command_port}: Update to build {installed_build_id} installed.")
+            continue
+        if latest_build_id == notified_build_id:
+            continue
+
+        print(f"Port {install.remote_command_port}: New update available! "
+              f"Local build {installed_build_id}, latest build {latest_build_id} ({install.branch})")
+        outdated.append((install, latest_build_id))
+    return outdated
+
+
+def notify_outdated(outdated, prepare=None):
+    """
+    Sends update-ready to every outdated install at the same time,
+    so one slow server doesn't hold up the others.
+    prepare(install, build_id) is called for each install first, if given.
+    """
+    if not outdated:
+        return
+
+    def notify(item):
+        install, latest_build_id = item
+        if prepare is not None:
+            prepare(install, latest_build_id)
+        return notify_update_ready(install.remote_command_port)
+
+    with ThreadPoolExecutor(max_workers=len(outdated)) as executor:
+        results = executor.map(notify, outdated)
+        for (install, latest_build_id), notified in zip(outdated, list(results)):
+            if notified:
+                with install.lock:
+                    install.notified_build_id = latest_build_id
+
+
+def load_rolling_update(settings, local_build_id):
+    """
+    Creates the RollingUpdate described by config.json's "rolling_update" section,
+    or returns None to notify every outdated server at once.
+    """
+    if not settings:
+        return None
+    return RollingUpdate(
+        local_build_id,
+        concurrency=settings.get("concurrency", 1),
+        order=settings.get("order", "players"),
+        warnings=settings.get("warnings", [300, 60, 10]),
+        warning_message=settings.get("warning_message", DEFAULT_WARNING_MESSAGE),
+        restart_timeout=settings.get("restart_timeout", 900))
+
+
+def load_stager(config, app_id):
+    """
+    Creates the UpdateStager for config.json's staging_dir,
+    or returns None to let each server download updates itself.
+    """
+    staging_dir = config.get("staging_dir")
+    if not staging_dir:
+        return None
+    return UpdateStager(staging_dir, app_id, link_mode=config.get("staging_link_mode", "reflink"))
+
+
+def stage_outdated(outdated, stager):
+    """
+    Downloads the new build of every branch in outdated once and returns
+    prepare(install, build_id), which rolls it out to an install just before it restarts.
+    """
+    staged = {branch: stager.stage(branch)
+              for branch in sorted({install.branch for install, _ in outdated})}
+
+    def prepare(install, build_id):
+        if staged.get(install.branch) != build_id:
+            print(f"Port {install.remote_command_port}: Staged build {staged.get(install.branch)} "
+                  f"is not {build_id}, the server will download the update itself.")
+            return
+        try:
+            stager.roll_out(build_id, install.install_dir, install.manifest_path)
+        except OSError as e:
+            print(f"Port {install.remote_command_port}: Could not roll out build {build_id}: {e}")
+
+    return prepare
+
+
+def update_outdated(outdated, rolling_update=None, stager=None):
+    """
+    Tells the outdated servers to update, one batch at a time with rolling_update,
+    or all at once without it. With a stager each new build is downloaded once
+    and copied into the installs instead of every server downloading it.
+    """
+    if not outdated:
+        return
+    prepare = stage_outdated(outdated, stager) if stager is not None else None
+    if rolling_update is None:
+        notify_outdated(outdated, prepare)
+    else:
+        rolling_update.run(outdated, prepare)
+
+
+class UpdateDaemon:
+    """
+    Long running update checker. Keeps one steamcmd session alive between
+    checks and backs off while steamcmd is failing, so checks can run every
+    few seconds instead of cold-starting steamcmd every 30 minutes. One
+    app_info query covers every install, whatever branch it is on. Local manifests are watched
+    and only parsed again after they change. rolling_update is the
+    "rolling_update" config.json section, if any, and stager the UpdateStager
+    to download builds with, if any.
+    """
+
+    def __init__(self, app_id, installs,
+                 poll_interval=30, max_poll_interval=900, manifest_poll_interval=5,
+                 rolling_update=None, stager=None):
+        self.app_id = app_id
+        self.installs = installs
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        # app_info doesn't depend on the install, any directory will do for steamcmd
+        self.session = SteamCmdSession(installs[0].install_dir)
+        self.watcher = ManifestWatcher(
+            get_local_build_id, on_change=self.on_local_build_change, poll_interval=manifest_poll_interval)
+        for install in installs:
+            self.watcher.watch(install.manifest_path)
+        self.rolling_update = load_rolling_update(rolling_update, self.watcher.build_id)
+        self.stager = stager
+
+    def on_local_build_change(self, manifest_path, old_build_id, new_build_id):
+        """
+        Called by the manifest watcher when an install's build changes,
+        confirms a pending update landed without waiting for the next check.
+        """
+        for install in self.installs:
+            if os.path.abspath(install.manifest_path) != manifest_path:
+                continue
+            print(
+                f"Port {install.remote_command_port}: Local build changed from {old_build_id} to {new_build_id}.")
+            with install.lock:
+                installed = bool(install.notified_build_id) and install.notified_build_id == new_build_id
+                if installed:
+                    install.notified_build_id = None
+            if installed:
+                print(
+                    f"Port {install.remote_command_port}: Update to build {new_build_id} installed.")
+
+    def check(self):
+        """
+        Runs one update check. Raises SteamCmdError if steamcmd failed.
+        """
+        build_ids = parse_build_ids(self.session.app_info(self.app_id))
+        update_outdated(find_outdated(self.installs, build_ids, self.watcher.build_id),
+                        self.rolling_update, self.stager)
+
+    def run(self):
+        """
+        Checks for updates forever.
+        """
+        interval = self.poll_interval
+        print(
+            f"Update daemon started for {len(self.installs)} install(s), checking every {self.poll_interval} seconds.")
+        if not self.watcher.using_inotify:
+            print("inotify is not available, local manifests are checked with stat instead.")
+        self.watcher.start()
+        try:
+            while True:
+                try:
+                    self.check()
+                    interval = self.poll_interval
+                except SteamCmdError as e:
+                    interval = min(interval * 2, self.max_poll_interval)
+                    print(
+                        f"Error checking for updates: {e} Retrying in {interval} seconds.")
+                time.sleep(interval)
+        finally:
+            self.watcher.close()
+            self.session.close()
+
+
+def notify_update_ready(remote_command_port):
+    """
+    Sends update-ready to the server. Returns True if it succeeded.
+    """
+    # a server that accepts the connection but never answers mustn't hold up the daemon's checks
+    commander = RemoteCommander("localhost", remote_command_port, timeout=STATUS_TIMEOUT)
+    status_code, response = commander.send_command("update-ready")
+    if status_code == "Success":
+        print(f"Port {remote_command_port}: Command success")
+        return True
+    print(f"Port {remote_command_port}: Command failed with status: {status_code}")
+    return False
 
 
 def main():
     """
-    Main function to check for updates and notify the server.
+    Main function to check for updates and notify the servers.
     """
+    parser = argparse.ArgumentParser(
+        description="Checks for Nuclear Option server updates and notifies the servers.")
+    parser.add_argument("--daemon", action="store_true",
+                        help="keep running and check continuously using one steamcmd session")
+    args = parser.parse_args()
+
     try:
         with open("config.json", 'r') as f:
             config = json.load(f)
@@ -97,33 +380,39 @@ def main():
         print("config.json not found. Please create it.")
         return
 
-    install_dir = config.get("install_dir")
-    branch = config.get("steam_beta_branch")
-    remote_command_port = config.get("RemoteCommandPort")
+    app_id = "3930080"
 
-    if not all([install_dir, remote_command_port]):
+    installs = load_installs(config, app_id)
+    if not installs:
         print("Invalid config.json. Please check the contents.")
         return
 
-    app_id = "3930080"
-    manifest_path = os.path.join(
-        install_dir, "steamapps", f"appmanifest_{app_id}.acf")
+    if args.daemon:
+        daemon = UpdateDaemon(
+            app_id, installs,
+            poll_interval=config.get("daemon_poll_interval", 30),
+            max_poll_interval=config.get("daemon_max_poll_interval", 900),
+            manifest_poll_interval=config.get("manifest_poll_interval", 5),
+            rolling_update=config.get("rolling_update"),
+            stager=load_stager(config, app_id))
+        daemon.run()
+        return
 
     print("Checking for updates...")
-    latest_build_id = get_latest_build_id(app_id, branch, install_dir)
-    local_build_id = get_local_build_id(manifest_path)
-
-    print(f"Latest build ID: {latest_build_id}")
-    print(f"Local build ID:  {local_build_id}")
-
-    if latest_build_id and local_build_id and latest_build_id != local_build_id:
-        print("New update available!")
-        commander = RemoteCommander("localhost", remote_command_port)
-        status_code, response = commander.send_command("update-ready")
-        if status_code == "Success":
-            print("Command success")
-        else:
-            print(f"Command failed with status: {status_code}")
+    app_info = fetch_app_info(app_id, installs[0].install_dir)
+    if app_info is None:
+        return
+    build_ids = parse_build_ids(app_info)
+
+    for install in installs:
+        print(f"Port {install.remote_command_port} ({install.branch}): "
+              f"latest build ID {build_ids.get(install.branch)}, "
+              f"local build ID {get_local_build_id(install.manifest_path)}")
+
+    outdated = find_outdated(installs, build_ids)
+    if outdated:
+        update_outdated(outdated, load_rolling_update(config.get("rolling_update"), get_local_build_id),
+                        load_stager(config, app_id))
     else:
         print("No new update available.")
 
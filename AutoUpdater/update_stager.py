@@ -0,0 +1,371 @@
+import argparse
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import stat
+import subprocess
+
+import vdf
+from steamcmd_session import STEAMCMD_PATH
+
+# FICLONE from <linux/fs.h>, makes dst share src's blocks on btrfs/xfs/bcachefs
+FICLONE = 0x40049409
+
+LINK_MODES = ("reflink", "hardlink", "copy")
+
+# errors meaning the file system can't link or clone here, so the file is copied instead
+_CANT_LINK = (errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EPERM, errno.EMLINK)
+
+# steamcmd's own bookkeeping in an install, never rolled out
+_SKIPPED_DIRS = ("steamapps",)
+
+
+def file_hash(path):
+    """Returns the sha256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink(src, dst):
+    """Clones src to dst without copying data. Raises OSError if the file system can't."""
+    with open(src, 'rb') as source, open(dst, 'wb') as destination:
+        fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+
+
+def clone_file(src, dst, link_mode):
+    """
+    Creates dst with src's contents using link_mode, falling back to a plain
+    copy where the file system can't hardlink or reflink.
+    """
+    if link_mode == "hardlink":
+        try:
+            os.link(src, dst)
+            return
+        except OSError as e:
+            if e.errno not in _CANT_LINK:
+                raise
+    elif link_mode == "reflink":
+        try:
+            reflink(src, dst)
+            return
+        except OSError as e:
+            if e.errno not in _CANT_LINK:
+                raise
+            if os.path.exists(dst):
+                os.remove(dst)
+    shutil.copyfile(src, dst)
+
+
+def _walk_files(root):
+    """Yields the path of every file under root relative to it, with '/' separators."""
+    for directory, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(directory, root)
+        if relative_dir == '.':
+            dirnames[:] = [name for name in dirnames if name not in _SKIPPED_DIRS]
+            relative_dir = ''
+        for name in filenames:
+            yield os.path.join(relative_dir, name).replace(os.sep, '/')
+
+
+class UpdateStager:
+    """
+    Downloads each build once and rolls it out to any number of installs.
+
+    staging_dir holds one steamcmd install per branch (so steamcmd only
+    downloads what changed), a content-addressed store of every file
+    (objects/<sha256>) and a file list per build (builds/<build id>.json).
+    Rolling out a build links or clones the store's files into an install,
+    skipping files that are already up to date, removes files the previous
+    roll out put there that the new build dropped and writes the new appmanifest.
+
+    link_mode is "reflink" (copy-on-write clone, falls back to copying),
+    "hardlink" (store files are read-only, so a server can't change them for
+    every install) or "copy".
+    """
+
+    def __init__(self, staging_dir, app_id, link_mode="reflink", steamcmd_path=STEAMCMD_PATH, keep_builds=3):
+        if link_mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode '{link_mode}', expected one of {', '.join(LINK_MODES)}.")
+        self.staging_dir = os.path.abspath(staging_dir)
+        self.app_id = app_id
+        self.link_mode = link_mode
+        self.steamcmd_path = steamcmd_path
+        self.keep_builds = keep_builds
+        self.objects_dir = os.path.join(self.staging_dir, "objects")
+        self.builds_dir = os.path.join(self.staging_dir, "builds")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.builds_dir, exist_ok=True)
+
+    def download_dir(self, branch):
+        return os.path.join(self.staging_dir, "branches", branch or "public")
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def build_path(self, build_id):
+        return os.path.join(self.builds_dir, f"{build_id}.json")
+
+    def load_build(self, build_id):
+        """Returns the file list of a staged build, or None if it was never staged."""
+        try:
+            with open(self.build_path(build_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def download(self, branch):
+        """Runs steamcmd app_update into the branch's staging install. Returns True if it succeeded."""
+        download_dir = self.download_dir(branch)
+        os.makedirs(download_dir, exist_ok=True)
+        command = [self.steamcmd_path,
+                   "+force_install_dir", download_dir,
+                   "+login", "anonymous",
+                   "+app_update", self.app_id]
+        if branch and branch != "public":
+            command += ["-beta", branch]
+        command += ["validate", "+quit"]
+        print(f"Downloading branch '{branch or 'public'}' to {download_dir}...")
+        try:
+            subprocess.run(command, check=True, cwd=download_dir)
+        except (subprocess.CalledProcessError, FileNotFoundError) as e:
+            print(f"Error running steamcmd: {e}")
+            return False
+        return True
+
+    def snapshot(self, branch):
+        """
+        Adds the files of the branch's staging install to the store and records
+        them as a build. Only files whose size or mtime changed since the last
+        snapshot are hashed again. Returns the build ID, or None.
+        """
+        download_dir = self.download_dir(branch)
+        manifest_path = os.path.join(download_dir, "steamapps", f"appmanifest_{self.app_id}.acf")
+        try:
+            with open(manifest_path, 'r', encoding='utf-8', errors='ignore') as f:
+                appmanifest = f.read()
+            build_id = vdf.first(appmanifest, "AppState/TargetBuildID")
+        except (FileNotFoundError, vdf.VDFError) as e:
+            print(f"Could not read staged appmanifest: {e}")
+            return None
+        if not build_id:
+            print("Staged appmanifest has no TargetBuildID.")
+            return None
+
+        # relative path -> [size, mtime_ns, sha256] from the last snapshot of this branch
+        hash_cache_path = os.path.join(download_dir, "steamapps", "staged_hashes.json")
+        try:
+            with open(hash_cache_path, 'r', encoding='utf-8') as f:
+                hash_cache = json.load(f)
+        except (FileNotFoundError, ValueError):
+            hash_cache = {}
+
+        files = {}
+        hashed = 0
+        for relative_path in _walk_files(download_dir):
+            path = os.path.join(download_dir, relative_path)
+            info = os.stat(path)
+            cached = hash_cache.get(relative_path)
+            if cached and cached[0] == info.st_size and cached[1] == info.st_mtime_ns:
+                digest = cached[2]
+            else:
+                digest = file_hash(path)
+                hashed += 1
+            hash_cache[relative_path] = [info.st_size, info.st_mtime_ns, digest]
+            executable = bool(info.st_mode & stat.S_IXUSR)
+            files[relative_path] = [digest, info.st_size, executable]
+            self._store(path, digest, executable)
+
+        for relative_path in set(hash_cache) - set(files):
+            del hash_cache[relative_path]
+        self._write_json(hash_cache_path, hash_cache)
+        self._write_json(self.build_path(build_id), {
+            'build_id': build_id,
+            'branch': branch or "public",
+            'files': files,
+            'appmanifest': appmanifest,
+        })
+        print(f"Staged build {build_id}: {len(files)} files, {hashed} hashed.")
+        return build_id
+
+    def stage(self, branch):
+        """Downloads the latest build of branch and snapshots it. Returns the build ID, or None."""
+        if not self.download(branch):
+            return None
+        build_id = self.snapshot(branch)
+        if build_id:
+            self.prune()
+        return build_id
+
+    def roll_out(self, build_id, install_dir, manifest_path):
+        """
+        Makes install_dir match a staged build and writes its appmanifest.
+        Returns counts of updated, unchanged and removed files, or None if the build isn't staged.
+        """
+        build = self.load_build(build_id)
+        if build is None:
+            print(f"Build {build_id} is not staged.")
+            return None
+
+        # files the last roll out put into this install
+        rolled_out_path = os.path.join(install_dir, "steamapps", "staged_files.json")
+        try:
+            with open(rolled_out_path, 'r', encoding='utf-8') as f:
+                rolled_out = json.load(f)
+        except (FileNotFoundError, ValueError):
+            rolled_out = []
+
+        counts = {'updated': 0, 'unchanged': 0, 'removed': 0}
+        for relative_path, (digest, size, executable) in build['files'].items():
+            source = self.object_path(digest)
+            target = os.path.join(install_dir, relative_path)
+            if self._up_to_date(source, target):
+                counts['unchanged'] += 1
+                continue
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            temporary = f"{target}.staging"
+            if os.path.lexists(temporary):
+                os.remove(temporary)
+            clone_file(source, temporary, self.link_mode)
+            if not os.path.samefile(source, temporary):
+                source_info = os.stat(source)
+                os.chmod(temporary, 0o755 if executable else 0o644)
+                os.utime(temporary, ns=(source_info.st_atime_ns, source_info.st_mtime_ns))
+            # replace instead of writing in place, a running server keeps its open files
+            os.replace(temporary, target)
+            counts['updated'] += 1
+
+        for relative_path in set(rolled_out) - set(build['files']):
+            try:
+                os.remove(os.path.join(install_dir, relative_path))
+                counts['removed'] += 1
+            except FileNotFoundError:
+                pass
+
+        os.makedirs(os.path.dirname(rolled_out_path), exist_ok=True)
+        self._write_json(rolled_out_path, sorted(build['files']))
+        temporary = f"{manifest_path}.staging"
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        with open(temporary, 'w', encoding='utf-8') as f:
+            f.write(build['appmanifest'])
+        os.replace(temporary, manifest_path)
+
+        print(f"Rolled out build {build_id} to {install_dir}: {counts['updated']} updated, "
+              f"{counts['unchanged']} unchanged, {counts['removed']} removed.")
+        return counts
+
+    def prune(self):
+        """Forgets all but the newest keep_builds builds per branch and deletes store files no build uses."""
+        builds = []
+        for name in os.listdir(self.builds_dir):
+            if name.endswith(".json"):
+                build = self.load_build(name[:-len(".json")])
+                if build is not None:
+                    builds.append(build)
+
+        kept = []
+        for branch in {build['branch'] for build in builds}:
+            branch_builds = sorted((build for build in builds if build['branch'] == branch),
+                                   key=lambda build: int(build['build_id']), reverse=True)
+            kept += branch_builds[:self.keep_builds]
+            for build in branch_builds[self.keep_builds:]:
+                os.remove(self.build_path(build['build_id']))
+
+        used = {digest for build in kept for digest, _, _ in build['files'].values()}
+        for directory, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                if name not in used:
+                    os.remove(os.path.join(directory, name))
+
+    def _store(self, path, digest, executable):
+        """Adds a file to the store unless its contents are already there."""
+        object_path = self.object_path(digest)
+        if os.path.exists(object_path):
+            if executable and not os.stat(object_path).st_mode & stat.S_IXUSR:
+                os.chmod(object_path, 0o555)
+            return
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        temporary = f"{object_path}.tmp"
+        if os.path.lexists(temporary):
+            os.remove(temporary)
+        # never hardlink the download itself, steamcmd may change it in place later
+        clone_file(path, temporary, "reflink")
+        source_info = os.stat(path)
+        os.utime(temporary, ns=(source_info.st_atime_ns, source_info.st_mtime_ns))
+        # read-only, a hardlinked install must not be able to change it for everyone
+        os.chmod(temporary, 0o555 if executable else 0o444)
+        os.replace(temporary, object_path)
+
+    def _up_to_date(self, source, target):
+        """
+        Whether target already has source's contents: the same file for
+        hardlinks, otherwise the same size and mtime, which roll_out copies over.
+        """
+        try:
+            target_info = os.stat(target)
+        except FileNotFoundError:
+            return False
+        source_info = os.stat(source)
+        if (target_info.st_dev, target_info.st_ino) == (source_info.st_dev, source_info.st_ino):
+            return True
+        if self.link_mode == "hardlink":
+            return False
+        return (target_info.st_size == source_info.st_size
+                and target_info.st_mtime_ns == source_info.st_mtime_ns)
+
+    def _write_json(self, path, data):
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+
+
+def main():
+    """
+    Downloads the latest build of every branch in config.json once and rolls it out to each install.
+    """
+    from update_checker import load_installs
+
+    parser = argparse.ArgumentParser(
+        description="Downloads each Nuclear Option server build once and rolls it out to every install.")
+    parser.add_argument("--link-mode", choices=LINK_MODES,
+                        help="how files are put into installs (default: staging_link_mode from config.json or reflink)")
+    parser.add_argument("--skip-download", action="store_true",
+                        help="roll out what is already in the staging directory")
+    args = parser.parse_args()
+
+    try:
+        with open("config.json", 'r') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        print("config.json not found. Please create it.")
+        return
+
+    app_id = "3930080"
+    installs = load_installs(config, app_id)
+    staging_dir = config.get("staging_dir")
+    if not installs or not staging_dir:
+        print("Invalid config.json. Please check the contents (staging_dir is required).")
+        return
+
+    stager = UpdateStager(staging_dir, app_id,
+                          link_mode=args.link_mode or config.get("staging_link_mode", "reflink"))
+    for branch in sorted({install.branch for install in installs}):
+        if args.skip_download:
+            build_id = stager.snapshot(branch)
+        else:
+            build_id = stager.stage(branch)
+        if not build_id:
+            continue
+        for install in installs:
+            if install.branch == branch:
+                stager.roll_out(build_id, install.install_dir, install.manifest_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import re
+
+# Token kinds yielded by tokenize
+STRING = 0
+OPEN = 1
+CLOSE = 2
+
+# how much of a file is read at a time
+CHUNK_SIZE = 65536
+
+# Every non-space character starts one of these alternatives, so findall only
+# skips whitespace. A lone '"' only matches when its string is not closed (yet).
+_TOKEN = re.compile(r'''
+    \s*(?:
+        (//[^\n]*)
+      | ("[^"\\]*(?:\\.[^"\\]*)*")
+      | ([{}])
+      | (")
+      | ([^\s{}"]+)
+    )
+''', re.VERBOSE | re.DOTALL)
+
+_ESCAPES = {'n': '\n', 't': '\t', '\\': '\\', '"': '"'}
+_ESCAPE = re.compile(r'\\(.)', re.DOTALL)
+
+
+class VDFError(ValueError):
+    """Raised for text that isn't valid KeyValues."""
+
+
+def _unescape(value):
+    return _ESCAPE.sub(lambda m: _ESCAPES.get(m.group(1), m.group(0)), value)
+
+
+def _chunks(source):
+    if isinstance(source, str):
+        yield source
+    elif hasattr(source, 'read'):
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from source
+
+
+def _scan(buf, final):
+    """
+    Returns the tokens in buf and the offset where the next scan has to start.
+    Unless final, only complete lines are scanned, the rest waits for the next chunk.
+    """
+    end = len(buf) if final else buf.rfind('\n') + 1
+    tokens = []
+    append = tokens.append
+    for comment, quoted, brace, unterminated, unquoted in _TOKEN.findall(buf, 0, end):
+        if quoted:
+            value = quoted[1:-1]
+            append((STRING, _unescape(value) if '\\' in value else value))
+        elif brace:
+            append((OPEN, None) if brace == '{' else (CLOSE, None))
+        elif unquoted:
+            if not (unquoted[0] == '[' and unquoted[-1] == ']'):
+                append((STRING, unquoted))
+        elif unterminated:
+            if final:
+                raise VDFError("Unterminated string.")
+            # a string running past the scanned lines, it is scanned again with the next chunk
+            start = _unterminated_start(buf, end)
+            return _scan(buf[:start], True)[0], start
+    return tokens, end
+
+
+def _unterminated_start(buf, end):
+    """Returns the offset of the first unterminated string in buf[:end]."""
+    for m in _TOKEN.finditer(buf, 0, end):
+        if m.group(4):
+            return m.start(4)
+    return end
+
+
+def tokenize(source):
+    """
+    Yields (kind, value) tokens from a str, a text file or an iterable of str chunks,
+    reading the input a chunk at a time. Comments and [$CONDITION] tags are skipped.
+    """
+    buf = ""
+    for chunk in _chunks(source):
+        buf += chunk
+        tokens, rest = _scan(buf, False)
+        yield from tokens
+        buf = buf[rest:]
+    tokens, _ = _scan(buf, True)
+    yield from tokens
+
+
+def _parse_object(tokens):
+    """Builds a dict from tokens up to and including the '}' that closes the current object."""
+    stack = [{}]
+    key = None
+    for kind, value in tokens:
+        if kind == STRING:
+            if key is None:
+                key = value
+            else:
+                stack[-1][key] = value
+                key = None
+        elif kind == OPEN:
+            if key is None:
+                raise VDFError("Object without a key.")
+            node = {}
+            stack[-1][key] = node
+            stack.append(node)
+            key = None
+        else:
+            if key is not None:
+                raise VDFError(f"Key '{key}' has no value.")
+            node = stack.pop()
+            if not stack:
+                return node
+    raise VDFError("Unexpected end of input.")
+
+
+def _skip_object(tokens):
+    """Consumes tokens up to and including the '}' that closes the current object."""
+    depth = 1
+    for kind, _ in tokens:
+        if kind == OPEN:
+            depth += 1
+        elif kind == CLOSE:
+            depth -= 1
+            if depth == 0:
+                return
+    raise VDFError("Unexpected end of input.")
+
+
+def parse(source):
+    """
+    Parses KeyValues text into nested dicts. Later duplicate keys replace earlier ones.
+    """
+    tokens = tokenize(source)
+    root = {}
+    key = None
+    for kind, value in tokens:
+        if kind == STRING:
+            if key is None:
+                key = value
+            else:
+                root[key] = value
+                key = None
+        elif kind == OPEN:
+            if key is None:
+                raise VDFError("Object without a key.")
+            root[key] = _parse_object(tokens)
+            key = None
+        else:
+            raise VDFError("Unbalanced '}'.")
+    if key is not None:
+        raise VDFError(f"Key '{key}' has no value.")
+    return root
+
+
+def _compile(pattern):
+    return tuple(segment.lower() for segment in pattern.split('/'))
+
+
+def _matches(segment, key):
+    return segment == '*' or segment == key.lower()
+
+
+def _walk(node, segments, path):
+    """Yields (path, value) for everything under node matching segments."""
+    if not segments:
+        yield path, node
+        return
+    if not isinstance(node, dict):
+        return
+    for key, value in node.items():
+        if _matches(segments[0], key):
+            yield from _walk(value, segments[1:], path + (key,))
+
+
+def query(source, patterns):
+    """
+    Answers path queries like "AppState/TargetBuildID" or "*/depots/branches/*/buildid"
+    in one streaming pass. Keys match case-insensitively and '*' matches any one key.
+
+    Yields (pattern, path, value) for every match in document order; value is a str,
+    or a dict when the pattern ends on an object. Objects no pattern can reach are
+    skipped without being built, and the caller can stop iterating once it has what it needs.
+    """
+    compiled = [_compile(pattern) for pattern in patterns]
+    tokens = tokenize(source)
+    path = []
+    # indices of the patterns that still match the current path, per depth
+    live = [range(len(compiled))]
+    key = None
+    for kind, value in tokens:
+        if kind == STRING:
+            if key is None:
+                key = value
+                continue
+            depth = len(path)
+            for i in live[-1]:
+                segments = compiled[i]
+                if len(segments) == depth + 1 and _matches(segments[depth], key):
+                    yield patterns[i], (*path, key), value
+            key = None
+
+        elif kind == OPEN:
+            if key is None:
+                raise VDFError("Object without a key.")
+            depth = len(path)
+            matching = [i for i in live[-1]
+                        if len(compiled[i]) > depth and _matches(compiled[i][depth], key)]
+            if not matching:
+                _skip_object(tokens)
+            elif any(len(compiled[i]) == depth + 1 for i in matching):
+                # something wants the whole object, build it and answer the rest from it
+                node = _parse_object(tokens)
+                node_path = (*path, key)
+                for i in matching:
+                    for match_path, match in _walk(node, compiled[i][depth + 1:], node_path):
+                        yield patterns[i], match_path, match
+            else:
+                path.append(key)
+                live.append(matching)
+            key = None
+
+        else:
+            if key is not None:
+                raise VDFError(f"Key '{key}' has no value.")
+            if not path:
+                raise VDFError("Unbalanced '}'.")
+            path.pop()
+            live.pop()
+
+    if path or key is not None:
+        raise VDFError("Unexpected end of input.")
+
+
+def first(source, pattern):
+    """
+    Returns the value of the first match for pattern, or None.
+    Stops reading source as soon as it is found.
+    """
+    for _, _, value in query(source, [pattern]):
+        return value
+    return None
@@ -0,0 +1,190 @@
+"""
+Agent serving the game servers on one host to a control panel on another.
+
+Runs next to the game servers and keeps one persistent, pipelined connection
+to each of them. Panels connect over the authenticated, multiplexed protocol
+in federation.py. Status reads are cached for STATUS_CACHE_TTL seconds like
+on the panel, so dashboards and pollers asking for the same thing cost the
+game server one read, and a status batch for all servers goes back in one
+compressed frame.
+
+Usage: python agent.py [--listen HOST:PORT] [--ports 7779,7780]
+"""
+
+import argparse
+import asyncio
+import hmac
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import config
+import federation
+from remote_commander import AsyncRemoteCommander
+from status_cache import CACHED_COMMANDS, INVALIDATED_BY
+
+Result = Tuple[str, Optional[Dict]]
+
+# Returned for a port the agent doesn't serve
+UNKNOWN_PORT = "UnknownPort"
+
+
+class Agent:
+    """Answers panel requests for the game servers on ports, sharing one commander per server."""
+
+    def __init__(self, ports: Sequence[int], secret: str, timeout: Optional[float] = 10.0,
+                 ttls: Optional[Dict[str, float]] = None, max_body_size: int = config.MAX_RESPONSE_BODY_SIZE):
+        self.ports = list(ports)
+        self.secret = secret.encode('utf-8')
+        self.timeout = timeout
+        self.ttls = ttls or {}
+        self._commanders = {port: AsyncRemoteCommander("127.0.0.1", port, timeout=timeout,
+                                                       max_body_size=max_body_size)
+                            for port in self.ports}
+        # (port, command_name) -> (time.monotonic() it expires at, result)
+        self._cache: Dict[Tuple[int, str], Tuple[float, Result]] = {}
+        self._fetching: Dict[Tuple[int, str], asyncio.Future] = {}
+        self.requests = 0
+        self.cache_hits = 0
+
+    async def execute(self, port: int, command_name: str, arguments: List[str]) -> Result:
+        """Sends a command to a local game server, answering status reads from the cache when fresh."""
+        commander = self._commanders.get(port)
+        if commander is None:
+            return UNKNOWN_PORT, None
+        ttl = self.ttls.get(command_name, 0) if command_name in CACHED_COMMANDS and not arguments else 0
+        if ttl <= 0:
+            result = await commander.send_command(command_name, arguments)
+            if result[0] == "Success":
+                for stale in INVALIDATED_BY.get(command_name, ()):
+                    self._cache.pop((port, stale), None)
+            return result
+
+        key = (port, command_name)
+        cached = self._cache.get(key)
+        if cached is not None and cached[0] > time.monotonic():
+            self.cache_hits += 1
+            return cached[1]
+        fetching = self._fetching.get(key)
+        if fetching is not None:
+            # share the read that is already on its way
+            self.cache_hits += 1
+            return await asyncio.shield(fetching)
+        fetching = self._fetching[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await commander.send_command(command_name, arguments)
+        except BaseException:
+            fetching.set_result(("NetworkError", None))
+            raise
+        finally:
+            del self._fetching[key]
+        if result[0] == "Success":
+            self._cache[key] = (time.monotonic() + ttl, result)
+        fetching.set_result(result)
+        return result
+
+    async def _batch(self, port: int, commands: Sequence[Tuple[str, List[str]]], timeout: float) -> List[Result]:
+        tasks = [asyncio.ensure_future(self.execute(port, name, list(arguments))) for name, arguments in commands]
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"Error: Server on port {port} timed out during batch.")
+        return [task.result() if task.done() and not task.cancelled() else ("TimeoutError", None)
+                for task in tasks]
+
+    async def answer(self, message: Dict) -> Dict:
+        """Runs one panel request and returns its response (without the id)."""
+        self.requests += 1
+        try:
+            if message.get('type') == 'command':
+                status, body = await self.execute(int(message['port']), str(message['name']),
+                                                  [str(argument) for argument in message.get('arguments', [])])
+                return {'status': status, 'body': body}
+            if message.get('type') == 'batch':
+                ports = [int(port) for port in message['ports']]
+                commands = [(str(name), [str(argument) for argument in arguments])
+                            for name, arguments in message['commands']]
+                timeout = min(float(message.get('timeout', self.timeout or 10.0)), self.timeout or float('inf'))
+                results = await asyncio.gather(*(self._batch(port, commands, timeout) for port in ports))
+                return {'results': {str(port): result for port, result in zip(ports, results)}}
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Error: Bad request from panel. {e}")
+        return {'status': 'BadRequest', 'body': None}
+
+    async def _respond(self, message: Dict, writer: asyncio.StreamWriter):
+        response = await self.answer(message)
+        response['id'] = message.get('id')
+        if not writer.is_closing():
+            # one write per frame, so responses of concurrent requests never interleave
+            writer.write(federation.encode_frame(response))
+
+    async def _authenticate(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> bool:
+        nonce = federation.new_nonce()
+        writer.write(federation.encode_frame({'type': 'hello', 'version': federation.PROTOCOL_VERSION,
+                                              'nonce': nonce}))
+        # the panel isn't trusted yet: a small, uncompressed frame only
+        auth, _ = await asyncio.wait_for(
+            federation.read_frame(reader, federation.HANDSHAKE_FRAME_SIZE, compressed=False), self.timeout)
+        panel_nonce = str(auth.get('nonce', ''))
+        if auth.get('type') != 'auth' or not panel_nonce or not hmac.compare_digest(
+                str(auth.get('mac', '')), federation.sign(self.secret, 'panel', nonce, panel_nonce)):
+            writer.write(federation.encode_frame({'type': 'error', 'error': 'Authentication failed.'}))
+            return False
+        writer.write(federation.encode_frame({'type': 'welcome', 'ports': self.ports,
+                                              'mac': federation.sign(self.secret, 'agent', panel_nonce, nonce)}))
+        return True
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serves one panel connection until it closes."""
+        address = writer.get_extra_info('peername')
+        tasks = set()
+        try:
+            if not await self._authenticate(reader, writer):
+                print(f"Error: Panel at {address} failed to authenticate.")
+                return
+            print(f"Panel at {address} connected.")
+            while True:
+                message, _ = await federation.read_frame(reader)
+                task = asyncio.create_task(self._respond(message, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            print(f"Panel at {address} disconnected.")
+        except asyncio.TimeoutError:
+            # connected but never finished the handshake
+            print(f"Panel at {address} didn't authenticate in time.")
+        except (OSError, federation.AgentError) as e:
+            print(f"Error: Connection to panel at {address} failed. {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+
+    async def serve(self, host: str, port: int):
+        server = await asyncio.start_server(self.handle, host, port)
+        print(f"Agent for game servers on ports {', '.join(map(str, self.ports))} listening on {host}:{port}.")
+        async with server:
+            await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--listen', default=f"{config.AGENT_LISTEN_HOST}:{config.AGENT_LISTEN_PORT}",
+                        help="address panels connect to (default: AGENT_LISTEN_HOST:AGENT_LISTEN_PORT from config.py)")
+    parser.add_argument('--ports', default=",".join(map(str, config.SERVER_PORTS)),
+                        help="comma separated game server ports on this host (default: SERVER_PORTS from config.py)")
+    args = parser.parse_args()
+    if not config.AGENT_SECRET:
+        print("Error: Set AGENT_SECRET in config.py, the same as on the panel.")
+        raise SystemExit(1)
+    host, _, port = args.listen.rpartition(':')
+    ports = [int(port) for port in args.ports.split(',') if port.strip()]
+    agent = Agent(ports, config.AGENT_SECRET, config.COMMAND_TIMEOUT, config.STATUS_CACHE_TTL)
+    try:
+        asyncio.run(agent.serve(host, int(port)))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
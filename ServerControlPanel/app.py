@@ -2,19 +2,119 @@
 Main Flask application for the Nuclear Option Server Manager.
 """
 
+import os
+import queue
+import tempfile
+import time
 from functools import wraps
-from flask import Flask, jsonify, request, Response, render_template
+from flask import Flask, g, jsonify, request, Response, render_template
+from flask.json.provider import JSONProvider
 
+from auth import SCOPES, Authenticator, command_scope
+import codec
 import config
+from ban_sync import BanSync
+from broadcasts import BroadcastScheduler
+import commander_pool
+import dispatcher
+from dispatcher import CommandDispatcher
+import federation
+from health import HealthTracker
+import metrics
 import server_commands
 import remote_commander
+from player_tracker import PlayerTracker
+from poller import StatusPoller
+from rotation import RotationEngine, load_rotation
+from status_cache import StatusCache
+from telemetry import TelemetryStore
+from timer_wheel import TimerWheel
+
+
+
+class CodecJSONProvider(JSONProvider):
+    """Routes jsonify and request.get_json through the shared codec (orjson/msgspec when installed)."""
+
+    def dumps(self, obj, **kwargs):
+        return codec.dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        try:
+            return codec.loads(s)
+        except codec.DECODE_ERRORS as e:
+            # Flask turns ValueError into a 400 response
+            raise ValueError(str(e)) from e
+
 
 app = Flask(__name__)
+app.json = CodecJSONProvider(app)
+status_cache = StatusCache(config.STATUS_CACHE_TTL)
+status_poller = StatusPoller(config.SERVER_PORTS, config.POLL_INTERVAL,
+                             config.BATCH_TIMEOUT, config.BATCH_MAX_CONCURRENCY, status_cache)
+player_tracker = PlayerTracker()
+status_poller.add_listener(player_tracker.on_status)
+status_poller.add_listener(metrics.on_status)
+remote_commander.command_observers.append(metrics.observe_command)
+command_dispatcher = CommandDispatcher(
+    lambda port, name, arguments: commander_pool.PooledCommander(port).send_command(name, arguments),
+    config.DISPATCH_CONCURRENCY, config.DISPATCH_RATE, config.DISPATCH_BURST, config.DISPATCH_MAX_WAIT,
+    config.DISPATCH_BULK_RATE)
+dispatcher.dispatch_observers.append(metrics.observe_dispatch)
+health_tracker = None
+if config.HEALTH_FAILURE_THRESHOLD > 0:
+    health_tracker = HealthTracker(
+        config.SERVER_PORTS, config.HEALTH_FAILURE_THRESHOLD, config.HEALTH_PROBE_INTERVAL,
+        lambda port: server_commands.get_mission_time(create_probe_commander(port))[0])
+    remote_commander.command_observers.append(health_tracker.observe_command)
+    remote_commander.command_gates.append(health_tracker.gate)
+ban_sync = BanSync(config.BAN_SYNC_DB_PATH, config.BAN_SYNC_MAX_IN_FLIGHT,
+                   lambda port, name, arguments: command_dispatcher.submit(port, name, arguments, dispatcher.BULK),
+                   lambda port: status_cache.invalidate_after(port, 'banlist-add'))
+telemetry_store = None
+if config.TELEMETRY_DB_PATH:
+    telemetry_store = TelemetryStore(
+        config.TELEMETRY_DB_PATH, config.TELEMETRY_RETENTION)
+    status_poller.add_listener(telemetry_store.on_status)
+# timers of the mission rotation and scheduled broadcasts
+timer_wheel = TimerWheel(workers=8)
+rotation_engine = None
+if config.ROTATION_PATH:
+    rotation_engine = RotationEngine(
+        timer_wheel, command_dispatcher.send_command, lambda port: rotation_player_count(port),
+        config.ROTATION_LEAD, config.ROTATION_DRIFT_TOLERANCE)
+    status_poller.add_listener(rotation_engine.on_status)
+    remote_commander.command_observers.append(rotation_engine.observe_command)
+broadcast_scheduler = None
+if config.BROADCAST_DB_PATH:
+    broadcast_scheduler = BroadcastScheduler(
+        config.BROADCAST_DB_PATH, timer_wheel, lambda targets: parse_ports(targets), command_dispatcher.submit)
+
+
+def load_users():
+    """USERS from config.py, or USERNAME/PASSWORD with every scope if it is empty."""
+    if config.USERS:
+        return config.USERS
+    return {config.USERNAME: {'password': config.PASSWORD, 'scopes': list(SCOPES)}}
+
+
+authenticator = Authenticator(load_users(), config.TOKEN_SECRET,
+                              config.SESSION_TOKEN_TTL, config.API_TOKEN_TTL)
 
 
 def check_auth(username, password):
-    """Check if a username password combination is valid."""
-    return username == config.USERNAME and password == config.PASSWORD
+    """Returns the Identity for a user name and password, or None if they are wrong."""
+    return authenticator.check_password(username, password)
+
+
+def request_identity():
+    """Returns the Identity behind the request's Bearer token or Basic credentials, or None."""
+    scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() == 'bearer':
+        return authenticator.check_token(credentials.strip())
+    auth = request.authorization
+    if not auth or auth.type != 'basic' or auth.username is None:
+        return None
+    return check_auth(auth.username, auth.password or '')
 
 
 def authenticate():
@@ -25,27 +125,504 @@ def authenticate():
         {'WWW-Authenticate': 'Basic realm="Login Required"'})
 
 
-def requires_auth(f):
-    @wraps(f)
-    def decorated(*args, **kwargs):
-        auth = request.authorization
-        if not auth or not check_auth(auth.username, auth.password):
-            return authenticate()
-        return f(*args, **kwargs)
-    return decorated
+def forbidden(scope):
+    """Sends a 403 response for a user or token without scope."""
+    return jsonify({'success': False, 'error': f"Requires the '{scope}' scope."}), 403
+
+
+def requires_auth(scope):
+    """Lets requests through with a password or token that has scope, see auth.SCOPES."""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            identity = request_identity()
+            if identity is None:
+                return authenticate()
+            if not identity.has_scope(scope):
+                return forbidden(scope)
+            g.identity = identity
+            return f(*args, **kwargs)
+        return decorated
+    return decorator
 
 
 @app.route('/')
-@requires_auth
+@requires_auth('status')
 def index():
-    return render_template('index.html', allowed_ports=config.SERVER_PORTS)
+    return render_template('index.html', allowed_ports=config.SERVER_PORTS,
+                           live_status=config.POLL_INTERVAL > 0,
+                           health_checks=config.HEALTH_FAILURE_THRESHOLD > 0)
+
+
+@app.route('/events')
+@requires_auth('status')
+def events():
+    """Server-Sent Events stream of status snapshots and deltas from the background poller."""
+    status_poller.start()
+    subscriber = status_poller.subscribe()
+
+    def stream():
+        try:
+            while True:
+                try:
+                    event, data = subscriber.get(timeout=15)
+                except queue.Empty:
+                    # comment line keeps proxies from closing an idle stream
+                    yield ': keep-alive\n\n'
+                    continue
+                yield f'event: {event}\ndata: {codec.dumps(data).decode("utf-8")}\n\n'
+        finally:
+            status_poller.unsubscribe(subscriber)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/players/events')
+@requires_auth('status')
+def player_events():
+    """
+    Join, leave and faction-change events after the `since` cursor.
+    Query args: since (default 0), server_port (optional), wait (seconds to long-poll, max 30).
+    """
+    try:
+        since = int(request.args.get('since', 0))
+        wait = min(float(request.args.get('wait', 0)), 30.0)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid since or wait.'}), 400
+
+    port = request.args.get('server_port')
+    if port is not None:
+        if not validate_port(port):
+            return jsonify({'success': False, 'error': f'Port {port} not allowed'}), 400
+        port = int(port)
+
+    if config.POLL_INTERVAL > 0:
+        status_poller.start()
+    else:
+        # no background samples, so refresh the lists now (through the status cache)
+        for refresh_port in [port] if port is not None else config.SERVER_PORTS:
+            commander = create_remote_commander(refresh_port)
+            status_code, response = status_cache.get(
+                refresh_port, 'get-player-list', lambda: server_commands.get_player_list(commander))
+            player_tracker.on_status(
+                refresh_port, {'get-player-list': (status_code, response)})
+
+    events, cursor, reset = player_tracker.events_since(since, port, wait)
+    result = {'events': events, 'cursor': cursor, 'reset': reset}
+    if reset:
+        ports = [port] if port is not None else config.SERVER_PORTS
+        result['players'] = {str(p): player_tracker.players(p) for p in ports}
+    return jsonify(result)
+
+
+def refresh_player_lists(ports):
+    """Fetches the player list of every port at once (through the command queue) and records them."""
+    futures = {port: command_dispatcher.submit(port, 'get-player-list') for port in ports}
+    for port, future in futures.items():
+        result = future.result()
+        status_cache.put(port, 'get-player-list', result)
+        player_tracker.on_status(port, {'get-player-list': result})
+
+
+def wants_refresh(value):
+    """Whether player lookups should sample the servers now instead of trusting the index."""
+    if config.POLL_INTERVAL <= 0:
+        return True
+    status_poller.start()
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+@app.route('/players/locate')
+@requires_auth('status')
+def locate_player():
+    """Which servers a player is on. Query args: steam_id, refresh (sample every server first)."""
+    steam_id = request.args.get('steam_id')
+    if not steam_id:
+        return jsonify({'success': False, 'error': 'Steam ID not provided'}), 400
+    if wants_refresh(request.args.get('refresh')):
+        refresh_player_lists(config.SERVER_PORTS)
+    return jsonify({'steam_id': steam_id, 'locations': player_tracker.locate(steam_id)})
+
+
+@app.route('/players/search')
+@requires_auth('status')
+def search_players():
+    """Players on any server whose display name starts with q. Query args: q, limit (max 100), refresh."""
+    prefix = request.args.get('q', '')
+    try:
+        limit = min(int(request.args.get('limit', 20)), 100)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit.'}), 400
+    if wants_refresh(request.args.get('refresh')):
+        refresh_player_lists(config.SERVER_PORTS)
+    return jsonify({'players': player_tracker.search(prefix, limit)})
+
+
+def act_everywhere(steam_id, commands, refresh, all_server_commands=()):
+    """
+    Sends commands (a list of (name, arguments)) to every server the player is on, and
+    all_server_commands to every configured server whether the player is on it or not, all servers at once.
+    Samples every server first if refresh is set or the index doesn't know where the player is.
+    """
+    locations = [] if refresh else player_tracker.locate(steam_id)
+    if not locations:
+        refresh_player_lists(config.SERVER_PORTS)
+        locations = player_tracker.locate(steam_id)
+
+    found = {location['port'] for location in locations}
+    ports = sorted(found | set(config.SERVER_PORTS) if all_server_commands else found)
+    futures = {port: [(name, command_dispatcher.submit(port, name, arguments))
+                      for name, arguments in list(all_server_commands) + (commands if port in found else [])]
+               for port in ports}
+    results = {}
+    changed = []
+    for port, port_futures in futures.items():
+        results[str(port)] = []
+        for name, future in port_futures:
+            status_code, response = future.result()
+            status_cache.invalidate_after(port, name)
+            results[str(port)].append({'command': name, 'status_code': status_code, 'response': response})
+        if any(result['status_code'] == 'Success' for result in results[str(port)]):
+            changed.append(port)
+    return jsonify({'steam_id': steam_id, 'found': bool(found), 'results': results, 'changed': changed})
+
+
+@app.route('/players/kick-everywhere', methods=['POST'])
+@requires_auth(command_scope('kick-player'))
+def kick_everywhere():
+    """Kicks a player from every server they are on. JSON body: steam_id, refresh (optional)."""
+    data = request.get_json()
+    steam_id = data.get('steam_id')
+    if not steam_id:
+        return jsonify({'success': False, 'error': 'Steam ID not provided'}), 400
+    return act_everywhere(str(steam_id), [('kick-player', [str(steam_id)])], wants_refresh(data.get('refresh')))
+
+
+@app.route('/players/ban-everywhere', methods=['POST'])
+@requires_auth(command_scope('banlist-add'))
+def ban_everywhere():
+    """
+    Bans a player on every server and kicks them from the ones they are on.
+    JSON body: steam_id, reason (optional), refresh (optional).
+    """
+    data = request.get_json()
+    steam_id = data.get('steam_id')
+    if not steam_id:
+        return jsonify({'success': False, 'error': 'Steam ID not provided'}), 400
+    ban_arguments = [str(steam_id)]
+    if data.get('reason'):
+        ban_arguments.append(str(data['reason']))
+    return act_everywhere(str(steam_id), [('kick-player', [str(steam_id)])], wants_refresh(data.get('refresh')),
+                          [('banlist-add', ban_arguments)])
+
+
+def rotation_player_count(port):
+    """Players on a server for picking its next mission, read fresh if nothing polls the servers."""
+    if config.POLL_INTERVAL <= 0:
+        refresh_player_lists([port])
+    return len(player_tracker.players(port))
+
+
+def start_rotation():
+    """Loads ROTATION_PATH into the rotation engine. Returns an error message, or None."""
+    if rotation_engine is None:
+        return "Mission rotation is disabled, set ROTATION_PATH in config.py."
+    try:
+        playlists, servers = load_rotation(config.ROTATION_PATH)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return str(e)
+    rotation_engine.load(playlists, servers, config.SERVER_PORTS)
+    return None
+
+
+def parse_ports(value):
+    """
+    Parses a list of ports and SERVER_GROUPS names, a comma separated string of them or "all".
+    Returns (ports, error) where error is None if every port is allowed.
+    """
+    if value is None or value == 'all':
+        return list(config.SERVER_PORTS), None
+    if isinstance(value, str):
+        value = [port.strip() for port in value.split(',') if port.strip()]
+    if not isinstance(value, list) or not value:
+        return None, 'server_ports must be a list of ports or server groups, or "all"'
+    ports = []
+    for item in value:
+        group = config.SERVER_GROUPS.get(item) if isinstance(item, str) else None
+        for port in (item,) if group is None else group:
+            if port is None or not validate_port(port):
+                return None, f'Port {port} not allowed'
+            ports.append(int(port))
+    return list(dict.fromkeys(ports)), None
+
+
+@app.route('/banlist/sync', methods=['POST'])
+@requires_auth('moderation')
+def banlist_sync():
+    """
+    Starts a bulk ban sync from an uploaded file (multipart field `file`).
+    Form fields: server_ports (comma separated or "all"), remove_missing ("true"/"false").
+    """
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({'success': False, 'error': 'Ban file not provided'}), 400
+    ports, error = parse_ports(request.form.get('server_ports', 'all'))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+    remove_missing = request.form.get('remove_missing', 'true').lower() != 'false'
+
+    # the upload is streamed to disk so the sync can read it after this request ends
+    fd, path = tempfile.mkstemp(prefix='ban_sync_', suffix='.txt')
+    with os.fdopen(fd, 'wb') as f:
+        upload.save(f)
+
+    job_id = ban_sync.start(path, ports, remove_missing, delete_file=True)
+    return jsonify({'success': True, 'job_id': job_id}), 202
+
+
+@app.route('/banlist/sync/<job_id>')
+@requires_auth('status')
+def banlist_sync_status(job_id):
+    """Progress and final counts of a bulk ban sync."""
+    job = ban_sync.job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+
+@app.route('/auth/token', methods=['POST'])
+def issue_token():
+    """
+    Trades Basic credentials for a signed token to send as "Authorization: Bearer <token>".
+    JSON body (all optional): kind ("session" or "api"), scopes (default: all of the user's), ttl (seconds).
+    """
+    auth = request.authorization
+    identity = None
+    if auth and auth.type == 'basic' and auth.username is not None:
+        identity = check_auth(auth.username, auth.password or '')
+    if identity is None:
+        return authenticate()
+
+    data = request.get_json(silent=True) or {}
+    scopes = data.get('scopes')
+    if scopes is not None and (not isinstance(scopes, list) or not all(isinstance(scope, str) for scope in scopes)):
+        return jsonify({'success': False, 'error': 'Invalid scopes.'}), 400
+    ttl = data.get('ttl')
+    try:
+        ttl = float(ttl) if ttl is not None else None
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'error': 'Invalid ttl.'}), 400
+    try:
+        token = authenticator.issue_token(identity, data.get('kind', 'session'), scopes, ttl)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify(token)
+
+
+@app.route('/health')
+@requires_auth('status')
+def health():
+    """State of every game server: up, down (commands fail fast with ServerDown) or probing."""
+    if health_tracker is None:
+        return jsonify({'enabled': False, 'ports': {}})
+    return jsonify({'enabled': True, 'probe_interval': health_tracker.probe_interval,
+                    'ports': health_tracker.snapshot()})
+
+
+@app.route('/dispatcher')
+@requires_auth('status')
+def dispatcher_stats():
+    """Queue depth, in-flight commands and recent queue wait times of every game server's command queue."""
+    return jsonify({'ports': command_dispatcher.stats()})
+
+
+@app.route('/rotation')
+@requires_auth('status')
+def rotation():
+    """Playlist, estimated mission end and next scheduled step of every server with automatic rotation."""
+    if rotation_engine is None:
+        return jsonify({'enabled': False, 'ports': {}})
+    return jsonify({'enabled': True, 'ports': rotation_engine.status()})
+
+
+@app.route('/rotation/reload', methods=['POST'])
+@requires_auth('admin')
+def rotation_reload():
+    """Reads the rotation file again and resyncs every server."""
+    error = start_rotation()
+    if error is not None:
+        return jsonify({'success': False, 'error': error}), 400
+    return jsonify({'success': True, 'ports': rotation_engine.status()})
+
+
+@app.route('/rotation/sync', methods=['POST'])
+@requires_auth('admin')
+def rotation_sync():
+    """Reads a server's mission clock again right away."""
+    if rotation_engine is None:
+        return jsonify({'success': False, 'error': "Mission rotation is disabled."}), 400
+    data = request.get_json(silent=True) or {}
+    try:
+        port = int(data.get('server_port'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': "server_port is required."}), 400
+    if not rotation_engine.resync(port):
+        return jsonify({'success': False, 'error': f"Server {port} has no playlist."}), 400
+    return jsonify({'success': True})
+
+
+def broadcast_or_404(broadcast_id):
+    """Returns (broadcast, error response) for a stored broadcast."""
+    if broadcast_scheduler is None:
+        return None, (jsonify({'success': False, 'error': "Broadcasts are disabled."}), 400)
+    broadcast = broadcast_scheduler.get(broadcast_id)
+    if broadcast is None:
+        return None, (jsonify({'success': False, 'error': 'Unknown broadcast'}), 404)
+    return broadcast, None
+
+
+@app.route('/broadcasts')
+@requires_auth('status')
+def list_broadcasts():
+    """Every stored broadcast with its schedule and the results of its last run."""
+    if broadcast_scheduler is None:
+        return jsonify({'enabled': False, 'broadcasts': []})
+    return jsonify({'enabled': True, 'broadcasts': broadcast_scheduler.all()})
+
+
+@app.route('/broadcasts', methods=['POST'])
+@requires_auth(command_scope('send-chat-message'))
+def create_broadcast():
+    """
+    Schedules a chat announcement. JSON: message (template, see broadcasts.TEMPLATE_FIELDS),
+    server_ports (ports, server groups or "all"), at (unix time, default now),
+    interval (seconds between runs, for recurring ones), until (unix time of the last run).
+    """
+    if broadcast_scheduler is None:
+        return jsonify({'success': False, 'error': "Broadcasts are disabled, set BROADCAST_DB_PATH in config.py."}), 400
+    data = request.get_json()
+    message = data.get('message')
+    if not message:
+        return jsonify({'success': False, 'error': 'Message not provided'}), 400
+    try:
+        broadcast = broadcast_scheduler.create(message, data.get('server_ports', 'all'), data.get('at'),
+                                               data.get('interval'), data.get('until'), g.identity.username)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    return jsonify({'success': True, 'broadcast': broadcast}), 201
+
+
+@app.route('/broadcasts/<int:broadcast_id>', methods=['DELETE'])
+@requires_auth(command_scope('send-chat-message'))
+def delete_broadcast(broadcast_id):
+    """Cancels and removes a broadcast."""
+    _, error = broadcast_or_404(broadcast_id)
+    if error:
+        return error
+    broadcast_scheduler.delete(broadcast_id)
+    return jsonify({'success': True})
+
+
+@app.route('/broadcasts/<int:broadcast_id>/send', methods=['POST'])
+@requires_auth(command_scope('send-chat-message'))
+def send_broadcast(broadcast_id):
+    """Sends a broadcast right away, without changing its schedule."""
+    broadcast, error = broadcast_or_404(broadcast_id)
+    if error:
+        return error
+    return jsonify({'success': True, 'results': broadcast_scheduler.send(broadcast)})
+
+
+@app.route('/agents')
+@requires_auth('status')
+def agents():
+    """Connection state and traffic of the agents serving game servers on other hosts."""
+    return jsonify({'agents': federation.stats()})
+
+
+@app.route('/metrics')
+@requires_auth('status')
+def prometheus_metrics():
+    """Prometheus/OpenMetrics scrape endpoint."""
+    status_poller.start()
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+
+def parse_time_range(args):
+    """Reads start/end unix timestamps from query args, defaulting to the last 24 hours."""
+    end = float(args.get('end', time.time()))
+    start = float(args.get('start', end - 24 * 3600))
+    return start, end
+
+
+@app.route('/telemetry')
+@requires_auth('status')
+def telemetry():
+    """
+    Player count history of one server.
+    Query args: server_port, start, end (unix timestamps), resolution (raw, 1m or 1h; optional).
+    """
+    if telemetry_store is None:
+        return jsonify({'success': False, 'error': 'Telemetry is disabled.'}), 404
+
+    port = request.args.get('server_port', config.SERVER_PORTS[0])
+    if not validate_port(port):
+        return jsonify({'success': False, 'error': f'Port {port} not allowed'}), 400
+    resolution = request.args.get('resolution')
+    if resolution not in (None, 'raw', '1m', '1h'):
+        return jsonify({'success': False, 'error': 'Invalid resolution.'}), 400
+    try:
+        start, end = parse_time_range(request.args)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid start or end.'}), 400
+
+    resolution, points = telemetry_store.query(int(port), start, end, resolution)
+    return jsonify({'resolution': resolution, 'points': points})
+
+
+@app.route('/telemetry/rounds')
+@requires_auth('status')
+def telemetry_rounds():
+    """
+    Completed mission rounds.
+    Query args: start, end (unix timestamps), mission ("Group/Name"), server_port (all optional).
+    """
+    if telemetry_store is None:
+        return jsonify({'success': False, 'error': 'Telemetry is disabled.'}), 404
+
+    port = request.args.get('server_port')
+    if port is not None and not validate_port(port):
+        return jsonify({'success': False, 'error': f'Port {port} not allowed'}), 400
+    try:
+        start, end = parse_time_range(request.args)
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid start or end.'}), 400
+
+    rounds = telemetry_store.rounds(start, end, request.args.get('mission'),
+                                    int(port) if port is not None else None)
+    return jsonify({'rounds': rounds})
 
 
 def create_remote_commander(port=None):
-    """Creates and returns a RemoteCommander instance."""
+    """Returns a commander whose commands wait in the server's queue (see dispatcher.py)."""
     if port is None:
         port = config.SERVER_PORTS[0]
-    return server_commands.RemoteCommander("127.0.0.1", port)
+    return command_dispatcher.commander(port)
+
+
+def create_probe_commander(port):
+    """
+    Returns a commander for health probes, bypassing the queue and the health check's fail-fast.
+    Local servers get a one-shot RemoteCommander, so a probe tests a fresh connection.
+    """
+    if federation.route(port) is not None:
+        return commander_pool.PooledCommander(port, gated=False)
+    return server_commands.RemoteCommander("127.0.0.1", port, config.MAX_RESPONSE_BODY_SIZE,
+                                           timeout=config.COMMAND_TIMEOUT,
+                                           connect_timeout=config.COMMAND_CONNECT_TIMEOUT, gated=False)
 
 
 def validate_port(port):
@@ -74,7 +651,7 @@ def get_commander_from_data(data):
 
 
 @app.route('/command/update-ready', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('update-ready'))
 def update_ready():
     data = request.get_json()
     commander, error = get_commander_from_data(data)
@@ -82,11 +659,12 @@ def update_ready():
         return error
 
     status_code, response = server_commands.update_ready(commander)
+    status_cache.invalidate_after(commander.port, 'update-ready')
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/send-chat-message', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('send-chat-message'))
 def send_chat_message():
     data = request.get_json()
     message = data.get('message')
@@ -102,7 +680,7 @@ def send_chat_message():
 
 
 @app.route('/command/reload-config', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('reload-config'))
 def reload_config():
     data = request.get_json()
     path = data.get('path')
@@ -112,11 +690,12 @@ def reload_config():
         return error
 
     status_code, response = server_commands.reload_config(commander, path)
+    status_cache.invalidate_after(commander.port, 'reload-config')
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/get-mission-time', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('get-mission-time'))
 def get_mission_time():
     data = request.get_json()
 
@@ -124,12 +703,13 @@ def get_mission_time():
     if error:
         return error
 
-    status_code, response = server_commands.get_mission_time(commander)
+    status_code, response = status_cache.get(
+        commander.port, 'get-mission-time', lambda: server_commands.get_mission_time(commander))
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/get-mission', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('get-mission'))
 def get_mission():
     data = request.get_json()
 
@@ -137,12 +717,13 @@ def get_mission():
     if error:
         return error
 
-    status_code, response = server_commands.get_mission(commander)
+    status_code, response = status_cache.get(
+        commander.port, 'get-mission', lambda: server_commands.get_mission(commander))
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/get-player-list', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('get-player-list'))
 def get_player_list():
     data = request.get_json()
 
@@ -150,12 +731,13 @@ def get_player_list():
     if error:
         return error
 
-    status_code, response = server_commands.get_player_list(commander)
+    status_code, response = status_cache.get(
+        commander.port, 'get-player-list', lambda: server_commands.get_player_list(commander))
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/set-time-remaining', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('set-time-remaining'))
 def set_time_remaining():
     data = request.get_json()
     time = data.get('time')
@@ -172,11 +754,12 @@ def set_time_remaining():
 
     status_code, response = server_commands.set_time_remaining(
         commander, time_float)
+    status_cache.invalidate_after(commander.port, 'set-time-remaining')
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/set-next-mission', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('set-next-mission'))
 def set_next_mission():
     data = request.get_json()
     group = data.get('group')
@@ -195,11 +778,12 @@ def set_next_mission():
 
     status_code, response = server_commands.set_next_mission(
         commander, group, name, max_time_float)
+    status_cache.invalidate_after(commander.port, 'set-next-mission')
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/kick-player', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('kick-player'))
 def kick_player():
     data = request.get_json()
     steam_id = data.get('steam_id')
@@ -211,11 +795,12 @@ def kick_player():
         return error
 
     status_code, response = server_commands.kick_player(commander, steam_id)
+    status_cache.invalidate_after(commander.port, 'kick-player')
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/unkick-player', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('unkick-player'))
 def unkick_player():
     data = request.get_json()
     steam_id = data.get('steam_id')
@@ -231,7 +816,7 @@ def unkick_player():
 
 
 @app.route('/command/clear-kicked-players', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('clear-kicked-players'))
 def clear_kicked_players():
     data = request.get_json()
 
@@ -244,7 +829,7 @@ def clear_kicked_players():
 
 
 @app.route('/command/banlist-reload', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('banlist-reload'))
 def banlist_reload():
     data = request.get_json()
 
@@ -253,11 +838,12 @@ def banlist_reload():
         return error
 
     status_code, response = server_commands.banlist_reload(commander)
+    status_cache.invalidate_after(commander.port, 'banlist-reload')
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/banlist-add', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('banlist-add'))
 def banlist_add():
     data = request.get_json()
     steam_id = data.get('steam_id')
@@ -271,11 +857,12 @@ def banlist_add():
 
     status_code, response = server_commands.banlist_add(
         commander, steam_id, reason)
+    status_cache.invalidate_after(commander.port, 'banlist-add')
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/banlist-remove', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('banlist-remove'))
 def banlist_remove():
     data = request.get_json()
     steam_id = data.get('steam_id')
@@ -288,11 +875,12 @@ def banlist_remove():
 
     status_code, response = server_commands.banlist_remove(
         commander, steam_id)
+    status_cache.invalidate_after(commander.port, 'banlist-remove')
     return jsonify({'status_code': status_code, 'response': response})
 
 
 @app.route('/command/banlist-clear', methods=['POST'])
-@requires_auth
+@requires_auth(command_scope('banlist-clear'))
 def banlist_clear():
     data = request.get_json()
 
@@ -301,13 +889,51 @@ def banlist_clear():
         return error
 
     status_code, response = server_commands.banlist_clear(commander)
+    status_cache.invalidate_after(commander.port, 'banlist-clear')
     return jsonify({'status_code': status_code, 'response': response})
 
 
+@app.route('/command/batch', methods=['POST'])
+@requires_auth('status')
+def batch():
+    data = request.get_json()
+    commands = data.get('commands')
+    if not commands or not isinstance(commands, list):
+        return jsonify({'success': False, 'error': 'Commands not provided'}), 400
+
+    parsed_commands = []
+    for command in commands:
+        name = command.get('name') if isinstance(command, dict) else None
+        arguments = command.get('arguments', []) if name else None
+        if not isinstance(name, str) or not isinstance(arguments, list):
+            return jsonify({'success': False, 'error': f'Invalid command: {command}'}), 400
+        parsed_commands.append((name, [str(arg) for arg in arguments]))
+
+    # the batch needs the scope of its most powerful command
+    scope = max((command_scope(name) for name, _ in parsed_commands), key=SCOPES.index)
+    if not g.identity.has_scope(scope):
+        return forbidden(scope)
+
+    ports, error = parse_ports(data.get('server_ports', 'all'))
+    if error:
+        return jsonify({'success': False, 'error': error}), 400
+
+    results = command_dispatcher.run_batch(ports, parsed_commands, config.BATCH_TIMEOUT)
+    for port in ports:
+        for name, _ in parsed_commands:
+            status_cache.invalidate_after(port, name)
+    return jsonify({'results': {str(port): result for port, result in results.items()}})
+
+
 if __name__ == '__main__':
     ssl_context = None
     if config.SSL_CERT_PATH and config.SSL_KEY_PATH:
         ssl_context = (config.SSL_CERT_PATH, config.SSL_KEY_PATH)
 
+    if rotation_engine is not None and start_rotation() is not None:
+        raise SystemExit(1)
+    status_poller.start()
+    if broadcast_scheduler is not None:
+        broadcast_scheduler.start()
     app.run(host=config.FLASK_HOST, port=config.FLASK_PORT,
             ssl_context=ssl_context)
@@ -0,0 +1,218 @@
+"""
+Users, password hashes and signed tokens for the panel.
+
+Passwords are stored as salted PBKDF2 hashes. Checking one is deliberately
+slow, so once a password was verified a cheap keyed digest of it is kept in
+memory and later requests with the same credentials only compare digests.
+
+POST /auth/token trades a password for a token: the user name, scopes and
+expiry signed with HMAC-SHA256. Verifying a token is one HMAC and a JSON
+decode, with no password involved, which is what scripts polling the panel
+should use.
+
+Usage: python auth.py hash-password
+"""
+
+import base64
+import getpass
+import hashlib
+import hmac
+import os
+import sys
+import threading
+import time
+from typing import Dict, FrozenSet, Iterable, Optional
+
+import codec
+
+# Scopes from least to most access; every scope includes the ones before it
+SCOPES = ("status", "moderation", "admin")
+
+# Scope needed to run each command, anything not listed needs admin
+COMMAND_SCOPES = {
+    "get-player-list": "status",
+    "get-mission": "status",
+    "get-mission-time": "status",
+    "send-chat-message": "moderation",
+    "kick-player": "moderation",
+    "unkick-player": "moderation",
+    "clear-kicked-players": "moderation",
+    "banlist-reload": "moderation",
+    "banlist-add": "moderation",
+    "banlist-remove": "moderation",
+    "banlist-clear": "moderation",
+    "update-ready": "admin",
+    "reload-config": "admin",
+    "set-time-remaining": "admin",
+    "set-next-mission": "admin",
+}
+
+HASH_ALGORITHM = "pbkdf2_sha256"
+HASH_ITERATIONS = 600000
+
+TOKEN_KINDS = ("session", "api")
+
+
+def hash_password(password: str, iterations: int = HASH_ITERATIONS) -> str:
+    """Returns "pbkdf2_sha256$<iterations>$<salt>$<hash>" for password, with a random salt."""
+    salt = os.urandom(16)
+    digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt, iterations)
+    return f"{HASH_ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def check_password_hash(password_hash: str, password: str) -> bool:
+    """Checks password against a hash_password() string. Slow on purpose."""
+    try:
+        algorithm, iterations, salt, expected = password_hash.split('$')
+        if algorithm != HASH_ALGORITHM:
+            return False
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'),
+                                     bytes.fromhex(salt), int(iterations))
+    except ValueError:
+        return False
+    return hmac.compare_digest(digest.hex(), expected)
+
+
+def expand_scopes(scopes: Iterable[str]) -> FrozenSet[str]:
+    """Adds the scopes each scope includes, e.g. moderation gives status too."""
+    expanded = set()
+    for scope in scopes:
+        if scope in SCOPES:
+            expanded.update(SCOPES[:SCOPES.index(scope) + 1])
+    return frozenset(expanded)
+
+
+def command_scope(command_name: str) -> str:
+    return COMMAND_SCOPES.get(command_name, "admin")
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class Identity:
+    """Who made a request and what they may do."""
+
+    def __init__(self, username: str, scopes: FrozenSet[str], token: Optional[Dict] = None):
+        self.username = username
+        self.scopes = scopes
+        # the verified token payload, None for password logins
+        self.token = token
+
+    def has_scope(self, scope: str) -> bool:
+        return scope in self.scopes
+
+
+class Authenticator:
+    """
+    Checks Basic credentials and Bearer tokens.
+
+    users maps user names to {"password_hash": ..., "scopes": [...]}; a user
+    with a "password" instead of a "password_hash" is compared in plain text
+    (that's how USERNAME/PASSWORD from config.py are handled). secret signs
+    the tokens; if it is empty a random one is used, so tokens stop working
+    when the panel restarts.
+    """
+
+    def __init__(self, users: Dict[str, Dict], secret: str = "", session_ttl: float = 12 * 3600,
+                 max_api_ttl: float = 90 * 24 * 3600):
+        self.users = users
+        self.secret = secret.encode('utf-8') if secret else os.urandom(32)
+        self.session_ttl = session_ttl
+        self.max_api_ttl = max_api_ttl
+        # keys the digests of verified passwords so the plain passwords never sit in memory
+        self._cache_key = os.urandom(32)
+        self._verified: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _user_scopes(self, username: str) -> Optional[FrozenSet[str]]:
+        user = self.users.get(username)
+        if user is None:
+            return None
+        return expand_scopes(user.get('scopes', SCOPES))
+
+    def check_password(self, username: str, password: str) -> Optional[Identity]:
+        """Returns the user's Identity if password is theirs, otherwise None."""
+        user = self.users.get(username)
+        if user is None:
+            return None
+        stored = user.get('password_hash') or user.get('password')
+        if not stored:
+            return None
+        cached = hmac.new(self._cache_key, f"{stored}\0{password}".encode('utf-8'), hashlib.sha256).digest()
+        with self._lock:
+            known = self._verified.get(username)
+        if known is None or not hmac.compare_digest(known, cached):
+            if 'password_hash' in user:
+                valid = check_password_hash(user['password_hash'], password)
+            else:
+                valid = hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+            if not valid:
+                return None
+            with self._lock:
+                self._verified[username] = cached
+        return Identity(username, self._user_scopes(username))
+
+    def issue_token(self, identity: Identity, kind: str = "session", scopes: Optional[Iterable[str]] = None,
+                    ttl: Optional[float] = None) -> Dict:
+        """
+        Signs a token for identity, limited to scopes (default: all of the identity's).
+        Session tokens last session_ttl seconds, API tokens ttl seconds up to max_api_ttl.
+        Raises ValueError for an unknown kind or scopes the identity doesn't have.
+        """
+        if kind not in TOKEN_KINDS:
+            raise ValueError(f"Unknown token kind '{kind}', expected one of {', '.join(TOKEN_KINDS)}.")
+        granted = identity.scopes if scopes is None else expand_scopes(scopes)
+        if scopes is not None and (not granted or not granted <= identity.scopes):
+            raise ValueError("Requested scopes are not available to this user.")
+        if kind == "session":
+            ttl = self.session_ttl if ttl is None else min(ttl, self.session_ttl)
+        else:
+            ttl = self.max_api_ttl if ttl is None else min(ttl, self.max_api_ttl)
+        expires = int(time.time() + max(1, ttl))
+        payload = {"sub": identity.username, "scopes": sorted(granted, key=SCOPES.index),
+                   "kind": kind, "exp": expires}
+        body = _b64encode(codec.dumps(payload))
+        signature = _b64encode(hmac.new(self.secret, body.encode('ascii'), hashlib.sha256).digest())
+        return {"token": f"{body}.{signature}", "expires": expires, "scopes": payload["scopes"], "kind": kind}
+
+    def check_token(self, token: str) -> Optional[Identity]:
+        """
+        Returns the Identity of a valid, unexpired token, otherwise None.
+        A token never grants more than its user currently has, and stops
+        working if the user is removed.
+        """
+        body, _, signature = token.partition('.')
+        expected = hmac.new(self.secret, body.encode('ascii', errors='replace'), hashlib.sha256).digest()
+        try:
+            if not hmac.compare_digest(_b64decode(signature), expected):
+                return None
+            payload = codec.loads(_b64decode(body))
+        except codec.DECODE_ERRORS:
+            return None
+        if not isinstance(payload, dict) or not isinstance(payload.get("sub"), str) \
+                or payload.get("exp", 0) < time.time():
+            return None
+        user_scopes = self._user_scopes(payload.get("sub"))
+        if user_scopes is None:
+            return None
+        return Identity(payload["sub"], expand_scopes(payload.get("scopes", ())) & user_scopes, payload)
+
+
+def main():
+    if sys.argv[1:] != ["hash-password"]:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(1)
+    password = getpass.getpass("Password: ")
+    if password != getpass.getpass("Repeat password: "):
+        print("Passwords don't match.")
+        sys.exit(1)
+    print(hash_password(password))
+
+
+if __name__ == '__main__':
+    main()
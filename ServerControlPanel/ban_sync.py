@@ -0,0 +1,235 @@
+"""
+Bulk ban list sync.
+
+Streams a ban file (one SteamID per line, or CSV of steamId,reason), diffs it
+against a local SQLite index of the IDs the panel last pushed to each server,
+and sends only the needed banlist-add / banlist-remove commands through the
+command queue at bulk priority, with a bounded number waiting at a time.
+
+Only IDs that were added by a previous sync are ever removed, bans added any
+other way are left alone.
+"""
+
+import collections
+import csv
+import itertools
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# How many IDs are read from the index and sent per round
+BATCH_SIZE = 500
+
+# How many finished jobs are remembered for the progress endpoint
+MAX_JOBS = 20
+
+# Results meaning the command never reached the game server (ServerDown: see health.py,
+# QueueTimeout: see dispatcher.py)
+CONNECTION_FAILURES = ("NetworkError", "ConnectionError", "TimeoutError", "ServerDown", "QueueTimeout")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pushed_bans (
+    port INTEGER NOT NULL,
+    steam_id TEXT NOT NULL,
+    PRIMARY KEY (port, steam_id)
+) WITHOUT ROWID;
+"""
+
+
+def read_ban_file(path: str, on_invalid: Callable[[str], None]) -> Iterator[Tuple[str, Optional[str]]]:
+    """
+    Yields (steam_id, reason_or_None) from a ban file without loading it into memory.
+    Blank lines and lines starting with # are skipped; other lines that don't
+    start with a numeric SteamID (e.g. a CSV header) are passed to on_invalid.
+    """
+    with open(path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+        for row in csv.reader(f):
+            if not row or not row[0].strip() or row[0].lstrip().startswith('#'):
+                continue
+            steam_id = row[0].strip()
+            if not steam_id.isdigit():
+                on_invalid(steam_id)
+                continue
+            reason = row[1].strip() if len(row) > 1 and row[1].strip() else None
+            yield steam_id, reason
+
+
+def _send_all(submit: Callable[[int, str, List[str]], Future], port: int,
+              commands: List[Tuple[str, List[str]]], max_in_flight: int) -> List[Tuple[str, Optional[Dict]]]:
+    """Submits commands keeping at most max_in_flight of them waiting, returns their results in order."""
+    waiting: Deque[Future] = collections.deque()
+    results = []
+    for name, arguments in commands:
+        if len(waiting) >= max(1, max_in_flight):
+            results.append(waiting.popleft().result())
+        waiting.append(submit(port, name, arguments))
+    results.extend(future.result() for future in waiting)
+    return results
+
+
+class BanSync:
+    """
+    Runs ban syncs as background jobs and keeps their progress.
+    Each job gets its own SQLite connection, so jobs can run on their own threads.
+    submit(port, command_name, arguments) queues a command and returns a Future
+    of its result (CommandDispatcher.submit at BULK priority).
+    """
+
+    def __init__(self, db_path: str, max_in_flight: int, submit: Callable[[int, str, List[str]], Future],
+                 on_port_synced: Optional[Callable[[int], None]] = None):
+        self.db_path = db_path
+        self.max_in_flight = max_in_flight
+        self.submit = submit
+        self.on_port_synced = on_port_synced
+        self._jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        with sqlite3.connect(db_path) as db:
+            db.executescript(_SCHEMA)
+
+    def start(self, path: str, ports: Sequence[int], remove_missing: bool = True, delete_file: bool = False) -> str:
+        """Starts syncing the ban file at path to ports on a background thread and returns the job id."""
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'state': 'running',
+            'started': time.time(),
+            'finished': None,
+            'error': None,
+            'ids_in_file': 0,
+            'invalid_lines': 0,
+            'ports': {str(port): {'to_add': 0, 'to_remove': 0, 'added': 0, 'removed': 0, 'failed': 0,
+                                  'error': None}
+                      for port in ports},
+        }
+        with self._lock:
+            self._jobs[job_id] = job
+            finished = [other for other in self._jobs.values()
+                        if other['state'] != 'running']
+            for old in sorted(finished, key=lambda other: other['started'])[:-MAX_JOBS]:
+                del self._jobs[old['id']]
+
+        thread = threading.Thread(target=self._run_job, args=(job, path, list(ports), remove_missing, delete_file),
+                                  name=f"ban-sync-{job_id[:8]}", daemon=True)
+        thread.start()
+        return job_id
+
+    def job(self, job_id: str) -> Optional[Dict]:
+        """Returns a copy of a job's progress, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            return {**job, 'ports': {port: dict(counts) for port, counts in job['ports'].items()}}
+
+    def _run_job(self, job: Dict, path: str, ports: List[int], remove_missing: bool, delete_file: bool):
+        state, error = 'failed', "Ban sync stopped unexpectedly."
+        try:
+            self.sync(path, ports, remove_missing, job)
+            state, error = 'done', None
+        except Exception as e:
+            print(f"Error: Ban sync failed. {e}")
+            error = str(e)
+        finally:
+            # the job never stays 'running', whatever happened above
+            with self._lock:
+                job['state'] = state
+                job['error'] = error
+                job['finished'] = time.time()
+            if delete_file:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    print(f"Error: Could not delete ban file {path}. {e}")
+
+    def sync(self, path: str, ports: Sequence[int], remove_missing: bool, job: Dict):
+        """Syncs the ban file at path to every port, updating job's counts as it goes."""
+        db = sqlite3.connect(self.db_path)
+        try:
+            db.execute(
+                "CREATE TEMP TABLE incoming (steam_id TEXT PRIMARY KEY, reason TEXT)")
+
+            def on_invalid(line):
+                job['invalid_lines'] += 1
+
+            rows = read_ban_file(path, on_invalid)
+            with db:
+                while True:
+                    chunk = list(itertools.islice(rows, BATCH_SIZE))
+                    if not chunk:
+                        break
+                    db.executemany(
+                        "INSERT OR IGNORE INTO incoming (steam_id, reason) VALUES (?, ?)", chunk)
+            job['ids_in_file'] = db.execute(
+                "SELECT count(*) FROM incoming").fetchone()[0]
+            if job['ids_in_file'] == 0:
+                raise ValueError("Ban file contains no SteamIDs.")
+            print(f"Ban sync: {job['ids_in_file']} IDs in file.")
+
+            for port in ports:
+                self._sync_port(db, port, remove_missing, job['ports'][str(port)])
+                if self.on_port_synced is not None:
+                    self.on_port_synced(port)
+        finally:
+            db.close()
+
+    def _sync_port(self, db: sqlite3.Connection, port: int, remove_missing: bool, counts: Dict):
+        with db:
+            db.execute("DROP TABLE IF EXISTS temp.to_add")
+            db.execute("DROP TABLE IF EXISTS temp.to_remove")
+            db.execute(
+                "CREATE TEMP TABLE to_add AS SELECT steam_id, reason FROM incoming "
+                "WHERE steam_id NOT IN (SELECT steam_id FROM pushed_bans WHERE port = ?)", (port,))
+            db.execute(
+                "CREATE TEMP TABLE to_remove AS SELECT steam_id FROM pushed_bans "
+                "WHERE port = ? AND steam_id NOT IN (SELECT steam_id FROM incoming)", (port,))
+        counts['to_add'] = db.execute("SELECT count(*) FROM to_add").fetchone()[0]
+        counts['to_remove'] = db.execute(
+            "SELECT count(*) FROM to_remove").fetchone()[0] if remove_missing else 0
+        print(f"Ban sync port {port}: {counts['to_add']} to add, {counts['to_remove']} to remove.")
+
+        def add_command(row):
+            steam_id, reason = row
+            return ("banlist-add", [steam_id, reason] if reason else [steam_id])
+
+        reachable = self._push(db, port, "SELECT rowid, steam_id, reason FROM to_add WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                               add_command, "INSERT OR IGNORE INTO pushed_bans (port, steam_id) VALUES (?, ?)",
+                               counts, 'added')
+        if reachable and remove_missing:
+            self._push(db, port, "SELECT rowid, steam_id FROM to_remove WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                       lambda row: ("banlist-remove", [row[0]]),
+                       "DELETE FROM pushed_bans WHERE port = ? AND steam_id = ?",
+                       counts, 'removed')
+        print(f"Ban sync port {port}: added {counts['added']}, removed {counts['removed']}, failed {counts['failed']}.")
+
+    def _push(self, db: sqlite3.Connection, port: int, select_sql: str, make_command: Callable,
+              update_sql: str, counts: Dict, done_key: str) -> bool:
+        """
+        Sends the commands for every row of select_sql in batches and records the ones that succeeded.
+        Returns False if it gave up because the server could not be reached.
+        """
+        last_rowid = 0
+        while True:
+            rows = db.execute(select_sql, (last_rowid, BATCH_SIZE)).fetchall()
+            if not rows:
+                return True
+            last_rowid = rows[-1][0]
+            commands = [make_command(row[1:]) for row in rows]
+
+            # each command is bounded by the queue's max wait and the commander's own timeout
+            results = _send_all(self.submit, port, commands, self.max_in_flight)
+
+            succeeded = [(port, command[1][0]) for command, (status_code, _) in zip(commands, results)
+                         if status_code == "Success"]
+            with db:
+                db.executemany(update_sql, succeeded)
+            counts[done_key] += len(succeeded)
+            counts['failed'] += len(commands) - len(succeeded)
+
+            if all(status_code in CONNECTION_FAILURES for status_code, _ in results):
+                print(f"Error: Ban sync could not reach server on port {port}, skipping it.")
+                counts['error'] = results[0][0]
+                return False
@@ -0,0 +1,104 @@
+"""
+Benchmark of the JSON codecs available to codec.py on realistic payloads:
+encoding command messages and panel responses, decoding game server
+responses, and typed decoding of the documented response shapes.
+
+Usage: python bench/bench_codec.py [--players N] [--seconds S]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import codec  # noqa: E402
+
+
+def make_payloads(player_count: int):
+    players = {"Players": [
+        {"steamId": str(76561198000000000 + i),
+         "displayName": f"Player {i} <color=#ff0000>ÄÖÜ</color>",
+         "faction": "Boscali" if i % 2 else "Primeva"}
+        for i in range(player_count)]}
+    mission = {
+        "currentMission": {"Key": {"Group": "BuiltIn", "Name": "Escalation"}, "MaxTime": 3600.0},
+        "nextMission": {"Key": {"Group": "BuiltIn", "Name": "Terminal Control"}, "MaxTime": 3600.0},
+    }
+    mission_time = {"currentTime": 1234.5, "maxTime": 3600.0}
+    command = {"name": "send-chat-message",
+               "arguments": ["<color=#ff0000><b>Alert:</b></color> Server restarting in 5 minutes."]}
+    panel_response = {"results": {str(7779 + i): [
+        {"command": "get-player-list", "status_code": "Success", "response": players}] for i in range(4)}}
+    return {
+        "get-player-list": players,
+        "get-mission": mission,
+        "get-mission-time": mission_time,
+        "command message": command,
+        "batch response": panel_response,
+    }
+
+
+def rate(function, seconds: float) -> float:
+    """Calls function repeatedly for about seconds and returns calls per second."""
+    calls = 0
+    batch = 1
+    started = time.perf_counter()
+    while True:
+        for _ in range(batch):
+            function()
+        calls += batch
+        elapsed = time.perf_counter() - started
+        if elapsed >= seconds:
+            return calls / elapsed
+        batch *= 2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--players', type=int, default=64,
+                        help="players in the get-player-list payload")
+    parser.add_argument('--seconds', type=float, default=0.3,
+                        help="time spent on each measurement")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.players)
+    codecs = codec.available_codecs()
+    reference = codecs["json"]
+    print(f"Codecs: {', '.join(codecs)} (default: {codec.default_codec.name})")
+    print()
+
+    header = f"{'payload':<18} {'size':>8} | " + \
+        " | ".join(f"{name:>18}" for name in codecs)
+    for operation in ("dumps", "loads"):
+        print(f"{operation} (calls/s, speedup vs json)")
+        print(header)
+        for payload_name, payload in payloads.items():
+            encoded = reference.dumps(payload)
+            results = []
+            for json_codec in codecs.values():
+                if operation == "dumps":
+                    results.append(
+                        rate(lambda: json_codec.dumps(payload), args.seconds))
+                else:
+                    results.append(
+                        rate(lambda: json_codec.loads(encoded), args.seconds))
+            baseline = results[-1]
+            print(f"{payload_name:<18} {len(encoded):>8} | " + " | ".join(
+                f"{result:>10.0f} ({result / baseline:>4.1f}x)" for result in results))
+        print()
+
+    print("typed decode (calls/s) vs dict decode with the default codec")
+    typed_engine = "msgspec" if codec.msgspec is not None else "dict conversion"
+    print(f"{'payload':<18} {'dict':>12} | {typed_engine:>16}")
+    for payload_name, response_type in codec.RESPONSE_TYPES.items():
+        encoded = reference.dumps(payloads[payload_name])
+        as_dict = rate(lambda: codec.loads(encoded), args.seconds)
+        typed = rate(lambda: codec.decode_typed(
+            response_type, encoded), args.seconds)
+        print(f"{payload_name:<18} {as_dict:>12.0f} | {typed:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+Benchmark of every layer a command goes through, against the fake game server.
+
+Runs each command for a few seconds through RemoteCommander.send_command,
+the server_commands helpers and the Flask routes (in process, with the test
+client), with several threads at once, and reports commands per second and
+latency percentiles per layer. Commands that didn't come back as Success
+are counted separately, so injected errors and timeouts show up too.
+
+Usage: python bench/bench_commands.py [--layers raw,helpers,flask] [--commands NAME,...]
+                                      [--threads N] [--seconds S] [--players N] [--latency S]
+                                      [--error-rate F] [--cache]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import config  # noqa: E402
+import server_commands  # noqa: E402
+from fake_game_server import FakeGameServer, parse_failure  # noqa: E402
+from remote_commander import RemoteCommander  # noqa: E402
+
+LAYERS = ("raw", "helpers", "flask")
+
+STEAM_ID = "76561197960287930"
+MESSAGE = "<color=#ff0000><b>Alert:</b></color> Benchmark message."
+
+# name: (arguments, server_commands call, Flask route body)
+WORKLOADS = {
+    "get-player-list": ([], server_commands.get_player_list, {}),
+    "get-mission": ([], server_commands.get_mission, {}),
+    "get-mission-time": ([], server_commands.get_mission_time, {}),
+    "send-chat-message": ([MESSAGE], lambda commander: server_commands.send_chat_message(commander, MESSAGE),
+                          {"message": MESSAGE}),
+    "set-time-remaining": (["1800.0"], lambda commander: server_commands.set_time_remaining(commander, 1800.0),
+                           {"time": 1800.0}),
+    "set-next-mission": (["BuiltIn", "Escalation", "3600.0"],
+                         lambda commander: server_commands.set_next_mission(commander, "BuiltIn", "Escalation", 3600.0),
+                         {"group": "BuiltIn", "name": "Escalation", "max_time": 3600.0}),
+    "banlist-add": ([STEAM_ID, "benchmark"], lambda commander: server_commands.banlist_add(commander, STEAM_ID, "benchmark"),
+                    {"steam_id": STEAM_ID, "reason": "benchmark"}),
+    "banlist-remove": ([STEAM_ID], lambda commander: server_commands.banlist_remove(commander, STEAM_ID),
+                       {"steam_id": STEAM_ID}),
+}
+
+DEFAULT_COMMANDS = "get-player-list,get-mission,get-mission-time,send-chat-message"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def load_app(ports, cache: bool, directory: str):
+    """Imports app.py with its game servers pointed at the fake ones and its background work off."""
+    config.SERVER_PORTS = ports
+    config.POLL_INTERVAL = 0
+    config.TELEMETRY_DB_PATH = ""
+    config.BAN_SYNC_DB_PATH = os.path.join(directory, "ban_sync.db")
+    if not cache:
+        config.STATUS_CACHE_TTL = {}
+    import app
+    return app.app
+
+
+def make_call(layer: str, command: str, port: int, flask_app, timeout: float):
+    """Returns a function sending command once through layer and returning its status name."""
+    arguments, helper, body = WORKLOADS[command]
+    if layer == "flask":
+        client = flask_app.test_client()
+        auth = (config.USERNAME, config.PASSWORD)
+        json_body = dict(body, server_port=port)
+
+        def call():
+            response = client.post(f"/command/{command}", json=json_body, auth=auth)
+            if response.status_code != 200:
+                return f"HTTP{response.status_code}"
+            return response.get_json()['status_code']
+        return call
+
+    commander = RemoteCommander("127.0.0.1", port, config.MAX_RESPONSE_BODY_SIZE, timeout=timeout)
+    if layer == "helpers":
+        return lambda: helper(commander)[0]
+    return lambda: commander.send_command(command, arguments)[0]
+
+
+def run(calls, seconds: float):
+    """Runs each call in its own thread for seconds, returns (elapsed, latencies, failures)."""
+    stop = threading.Event()
+    latencies = []
+    failures = {}
+    lock = threading.Lock()
+
+    def worker(call):
+        local = []
+        local_failures = {}
+        while not stop.is_set():
+            started = time.perf_counter()
+            status = call()
+            local.append(time.perf_counter() - started)
+            if status != "Success":
+                local_failures[status] = local_failures.get(status, 0) + 1
+        with lock:
+            latencies.extend(local)
+            for status, count in local_failures.items():
+                failures[status] = failures.get(status, 0) + count
+
+    threads = [threading.Thread(target=worker, args=(call,)) for call in calls]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    elapsed = time.perf_counter() - started
+    for thread in threads:
+        thread.join()
+    return elapsed, sorted(latencies), failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--layers', default=",".join(LAYERS), help=f"comma separated, from {', '.join(LAYERS)}")
+    parser.add_argument('--commands', default=DEFAULT_COMMANDS,
+                        help=f"comma separated, from {', '.join(WORKLOADS)}")
+    parser.add_argument('--threads', type=int, default=4, help="concurrent callers per measurement")
+    parser.add_argument('--seconds', type=float, default=2.0, help="time spent on each measurement")
+    parser.add_argument('--servers', type=int, default=1, help="fake game servers, callers are spread over them")
+    parser.add_argument('--players', type=int, default=64, help="players per fake game server")
+    parser.add_argument('--latency', type=float, default=0.0, help="fake game server latency in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many more random seconds per response")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="fraction of commands the fake game server answers with --error-code")
+    parser.add_argument('--error-code', type=int, default=5000)
+    parser.add_argument('--fail', type=parse_failure, action='append', default=[], metavar='COMMAND=CODE',
+                        help="fake game server always answers COMMAND with status CODE (repeatable)")
+    parser.add_argument('--timeout', type=float, default=config.COMMAND_TIMEOUT, help="RemoteCommander timeout")
+    parser.add_argument('--cache', action='store_true', help="keep the panel's status cache on for the flask layer")
+    parser.add_argument('--base-port', type=int, default=17879, help="first fake game server port")
+    args = parser.parse_args()
+
+    layers = [layer for layer in args.layers.split(",") if layer]
+    commands = [command for command in args.commands.split(",") if command]
+    for name in layers:
+        if name not in LAYERS:
+            parser.error(f"unknown layer {name}")
+    for name in commands:
+        if name not in WORKLOADS:
+            parser.error(f"unknown command {name}")
+
+    ports = [args.base_port + i for i in range(args.servers)]
+    server = FakeGameServer(ports, players=args.players, latency=args.latency, jitter=args.jitter,
+                            failures=dict(args.fail), error_rate=args.error_rate,
+                            error_code=args.error_code, seed=0).start()
+    print(f"{args.threads} thread(s), {args.seconds:.1f}s per measurement, {args.servers} fake server(s) "
+          f"with {args.players} players, {args.latency * 1000:.1f} ms latency"
+          f"{f', {args.error_rate:.0%} errors' if args.error_rate else ''}"
+          f"{', status cache on' if args.cache else ''}.")
+    print()
+    print(f"{'command':<20} {'layer':<8} {'count':>8} {'cmd/s':>9} {'p50 ms':>8} {'p90 ms':>8} "
+          f"{'p99 ms':>8} {'max ms':>8}  failures")
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            flask_app = load_app(ports, args.cache, directory) if "flask" in layers else None
+            for command in commands:
+                for layer in layers:
+                    calls = [make_call(layer, command, ports[i % len(ports)], flask_app, args.timeout)
+                             for i in range(args.threads)]
+                    # RemoteCommander logs every command, keep that out of the report
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        elapsed, latencies, failures = run(calls, args.seconds)
+                    failed = ", ".join(f"{status}: {count}" for status, count in sorted(failures.items()))
+                    print(f"{command:<20} {layer:<8} {len(latencies):>8} {len(latencies) / elapsed:>9.1f} "
+                          f"{percentile(latencies, 0.5) * 1000:>8.3f} {percentile(latencies, 0.9) * 1000:>8.3f} "
+                          f"{percentile(latencies, 0.99) * 1000:>8.3f} "
+                          f"{(latencies[-1] if latencies else float('nan')) * 1000:>8.3f}  {failed or '-'}")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""
+Benchmark of game servers reached through agents, all on localhost.
+
+Starts fake game servers and several agents (agent.py) splitting the servers
+between them, then compares the panel talking to the servers directly with
+going through the agents: the background poller's status snapshot of every
+server (fan_out.run_batch), and single commands as the dispatcher sends them.
+Reports the time per snapshot or command, the panel's bytes on the wire per
+snapshot and how many connections the panel holds, and checks that health
+probes of a server behind an agent that is marked down do reach it.
+
+Usage: python bench/bench_federation.py [--servers N] [--agents N] [--seconds S] [--players N] [--latency S]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, '..'))
+
+import config  # noqa: E402
+from fake_game_server import FakeGameServer  # noqa: E402
+
+SNAPSHOT = [("get-player-list", []), ("get-mission", []), ("get-mission-time", [])]
+SECRET = "bench-federation"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def start_agent(ports, listen_port):
+    """Runs an agent for ports on its own event loop thread."""
+    from agent import Agent
+    agent = Agent(ports, SECRET, config.COMMAND_TIMEOUT, config.STATUS_CACHE_TTL)
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    async def serve():
+        server = await asyncio.start_server(agent.handle, "127.0.0.1", listen_port)
+        started.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True).start()
+    started.wait(5)
+    return agent
+
+
+def measure(call, seconds):
+    latencies = []
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        begin = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - begin)
+    latencies.sort()
+    return latencies
+
+
+def check_probe(port, agent, health, remote_commander, commander_pool) -> bool:
+    """Marks a port behind an agent down and checks that a health probe still reaches the agent."""
+    tracker = health.HealthTracker(
+        [port], 1, 60, lambda probed: commander_pool.PooledCommander(probed, gated=False).send_command(
+            "get-mission-time")[0])
+    remote_commander.command_gates.append(tracker.gate)
+    try:
+        tracker.observe_command(port, "get-mission-time", "NetworkError", 0, 0, 0)
+        refused = commander_pool.PooledCommander(port).send_command("get-mission-time")[0]
+        requests = agent.requests
+        with contextlib.redirect_stdout(io.StringIO()):
+            tracker.probe_once()
+        reached = agent.requests - requests
+    finally:
+        remote_commander.command_gates.remove(tracker.gate)
+    ok = refused == health.SERVER_DOWN and reached == 1 and tracker.state(port) == health.UP
+    print(f"Health probe through an agent: commands refused with {refused} while down, probe reached "
+          f"the agent {reached} time(s), port is {tracker.state(port)} afterwards: {'ok' if ok else 'FAILED'}.")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--servers', type=int, default=32, help="fake game servers")
+    parser.add_argument('--agents', type=int, default=4, help="agents the servers are split between")
+    parser.add_argument('--seconds', type=float, default=3.0, help="time spent on each measurement")
+    parser.add_argument('--players', type=int, default=64, help="players per fake game server")
+    parser.add_argument('--latency', type=float, default=0.0, help="fake game server latency in seconds")
+    parser.add_argument('--base-port', type=int, default=18779, help="first fake game server port")
+    parser.add_argument('--agent-port', type=int, default=18700, help="first agent port")
+    args = parser.parse_args()
+
+    game_ports = [args.base_port + i for i in range(args.servers)]
+    # the panel sees the servers behind agents under other ports, like servers on other hosts
+    offset = 10000
+    config.AGENT_SECRET = SECRET
+    config.AGENT_NODES = {
+        f"node-{index}": {"address": f"127.0.0.1:{args.agent_port + index}",
+                          "ports": {str(port + offset): port for port in game_ports[index::args.agents]}}
+        for index in range(args.agents)}
+    config.STATUS_CACHE_TTL = {}
+
+    import commander_pool
+    import fan_out
+    import federation
+    import health
+    import remote_commander
+
+    traffic = {'direct': 0, 'agents': 0}
+
+    def count_bytes(port, command_name, status_name, seconds, bytes_sent, bytes_received):
+        traffic['agents' if port >= args.base_port + offset else 'direct'] += bytes_sent + bytes_received
+
+    remote_commander.command_observers.append(count_bytes)
+
+    server = FakeGameServer(game_ports, players=args.players, latency=args.latency, seed=0).start()
+    agents = [start_agent(game_ports[index::args.agents], args.agent_port + index) for index in range(args.agents)]
+    modes = {'direct': game_ports, 'agents': [port + offset for port in game_ports]}
+    print(f"{args.servers} fake server(s) with {args.players} players behind {args.agents} agent(s), "
+          f"{args.latency * 1000:.1f} ms latency, {args.seconds:.1f}s per measurement.")
+    print()
+    print(f"{'measurement':<22} {'mode':<8} {'count':>7} {'p50 ms':>8} {'p99 ms':>8} {'bytes/op':>10}")
+    try:
+        for mode, ports in modes.items():
+            # RemoteCommander logs every command, keep that out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                fan_out.run_batch(ports, SNAPSHOT, config.COMMAND_TIMEOUT, len(ports))
+                traffic[mode] = 0
+                latencies = measure(lambda: fan_out.run_batch(ports, SNAPSHOT, config.COMMAND_TIMEOUT, len(ports)),
+                                    args.seconds)
+            print(f"{'status snapshot':<22} {mode:<8} {len(latencies):>7} {percentile(latencies, 0.5) * 1000:>8.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.2f} {traffic[mode] / max(1, len(latencies)):>10.0f}")
+        for mode, ports in modes.items():
+            commander = commander_pool.PooledCommander(ports[0])
+            with contextlib.redirect_stdout(io.StringIO()):
+                traffic[mode] = 0
+                latencies = measure(lambda: commander.send_command("send-chat-message", ["Benchmark"]), args.seconds)
+            print(f"{'send-chat-message':<22} {mode:<8} {len(latencies):>7} {percentile(latencies, 0.5) * 1000:>8.2f} "
+                  f"{percentile(latencies, 0.99) * 1000:>8.2f} {traffic[mode] / max(1, len(latencies)):>10.0f}")
+        print()
+        print(f"Panel connections: {args.servers} direct, "
+              f"{sum(stats['connects'] for stats in federation.stats().values())} to agents.")
+        if not check_probe(modes['agents'][0], agents[0], health, remote_commander, commander_pool):
+            sys.exit(1)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Micro-benchmark of the RemoteCommander receive path.
+
+Compares the original receive path (bytes concatenation per chunk, decode to
+str, then json.loads) with the current one (recv_into a preallocated
+bytearray, json.loads from the bytes) for response bodies from 1 KB to 10 MB.
+Reports throughput and the peak memory allocated while receiving one response,
+both for the raw socket reads alone and for the full response including the
+JSON parse (which dominates for large player lists).
+
+Usage: python bench/bench_recv.py [--rounds N]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from remote_commander import RemoteCommander  # noqa: E402
+
+SIZES = [1024, 10 * 1024, 100 * 1024, 1024 * 1024, 10 * 1024 * 1024]
+
+
+class LegacyCommander(RemoteCommander):
+    """The receive path as it was before recv_into."""
+
+    def _recv_n(self, sock, n):
+        data = b''
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionResetError(
+                    "Connection closed unexpectedly before full message was received.")
+            data += chunk
+        return data
+
+    def _receive_response(self, sock, traffic=None):
+        header = self._recv_n(sock, 8)
+        status_int, body_length = struct.unpack('<ii', header)
+        body_str = self._recv_n(sock, body_length).decode('utf-8', errors='ignore')
+        return "Success", json.loads(body_str)
+
+
+def make_response(size: int) -> bytes:
+    """Builds a get-player-list style response with a body of roughly size bytes."""
+    player = {"steamId": "76561198000000000",
+              "displayName": "Player", "faction": "Boscali"}
+    count = max(1, size // len(json.dumps(player)))
+    body = json.dumps({"Players": [player] * count}).encode('utf-8')
+    return struct.pack('<ii', 2000, len(body)) + body
+
+
+def receive_once(receive, response: bytes):
+    receiver, sender = socket.socketpair()
+    with receiver, sender:
+        thread = threading.Thread(target=sender.sendall, args=(response,))
+        thread.start()
+        result = receive(receiver)
+        thread.join()
+    return result
+
+
+def bench(receive, response: bytes, rounds: int):
+    """Returns (MB/s, peak bytes allocated) of receive() over a socketpair."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        receive_once(receive, response)
+        started = time.perf_counter()
+        for _ in range(rounds):
+            receive_once(receive, response)
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        receive_once(receive, response)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    throughput = len(response) * rounds / elapsed / (1024 * 1024)
+    return throughput, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rounds', type=int, default=20,
+                        help="responses received per size (fewer are used for the large sizes)")
+    args = parser.parse_args()
+
+    legacy = LegacyCommander("127.0.0.1", 0)
+    current = RemoteCommander("127.0.0.1", 0)
+
+    for title, make_receive in [
+        ("Raw receive (_recv_n of the whole message)",
+         lambda commander, response: lambda sock: commander._recv_n(sock, len(response))),
+        ("Full response (_receive_response: header, body and JSON parse)",
+         lambda commander, response: commander._receive_response),
+    ]:
+        print(title)
+        print(f"{'body size':>10} | {'legacy MB/s':>11} {'peak alloc':>11} | {'current MB/s':>12} {'peak alloc':>11}")
+        for size in SIZES:
+            response = make_response(size)
+            rounds = max(2, args.rounds * 1024 * 1024 // max(size, 1024 * 1024))
+            legacy_throughput, legacy_peak = bench(
+                make_receive(legacy, response), response, rounds)
+            current_throughput, current_peak = bench(
+                make_receive(current, response), response, rounds)
+            print(f"{size // 1024:>7} KB | {legacy_throughput:>11.1f} {legacy_peak / 1024:>8.0f} KB | "
+                  f"{current_throughput:>12.1f} {current_peak / 1024:>8.0f} KB")
+        print()
+
+
+if __name__ == '__main__':
+    main()
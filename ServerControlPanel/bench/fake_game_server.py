@@ -0,0 +1,343 @@
+"""
+Stand-in for a Nuclear Option dedicated server's remote command listener,
+for benchmarks and load tests without a real game server.
+
+Speaks the protocol from ServerCommands/Readme.md: a 4-byte little-endian
+length and a JSON CommandMessage in, a 4-byte status, 4-byte body length
+and JSON body out, with any number of commands per connection. Every
+default command is implemented against a small in-memory game state per
+port (players, missions, kick and ban lists), with argument checks and
+status codes like the game's. Latency and error codes can be injected.
+
+Usage: python bench/fake_game_server.py [--port PORT ...] [--players N] [--latency S]
+                                        [--error-rate F] [--error-code CODE] [--fail COMMAND=CODE ...]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import struct
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+SUCCESS = 2000
+BAD_REQUEST = 4000
+BAD_HEADER = 4001
+BAD_LENGTH = 4002
+JSON_ERROR = 4003
+UNKNOWN_COMMAND = 4004
+BAD_ARGUMENTS = 4005
+INTERNAL_SERVER_ERROR = 5000
+COMMAND_ERROR = 5001
+CONFIG_ERROR = 5002
+
+# Largest CommandMessage accepted, longer lengths are answered with BadLength
+MAX_MESSAGE_LENGTH = 64 * 1024
+
+DEFAULT_MISSION = {"Key": {"Group": "BuiltIn", "Name": "Escalation"}, "MaxTime": 3600.0}
+DEFAULT_NEXT_MISSION = {"Key": {"Group": "BuiltIn", "Name": "Terminal Control"}, "MaxTime": 3600.0}
+
+
+def make_players(count: int, first: int = 0) -> List[Dict]:
+    return [{"steamId": str(76561198000000000 + i),
+             "displayName": f"Player {i}",
+             "faction": "Boscali" if i % 2 else "Primeva"}
+            for i in range(first, first + count)]
+
+
+def _parse_steam_id(value: str) -> Optional[str]:
+    """Returns value if it is a ulong SteamID, otherwise None."""
+    return value if value.isdigit() and int(value) < 2 ** 64 else None
+
+
+def _parse_float(value: str) -> Optional[float]:
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+class GameState:
+    """What one fake game server knows: its players, missions, kick list and ban list."""
+
+    def __init__(self, players: int):
+        self.players = make_players(players)
+        self.mission = dict(DEFAULT_MISSION)
+        self.next_mission = dict(DEFAULT_NEXT_MISSION)
+        self.mission_started = time.monotonic()
+        self.kicked = set()
+        self.banned: Dict[str, Optional[str]] = {}
+        self.config_path = "DedicatedServerConfig.json"
+
+    def mission_time(self) -> Dict:
+        # the game reports 0 for both while nobody is playing
+        if not self.players:
+            return {"currentTime": 0, "maxTime": 0}
+        current = time.monotonic() - self.mission_started
+        if current >= self.mission["MaxTime"]:
+            # like the game, load the next mission when time runs out
+            self.mission_started += self.mission["MaxTime"]
+            self.mission = self.next_mission
+            current = time.monotonic() - self.mission_started
+        return {"currentTime": round(current, 1), "maxTime": self.mission["MaxTime"]}
+
+    def execute(self, name: str, arguments: List[str]) -> Tuple[int, Optional[Dict]]:
+        """Runs a command, returns (status, body)."""
+        handler = _COMMANDS.get(name)
+        if handler is None:
+            return UNKNOWN_COMMAND, None
+        min_arguments, max_arguments, function = handler
+        if not min_arguments <= len(arguments) <= max_arguments:
+            return BAD_ARGUMENTS, None
+        return function(self, *arguments)
+
+    def _update_ready(self):
+        return SUCCESS, None
+
+    def _send_chat_message(self, message):
+        return SUCCESS, None
+
+    def _reload_config(self, path=None):
+        if path is not None:
+            self.config_path = path
+        return SUCCESS, None
+
+    def _get_mission_time(self):
+        return SUCCESS, self.mission_time()
+
+    def _get_mission(self):
+        return SUCCESS, {"currentMission": self.mission, "nextMission": self.next_mission}
+
+    def _get_player_list(self):
+        return SUCCESS, {"Players": self.players}
+
+    def _set_time_remaining(self, value):
+        seconds = _parse_float(value)
+        if seconds is None or seconds < 0:
+            return BAD_ARGUMENTS, None
+        self.mission_started = time.monotonic() - (self.mission["MaxTime"] - seconds)
+        return SUCCESS, None
+
+    def _set_next_mission(self, group, name, value):
+        max_time = _parse_float(value)
+        if max_time is None or max_time <= 0:
+            return BAD_ARGUMENTS, None
+        self.next_mission = {"Key": {"Group": group, "Name": name}, "MaxTime": max_time}
+        return SUCCESS, None
+
+    def _kick_player(self, steam_id):
+        if _parse_steam_id(steam_id) is None:
+            return BAD_ARGUMENTS, None
+        self.kicked.add(steam_id)
+        self.players = [player for player in self.players if player["steamId"] != steam_id]
+        return SUCCESS, None
+
+    def _unkick_player(self, steam_id):
+        if _parse_steam_id(steam_id) is None:
+            return BAD_ARGUMENTS, None
+        self.kicked.discard(steam_id)
+        return SUCCESS, None
+
+    def _clear_kicked_players(self):
+        self.kicked.clear()
+        return SUCCESS, None
+
+    def _banlist_reload(self):
+        return SUCCESS, None
+
+    def _banlist_add(self, steam_id, reason=None):
+        if _parse_steam_id(steam_id) is None:
+            return BAD_ARGUMENTS, None
+        self.banned[steam_id] = reason
+        self.players = [player for player in self.players if player["steamId"] != steam_id]
+        return SUCCESS, None
+
+    def _banlist_remove(self, steam_id):
+        if _parse_steam_id(steam_id) is None:
+            return BAD_ARGUMENTS, None
+        self.banned.pop(steam_id, None)
+        return SUCCESS, None
+
+    def _banlist_clear(self):
+        self.banned.clear()
+        return SUCCESS, None
+
+
+# name: (min arguments, max arguments, handler), the default commands from ServerCommands/Readme.md
+_COMMANDS = {
+    "update-ready": (0, 0, GameState._update_ready),
+    "send-chat-message": (1, 1, GameState._send_chat_message),
+    "reload-config": (0, 1, GameState._reload_config),
+    "get-mission-time": (0, 0, GameState._get_mission_time),
+    "get-mission": (0, 0, GameState._get_mission),
+    "get-player-list": (0, 0, GameState._get_player_list),
+    "set-time-remaining": (1, 1, GameState._set_time_remaining),
+    "set-next-mission": (3, 3, GameState._set_next_mission),
+    "kick-player": (1, 1, GameState._kick_player),
+    "unkick-player": (1, 1, GameState._unkick_player),
+    "clear-kicked-players": (0, 0, GameState._clear_kicked_players),
+    "banlist-reload": (0, 0, GameState._banlist_reload),
+    "banlist-add": (1, 2, GameState._banlist_add),
+    "banlist-remove": (1, 1, GameState._banlist_remove),
+    "banlist-clear": (0, 0, GameState._banlist_clear),
+}
+
+COMMAND_NAMES = tuple(_COMMANDS)
+
+
+class FakeGameServer:
+    """
+    Answers remote commands on one or more ports, each port with its own GameState.
+    latency (plus up to jitter more) is added before every response; stall makes
+    the server accept connections and read commands but never answer, like a
+    hung game server. failures maps command names to the status code they always
+    get, and error_rate is the fraction of the other commands answered with
+    error_code instead of being run.
+    """
+
+    def __init__(self, ports: List[int], host: str = "127.0.0.1", players: int = 16,
+                 latency: float = 0.0, stall: bool = False, jitter: float = 0.0,
+                 failures: Optional[Dict[str, int]] = None, error_rate: float = 0.0,
+                 error_code: int = INTERNAL_SERVER_ERROR, seed: Optional[int] = None):
+        self.ports = ports
+        self.host = host
+        self.players = players
+        self.latency = latency
+        self.stall = stall
+        self.jitter = jitter
+        self.failures = dict(failures or {})
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.states = {port: GameState(players) for port in ports}
+        self.commands_handled = 0
+        self.command_counts = Counter()
+        self._random = random.Random(seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._servers = []
+        self._thread: Optional[threading.Thread] = None
+
+    def respond(self, port: int, name: str, arguments: List[str]) -> Tuple[int, Optional[Dict]]:
+        """Returns (status, body) for a command sent to port."""
+        if name in self.failures:
+            return self.failures[name], None
+        if self.error_rate and self._random.random() < self.error_rate:
+            return self.error_code, None
+        return self.states[port].execute(name, arguments)
+
+    def _read_message(self, data: bytes) -> Tuple[int, Optional[str], List[str]]:
+        """Parses a CommandMessage, returns (status, name, arguments)."""
+        try:
+            message = json.loads(data)
+        except ValueError:
+            return JSON_ERROR, None, []
+        if not isinstance(message, dict) or not isinstance(message.get("name"), str):
+            return BAD_REQUEST, None, []
+        arguments = message.get("arguments") or []
+        if not isinstance(arguments, list) or not all(isinstance(argument, str) for argument in arguments):
+            return BAD_ARGUMENTS, None, []
+        return SUCCESS, message["name"], arguments
+
+    async def _handle(self, port: int, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header = await reader.readexactly(4)
+                (length,) = struct.unpack('<i', header)
+                if not 0 < length <= MAX_MESSAGE_LENGTH:
+                    # the rest of the stream can't be framed any more, answer and hang up
+                    writer.write(struct.pack('<ii', BAD_LENGTH, 0))
+                    await writer.drain()
+                    return
+                status, name, arguments = self._read_message(await reader.readexactly(length))
+                self.commands_handled += 1
+                self.command_counts[name] += 1
+                if self.stall:
+                    continue
+                delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+                if delay:
+                    await asyncio.sleep(delay)
+                body = None
+                if status == SUCCESS:
+                    status, body = self.respond(port, name, arguments)
+                data = json.dumps(body).encode('utf-8') if body is not None else b""
+                writer.write(struct.pack('<ii', status, len(data)) + data)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _start(self):
+        for port in self.ports:
+            self._servers.append(await asyncio.start_server(
+                lambda reader, writer, port=port: self._handle(port, reader, writer), self.host, port))
+
+    def start(self) -> "FakeGameServer":
+        """Starts serving on a background thread and returns once the ports are listening."""
+        self._loop = asyncio.new_event_loop()
+        started = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self._loop)
+            self._loop.run_until_complete(self._start())
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, name="fake-game-server", daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self):
+        """Stops serving."""
+        if self._loop is None:
+            return
+
+        async def close():
+            for server in self._servers:
+                server.close()
+                await server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop = None
+        self._servers = []
+
+
+def parse_failure(value: str) -> Tuple[str, int]:
+    """Parses a COMMAND=CODE option."""
+    name, _, code = value.partition('=')
+    if name not in _COMMANDS or not code.isdigit():
+        raise argparse.ArgumentTypeError(f"expected COMMAND=CODE with one of {', '.join(COMMAND_NAMES)}")
+    return name, int(code)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--port', type=int, action='append', help="port to listen on (repeatable, default 7779)")
+    parser.add_argument('--players', type=int, default=16, help="players in get-player-list")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added before every response")
+    parser.add_argument('--jitter', type=float, default=0.0, help="up to this many more random seconds per response")
+    parser.add_argument('--stall', action='store_true', help="read commands but never answer")
+    parser.add_argument('--fail', type=parse_failure, action='append', default=[], metavar='COMMAND=CODE',
+                        help="always answer COMMAND with status CODE (repeatable)")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="fraction of commands answered with --error-code")
+    parser.add_argument('--error-code', type=int, default=INTERNAL_SERVER_ERROR)
+    args = parser.parse_args()
+
+    server = FakeGameServer(args.port or [7779], players=args.players, latency=args.latency,
+                            stall=args.stall, jitter=args.jitter, failures=dict(args.fail),
+                            error_rate=args.error_rate, error_code=args.error_code).start()
+    print(f"Fake game server listening on {', '.join(map(str, server.ports))}. Ctrl+C to stop.")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
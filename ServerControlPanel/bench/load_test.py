@@ -0,0 +1,196 @@
+"""
+Load test of the control panel against local fake game servers.
+
+Starts fake game servers (optionally one that accepts commands but never
+answers), starts the panel in a child process with Flask's development
+server or the production server (serve.py), then has many clients hammer
+/command/get-player-list and reports requests per second and latency
+percentiles, separately for healthy and stalled game servers.
+
+Usage: python bench/load_test.py [--mode production|dev] [--clients N] [--seconds S] [--stall]
+"""
+
+import argparse
+import base64
+import http.client
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PANEL_DIR = os.path.join(BENCH_DIR, '..')
+sys.path.insert(0, PANEL_DIR)
+
+import config  # noqa: E402
+from fake_game_server import FakeGameServer  # noqa: E402
+
+# Runs the panel with its game server ports pointed at the fake servers
+_BOOTSTRAP = """
+import sys
+import config
+config.SERVER_PORTS = {ports!r}
+config.POLL_INTERVAL = 0
+config.TELEMETRY_DB_PATH = ""
+config.BAN_SYNC_DB_PATH = {ban_db!r}
+config.COMMAND_TIMEOUT = {timeout!r}
+config.SSL_CERT_PATH = config.SSL_KEY_PATH = ""
+if {no_cache!r}:
+    config.STATUS_CACHE_TTL = {{}}
+if {mode!r} == "production":
+    import serve
+    sys.argv = ["serve.py", "--bind", "127.0.0.1:{port}", "--threads", "{threads}", "--quiet"]
+    serve.main()
+else:
+    import logging
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    from app import app
+    app.run(host="127.0.0.1", port={port}, threaded=True)
+"""
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def wait_for_panel(port, process, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("The panel exited during startup.")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/metrics")
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("The panel did not start in time.")
+
+
+def client(port, targets, stop, results, lock):
+    """Sends requests round robin over targets until stop is set, on one keep-alive connection."""
+    token = base64.b64encode(f"{config.USERNAME}:{config.PASSWORD}".encode()).decode()
+    headers = {"Authorization": f"Basic {token}", "Content-Type": "application/json"}
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    local = {kind: [] for kind, _ in targets}
+    errors = 0
+    index = 0
+    while not stop.is_set():
+        kind, server_port = targets[index % len(targets)]
+        index += 1
+        body = json.dumps({"server_port": server_port})
+        started = time.perf_counter()
+        try:
+            connection.request("POST", "/command/get-player-list", body, headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+                continue
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+            continue
+        local[kind].append(time.perf_counter() - started)
+    connection.close()
+    with lock:
+        for kind, latencies in local.items():
+            results.setdefault(kind, []).extend(latencies)
+        results['errors'] = results.get('errors', 0) + errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--mode', choices=('production', 'dev'), default='production',
+                        help="serve the panel with serve.py (gunicorn) or Flask's development server")
+    parser.add_argument('--clients', type=int, default=32, help="concurrent HTTP clients")
+    parser.add_argument('--seconds', type=float, default=10.0, help="test duration")
+    parser.add_argument('--servers', type=int, default=4, help="healthy fake game servers")
+    parser.add_argument('--players', type=int, default=64, help="players per fake game server")
+    parser.add_argument('--latency', type=float, default=0.005, help="fake game server latency in seconds")
+    parser.add_argument('--stall', action='store_true',
+                        help="add a game server that never answers and have a quarter of the clients call it")
+    parser.add_argument('--timeout', type=float, default=config.COMMAND_TIMEOUT,
+                        help="panel's COMMAND_TIMEOUT for the run")
+    parser.add_argument('--no-cache', action='store_true', help="disable the panel's status cache")
+    parser.add_argument('--threads', type=int, default=config.SERVER_THREADS,
+                        help="request threads in production mode")
+    parser.add_argument('--panel-port', type=int, default=15000)
+    parser.add_argument('--base-port', type=int, default=17779, help="first fake game server port")
+    args = parser.parse_args()
+
+    healthy_ports = [args.base_port + i for i in range(args.servers)]
+    stalled_port = args.base_port + args.servers
+    servers = [FakeGameServer(healthy_ports, players=args.players, latency=args.latency).start()]
+    ports = list(healthy_ports)
+    healthy_targets = [("healthy", port) for port in healthy_ports]
+    stalled_clients = 0
+    if args.stall:
+        servers.append(FakeGameServer([stalled_port], stall=True).start())
+        ports.append(stalled_port)
+        stalled_clients = max(1, args.clients // 4)
+
+    with tempfile.TemporaryDirectory() as directory:
+        code = _BOOTSTRAP.format(ports=ports, ban_db=os.path.join(directory, "ban_sync.db"),
+                                 timeout=args.timeout, no_cache=args.no_cache, mode=args.mode,
+                                 port=args.panel_port, threads=args.threads)
+        process = subprocess.Popen([sys.executable, "-c", code], cwd=PANEL_DIR,
+                                   stdout=subprocess.DEVNULL)
+        try:
+            wait_for_panel(args.panel_port, process)
+            print(f"Panel ({args.mode}) up, {args.clients} clients for {args.seconds:.0f}s against "
+                  f"{args.servers} fake server(s){f' + 1 stalled ({stalled_clients} clients)' if args.stall else ''}"
+                  f"{', status cache off' if args.no_cache else ''}.")
+
+            stop = threading.Event()
+            results = {}
+            lock = threading.Lock()
+            threads = []
+            for i in range(args.clients):
+                if i < stalled_clients:
+                    rotated = [("stalled", stalled_port)]
+                else:
+                    # stagger the start so clients don't all hit the same game server
+                    offset = i % len(healthy_targets)
+                    rotated = healthy_targets[offset:] + healthy_targets[:offset]
+                thread = threading.Thread(target=client, args=(args.panel_port, rotated, stop, results, lock))
+                thread.start()
+                threads.append(thread)
+            started = time.perf_counter()
+            time.sleep(args.seconds)
+            stop.set()
+            elapsed = time.perf_counter() - started
+            for thread in threads:
+                thread.join()
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            for server in servers:
+                server.stop()
+
+    print(f"{'requests':<10} {'count':>8} {'req/s':>9} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for kind in ("healthy", "stalled"):
+        latencies = sorted(results.get(kind, []))
+        if not latencies and kind == "stalled":
+            continue
+        print(f"{kind:<10} {len(latencies):>8} {len(latencies) / elapsed:>9.1f} "
+              f"{percentile(latencies, 0.5) * 1000:>9.2f} {percentile(latencies, 0.9) * 1000:>9.2f} "
+              f"{percentile(latencies, 0.99) * 1000:>9.2f} "
+              f"{(latencies[-1] if latencies else float('nan')) * 1000:>9.2f}")
+    print(f"errors: {results.get('errors', 0)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+Scheduled chat announcements.
+
+Broadcasts are stored in SQLite so they survive panel restarts and are timed
+on the shared TimerWheel. A broadcast goes to a set of servers (ports, a
+SERVER_GROUPS name or "all", resolved when it is sent) and its message is a
+template filled in for each server from live state, e.g.
+
+    Server restarts in {minutes_remaining} minutes, {players} pilots online.
+
+When it is due, the reads the template needs and then the send-chat-message
+commands go to all of its servers at once through the command queue.
+"""
+
+import json
+import math
+import re
+import sqlite3
+import string
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from timer_wheel import Timer, TimerWheel
+
+Result = Tuple[str, Optional[Dict]]
+Targets = Union[str, List]
+
+# Fields a message template may use, and the command each one is read from (None: no read needed)
+TEMPLATE_FIELDS = {
+    "port": None,
+    "players": "get-player-list",
+    "mission": "get-mission",
+    "time_remaining": "get-mission-time",
+    "minutes_remaining": "get-mission-time",
+}
+
+# Values of the right types to check templates with; a failed read fills in "?" instead
+SAMPLE_VALUES = {"port": 7779, "players": 0, "mission": "Escalation", "time_remaining": "0:00",
+                 "minutes_remaining": 0}
+# Largest width or precision a template field's format spec may ask for
+MAX_FIELD_WIDTH = 100
+
+# Shortest interval (in seconds) between runs of a recurring broadcast
+MIN_INTERVAL = 10
+# A one-off broadcast that was due while the panel was stopped is still sent
+# if it is at most this many seconds late, otherwise it is marked missed
+MISSED_GRACE = 300
+
+STATES = ("scheduled", "done", "missed")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS broadcasts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    message TEXT NOT NULL,
+    targets TEXT NOT NULL,
+    next_run REAL NOT NULL,
+    interval REAL,
+    until REAL,
+    state TEXT NOT NULL,
+    created REAL NOT NULL,
+    created_by TEXT,
+    last_run REAL,
+    last_results TEXT
+);
+"""
+
+_COLUMNS = ("id", "message", "targets", "next_run", "interval", "until", "state",
+            "created", "created_by", "last_run", "last_results")
+
+
+def template_reads(message: str) -> List[str]:
+    """
+    Returns the commands needed to fill in message.
+    Raises ValueError for unknown fields or a malformed template.
+    """
+    reads = []
+    for _, field, _, _ in string.Formatter().parse(message):
+        if field is None:
+            continue
+        if field not in TEMPLATE_FIELDS:
+            raise ValueError(f"Unknown template field '{{{field}}}', expected one of "
+                             f"{', '.join(TEMPLATE_FIELDS)}. Use {{{{ and }}}} for literal braces.")
+        if TEMPLATE_FIELDS[field] is not None and TEMPLATE_FIELDS[field] not in reads:
+            reads.append(TEMPLATE_FIELDS[field])
+    return reads
+
+
+def check_template(message: str) -> List[str]:
+    """
+    Like template_reads, and also makes sure every field's format spec works
+    with its type and doesn't ask for more than MAX_FIELD_WIDTH characters.
+    """
+    reads = template_reads(message)
+    for _, field, spec, _ in string.Formatter().parse(message):
+        if field is None:
+            continue
+        if '{' in spec or any(int(number) > MAX_FIELD_WIDTH for number in re.findall(r'\d+', spec)):
+            raise ValueError(f"Format of '{{{field}}}' may not be nested or wider than {MAX_FIELD_WIDTH}.")
+    try:
+        message.format_map(SAMPLE_VALUES)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Template can't be filled in: {e}")
+    return reads
+
+
+def template_values(port: int, reads: Dict[str, Result]) -> Dict:
+    """Template fields for one server from the results of its reads. Missing reads show as "?"."""
+    values = {"port": port, "players": "?", "mission": "?", "time_remaining": "?", "minutes_remaining": "?"}
+    status_code, response = reads.get("get-player-list", ("", None))
+    if status_code == "Success" and response:
+        values["players"] = len(response.get('Players', []))
+    status_code, response = reads.get("get-mission", ("", None))
+    if status_code == "Success" and response:
+        key = (response.get('currentMission') or {}).get('Key') or {}
+        values["mission"] = key.get('Name', "?")
+    status_code, response = reads.get("get-mission-time", ("", None))
+    if status_code == "Success" and response:
+        remaining = max(0.0, float(response.get('maxTime', 0)) - float(response.get('currentTime', 0)))
+        values["time_remaining"] = f"{int(remaining // 60)}:{int(remaining % 60):02d}"
+        values["minutes_remaining"] = math.ceil(remaining / 60)
+    return values
+
+
+class BroadcastScheduler:
+    """
+    Keeps broadcasts in the SQLite database at db_path and sends them when due.
+    resolve(targets) returns (ports, error) like app.parse_ports, and
+    submit(port, command_name, arguments) queues a command and returns a Future
+    of its result (CommandDispatcher.submit).
+    """
+
+    def __init__(self, db_path: str, wheel: TimerWheel,
+                 resolve: Callable[[Targets], Tuple[Optional[List[int]], Optional[str]]],
+                 submit: Callable[[int, str, List[str]], Future]):
+        self.db_path = db_path
+        self.wheel = wheel
+        self.resolve = resolve
+        self.submit = submit
+        self._timers: Dict[int, Timer] = {}
+        self._lock = threading.Lock()
+        with self._connect() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection per use, broadcasts are sent from the wheel's worker threads
+        return sqlite3.connect(self.db_path)
+
+    @staticmethod
+    def _row(row) -> Dict:
+        broadcast = dict(zip(_COLUMNS, row))
+        broadcast['targets'] = json.loads(broadcast['targets'])
+        broadcast['last_results'] = json.loads(broadcast['last_results']) if broadcast['last_results'] else None
+        return broadcast
+
+    def start(self):
+        """Schedules the stored broadcasts, e.g. after the panel restarted."""
+        now = time.time()
+        with self._connect() as db:
+            rows = db.execute(f"SELECT {', '.join(_COLUMNS)} FROM broadcasts WHERE state = 'scheduled'").fetchall()
+            for row in rows:
+                broadcast = self._row(row)
+                next_run = broadcast['next_run']
+                if next_run < now - MISSED_GRACE:
+                    if broadcast['interval']:
+                        # skip the runs missed while the panel was stopped
+                        skipped = math.ceil((now - next_run) / broadcast['interval'])
+                        next_run += skipped * broadcast['interval']
+                    if not broadcast['interval'] or (broadcast['until'] and next_run > broadcast['until']):
+                        print(f"Broadcast {broadcast['id']} was due while the panel was stopped, marked missed.")
+                        db.execute("UPDATE broadcasts SET state = 'missed' WHERE id = ?", (broadcast['id'],))
+                        continue
+                    db.execute("UPDATE broadcasts SET next_run = ? WHERE id = ?", (next_run, broadcast['id']))
+                self._schedule(broadcast['id'], next_run)
+        self.wheel.start()
+
+    def _schedule(self, broadcast_id: int, next_run: float):
+        with self._lock:
+            timer = self._timers.pop(broadcast_id, None)
+            if timer is not None:
+                timer.cancel()
+            self._timers[broadcast_id] = self.wheel.schedule(next_run - time.time(), self._run,
+                                                             broadcast_id, next_run)
+
+    def create(self, message: str, targets: Targets = "all", at: Optional[float] = None,
+               interval: Optional[float] = None, until: Optional[float] = None,
+               created_by: Optional[str] = None) -> Dict:
+        """
+        Stores and schedules a broadcast: first sent at `at` (default now), then
+        every interval seconds if given, until `until` if given.
+        Raises ValueError for an invalid template, targets or schedule.
+        """
+        check_template(message)
+        _, error = self.resolve(targets)
+        if error:
+            raise ValueError(error)
+        now = time.time()
+        next_run = now if at is None else float(at)
+        if interval is not None:
+            interval = float(interval)
+        if until is not None:
+            until = float(until)
+        if not all(math.isfinite(value) for value in (next_run, interval, until) if value is not None):
+            raise ValueError("at, interval and until must be finite numbers.")
+        if interval is not None:
+            if interval < MIN_INTERVAL:
+                raise ValueError(f"interval must be at least {MIN_INTERVAL} seconds.")
+        elif next_run < now - MISSED_GRACE:
+            raise ValueError("at is in the past.")
+        if until is not None and until < next_run:
+            raise ValueError("until is before the first run.")
+        with self._connect() as db:
+            cursor = db.execute(
+                "INSERT INTO broadcasts (message, targets, next_run, interval, until, state, created, created_by)"
+                " VALUES (?, ?, ?, ?, ?, 'scheduled', ?, ?)",
+                (message, json.dumps(targets), next_run, interval, until, now, created_by))
+            broadcast_id = cursor.lastrowid
+        self._schedule(broadcast_id, next_run)
+        self.wheel.start()
+        return self.get(broadcast_id)
+
+    def get(self, broadcast_id: int) -> Optional[Dict]:
+        with self._connect() as db:
+            row = db.execute(f"SELECT {', '.join(_COLUMNS)} FROM broadcasts WHERE id = ?",
+                             (broadcast_id,)).fetchone()
+        return self._row(row) if row is not None else None
+
+    def all(self) -> List[Dict]:
+        """Every stored broadcast, scheduled ones first, by next run."""
+        with self._connect() as db:
+            rows = db.execute(f"SELECT {', '.join(_COLUMNS)} FROM broadcasts"
+                              f" ORDER BY state != 'scheduled', next_run").fetchall()
+        return [self._row(row) for row in rows]
+
+    def delete(self, broadcast_id: int) -> bool:
+        """Cancels and forgets a broadcast. Returns False if it doesn't exist."""
+        with self._lock:
+            timer = self._timers.pop(broadcast_id, None)
+            if timer is not None:
+                timer.cancel()
+        with self._connect() as db:
+            return db.execute("DELETE FROM broadcasts WHERE id = ?", (broadcast_id,)).rowcount > 0
+
+    def _run(self, broadcast_id: int, due: float):
+        broadcast = self.get(broadcast_id)
+        # deleted or rescheduled since this timer was set
+        if broadcast is None or broadcast['state'] != 'scheduled' or broadcast['next_run'] != due:
+            return
+        with self._lock:
+            self._timers.pop(broadcast_id, None)
+        try:
+            results = self.send(broadcast)
+        except Exception as e:
+            # the schedule goes on, the error shows up as the run's result
+            print(f"Error: Broadcast {broadcast_id} failed. {e}")
+            results = {'error': str(e)}
+        now = time.time()
+        interval = broadcast['interval']
+        next_run, state = due, 'done'
+        if interval:
+            next_run = due + max(1, math.ceil((now - due) / interval)) * interval
+            if not broadcast['until'] or next_run <= broadcast['until']:
+                state = 'scheduled'
+        with self._connect() as db:
+            updated = db.execute(
+                "UPDATE broadcasts SET next_run = ?, state = ?, last_run = ?, last_results = ?"
+                " WHERE id = ? AND next_run = ?",
+                (next_run, state, now, json.dumps(results), broadcast_id, due)).rowcount
+        if updated and state == 'scheduled':
+            self._schedule(broadcast_id, next_run)
+
+    def send(self, broadcast: Dict) -> Dict[str, Dict]:
+        """Fills in and sends a broadcast to all of its servers at once. Returns the result per port."""
+        ports, error = self.resolve(broadcast['targets'])
+        if error:
+            print(f"Error: Broadcast {broadcast['id']} not sent. {error}")
+            return {'error': error}
+        message = broadcast['message']
+        reads = template_reads(message)
+        pending = {port: {name: self.submit(port, name, []) for name in reads} for port in ports}
+        sends = {}
+        results = {}
+        for port, futures in pending.items():
+            values = template_values(port, {name: future.result() for name, future in futures.items()})
+            try:
+                text = message.format_map(values)
+            except (TypeError, ValueError) as e:
+                # e.g. a number format for a value whose read failed ("?")
+                print(f"Port {port}: Broadcast {broadcast['id']} not sent, template failed. {e}")
+                results[str(port)] = {'status_code': 'TemplateError', 'message': None}
+                continue
+            sends[port] = (text, self.submit(port, "send-chat-message", [text]))
+        for port, (text, future) in sends.items():
+            status_code, _ = future.result()
+            if status_code != "Success":
+                print(f"Port {port}: Broadcast {broadcast['id']} failed with status: {status_code}")
+            results[str(port)] = {'status_code': status_code, 'message': text}
+        return results
@@ -0,0 +1,198 @@
+"""
+JSON codec used for the remote command protocol and the panel's HTTP responses.
+
+Uses orjson or msgspec when one is installed and falls back to the stdlib json
+module otherwise. Also provides optional typed decoding of the documented
+response shapes, which skips building intermediate dicts when msgspec is available.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+class Codec:
+    """
+    A named pair of dumps (object -> UTF-8 bytes) and loads (bytes/str -> object)
+    functions, plus the exceptions loads raises for invalid JSON.
+    """
+
+    def __init__(self, name: str, dumps: Callable[[Any], bytes], loads: Callable[[Any], Any],
+                 decode_errors: Tuple[Type[Exception], ...]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+        self.decode_errors = decode_errors
+
+
+def _stdlib_codec() -> Codec:
+    return Codec(
+        "json",
+        lambda obj: json.dumps(obj, separators=(',', ':')).encode('utf-8'),
+        json.loads,
+        (json.JSONDecodeError, UnicodeDecodeError))
+
+
+def _orjson_codec() -> Codec:
+    return Codec(
+        "orjson",
+        lambda obj: orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS),
+        orjson.loads,
+        (orjson.JSONDecodeError,))
+
+
+def _msgspec_codec() -> Codec:
+    encoder = msgspec.json.Encoder()
+    decoder = msgspec.json.Decoder()
+    return Codec("msgspec", encoder.encode, decoder.decode, (msgspec.DecodeError,))
+
+
+def available_codecs() -> Dict[str, Codec]:
+    """Returns every codec that can be used in this environment, fastest first."""
+    codecs = {}
+    if orjson is not None:
+        codecs["orjson"] = _orjson_codec()
+    if msgspec is not None:
+        codecs["msgspec"] = _msgspec_codec()
+    codecs["json"] = _stdlib_codec()
+    return codecs
+
+
+def get_codec(name: str = "auto") -> Codec:
+    """Returns the codec called name ("orjson", "msgspec" or "json"), or the fastest available for "auto"."""
+    codecs = available_codecs()
+    if name == "auto":
+        return next(iter(codecs.values()))
+    if name not in codecs:
+        raise ValueError(f"JSON codec '{name}' is not installed.")
+    return codecs[name]
+
+
+default_codec = get_codec()
+
+
+def dumps(obj: Any) -> bytes:
+    """Encodes obj to UTF-8 JSON bytes with the default codec."""
+    return default_codec.dumps(obj)
+
+
+def loads(data) -> Any:
+    """Decodes JSON bytes or str with the default codec."""
+    return default_codec.loads(data)
+
+
+# Exceptions raised by loads and decode_typed for bodies that can't be decoded
+DECODE_ERRORS = default_codec.decode_errors + (ValueError,)
+
+
+# Typed response shapes from ServerCommands/Readme.md.
+# msgspec Structs when msgspec is installed (decoded without intermediate dicts),
+# plain dataclasses otherwise.
+
+if msgspec is not None:
+    _ResponseBase = msgspec.Struct
+    _field = msgspec.field
+
+    def _response_type(cls):
+        return cls
+else:
+    class _ResponseBase:
+        pass
+
+    _field = field
+    _response_type = dataclass
+
+
+@_response_type
+class Player(_ResponseBase):
+    steamId: str = ""
+    displayName: str = ""
+    faction: Optional[str] = None
+
+
+@_response_type
+class PlayerList(_ResponseBase):
+    Players: List[Player] = _field(default_factory=list)
+
+
+@_response_type
+class MissionKey(_ResponseBase):
+    Group: str = ""
+    Name: str = ""
+
+
+@_response_type
+class Mission(_ResponseBase):
+    Key: MissionKey = _field(default_factory=MissionKey)
+    MaxTime: float = 0.0
+
+
+@_response_type
+class MissionInfo(_ResponseBase):
+    currentMission: Optional[Mission] = None
+    nextMission: Optional[Mission] = None
+
+
+@_response_type
+class MissionTime(_ResponseBase):
+    currentTime: float = 0.0
+    maxTime: float = 0.0
+
+
+# Which typed shape each command responds with
+RESPONSE_TYPES: Dict[str, type] = {
+    "get-player-list": PlayerList,
+    "get-mission": MissionInfo,
+    "get-mission-time": MissionTime,
+}
+
+_typed_decoders: Dict[type, Any] = {}
+
+
+def decode_typed(response_type: type, data) -> Any:
+    """
+    Decodes a response body straight into response_type (one of the types above).
+    With msgspec the objects are built while parsing; otherwise the body is
+    parsed with the default codec and converted.
+    """
+    if msgspec is not None:
+        decoder = _typed_decoders.get(response_type)
+        if decoder is None:
+            decoder = msgspec.json.Decoder(response_type)
+            _typed_decoders[response_type] = decoder
+        try:
+            return decoder.decode(data)
+        except msgspec.ValidationError as e:
+            raise ValueError(f"Response does not match {response_type.__name__}: {e}") from e
+    return _from_dict(response_type, loads(data))
+
+
+def _from_dict(response_type: type, data: Optional[Dict]) -> Any:
+    if data is None:
+        return None
+    if response_type is PlayerList:
+        return PlayerList([Player(player.get('steamId', ""), player.get('displayName', ""), player.get('faction'))
+                           for player in data.get('Players') or []])
+    if response_type is MissionInfo:
+        return MissionInfo(_mission_from_dict(data.get('currentMission')),
+                           _mission_from_dict(data.get('nextMission')))
+    if response_type is MissionTime:
+        return MissionTime(data.get('currentTime', 0.0), data.get('maxTime', 0.0))
+    raise ValueError(f"No typed decoder for {response_type.__name__}")
+
+
+def _mission_from_dict(data: Optional[Dict]) -> Optional[Mission]:
+    if data is None:
+        return None
+    key = data.get('Key') or {}
+    return Mission(MissionKey(key.get('Group', ""), key.get('Name', "")), data.get('MaxTime', 0.0))
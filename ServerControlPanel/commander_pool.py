@@ -0,0 +1,79 @@
+"""
+Shared event loop holding one AsyncRemoteCommander per game server port.
+
+Flask handles requests on worker threads, so coroutines are submitted to a
+single background loop. That way every request reuses the same persistent
+connections instead of opening a new socket per command. Ports served by an
+agent on another host (config.AGENT_NODES) get a federation.AgentCommander,
+which shares the one connection to that agent.
+"""
+
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import config
+import federation
+from remote_commander import AsyncRemoteCommander
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_commanders: Dict[int, Union[AsyncRemoteCommander, federation.AgentCommander]] = {}
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """Returns the background event loop, starting it on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=_loop.run_forever, name="commander-pool", daemon=True)
+            thread.start()
+    return _loop
+
+
+def get_commander(port: int) -> Union[AsyncRemoteCommander, federation.AgentCommander]:
+    """
+    Returns the AsyncRemoteCommander (or AgentCommander) for a port.
+    Must be called from coroutines running on the background loop.
+    """
+    commander = _commanders.get(port)
+    if commander is None:
+        commander = federation.get_commander(port, config.COMMAND_TIMEOUT)
+        if commander is None:
+            commander = AsyncRemoteCommander(
+                "127.0.0.1", port, timeout=config.COMMAND_TIMEOUT, max_body_size=config.MAX_RESPONSE_BODY_SIZE)
+        _commanders[port] = commander
+    return commander
+
+
+def run(coro, timeout: Optional[float] = None):
+    """
+    Runs a coroutine on the background loop and blocks the calling thread until it finishes.
+    Raises concurrent.futures.TimeoutError if it takes longer than timeout.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except Exception:
+        future.cancel()
+        raise
+
+
+async def _send(port: int, command_name: str, arguments: List[str], gated: bool):
+    return await get_commander(port).send_command(command_name, arguments, gated=gated)
+
+
+class PooledCommander:
+    """
+    Stands in for RemoteCommander, sending through the background loop's commander for a port.
+    gated=False skips remote_commander.command_gates, like RemoteCommander's.
+    """
+
+    def __init__(self, port: int, gated: bool = True):
+        self.port = port
+        self.gated = gated
+
+    def send_command(self, command_name: str, arguments: List[str] = []) -> Tuple[str, Optional[Dict]]:
+        return run(_send(self.port, command_name, list(arguments), self.gated))
@@ -4,13 +4,130 @@
 # what ports are game servers listening on?
 # add more ports if there are multiple servers on localhost
 SERVER_PORTS = [7779]
+# named groups of the ports above, usable wherever the panel takes a list of
+# server_ports (batches, ban syncs, broadcasts), e.g. {"eu": [7779, 7780]}
+SERVER_GROUPS = {}
+
+# largest response body (in bytes) accepted from a game server
+MAX_RESPONSE_BODY_SIZE = 16 * 1024 * 1024
+# how long (in seconds) to wait when connecting to a game server,
+# and how long a whole command may take before it fails with TimeoutError
+COMMAND_CONNECT_TIMEOUT = 2.0
+COMMAND_TIMEOUT = 5.0
+
+# Agent Configuration
+# game servers on other hosts, each reached through an agent (agent.py) running there.
+# list their ports in SERVER_PORTS too. "ports" is a list of the node's ports, or
+# {"port in the panel": port on the node} when several nodes use the same ports, e.g.
+# AGENT_NODES = {"eu-1": {"address": "10.0.0.2:7800", "ports": {"8779": 7779, "8780": 7780}}}
+AGENT_NODES = {}
+# shared secret panels and agents authenticate each other with, must be the same on both
+AGENT_SECRET = ""
+# address an agent listens on for panels (used when running agent.py)
+AGENT_LISTEN_HOST = "0.0.0.0"
+AGENT_LISTEN_PORT = 7800
+
+# Health Check Configuration
+# how many commands in a row must fail to reach a game server before it is marked down,
+# commands to a server that is down fail with ServerDown right away instead of waiting
+# set to 0 to disable
+HEALTH_FAILURE_THRESHOLD = 3
+# how often (in seconds) a server that is down is probed to see if it is back
+HEALTH_PROBE_INTERVAL = 5.0
+
+# Command Dispatcher Configuration
+# commands from panel requests, batches, scheduled broadcasts and ban syncs wait
+# in a queue per game server: moderation (kicks, bans, chat) first, then other
+# writes, then status reads, then ban sync commands.
+# the background poller doesn't use the queue: it only reads, its load is fixed
+# (three reads per server every POLL_INTERVAL), dashboards use its samples
+# instead of queueing reads of their own, and servers behind an agent answer it
+# with one request per host
+# how many commands the panel sends to one game server at the same time
+DISPATCH_CONCURRENCY = 2
+# how many commands per second may reach one game server, and how many may go
+# back to back after a quiet period. set DISPATCH_RATE to 0 for no limit
+DISPATCH_RATE = 20.0
+DISPATCH_BURST = 10
+# how many ban sync commands per second may reach one game server. they only go
+# out while nothing else is queued and don't count against DISPATCH_RATE.
+# set to 0 for no limit
+DISPATCH_BULK_RATE = 200.0
+# commands that waited longer than this (in seconds) in the queue fail with QueueTimeout
+DISPATCH_MAX_WAIT = 10.0
+
+# Batch Command Configuration
+# how long to wait for each game server to answer a batch or a poll, in seconds
+# (batches also wait up to DISPATCH_MAX_WAIT in the queue)
+BATCH_TIMEOUT = 5.0
+# how many game servers the background poller talks to at the same time
+BATCH_MAX_CONCURRENCY = 8
+
+# Ban Sync Configuration
+# SQLite file that remembers which SteamIDs the bulk ban sync pushed to each server
+BAN_SYNC_DB_PATH = "ban_sync.db"
+# how many ban commands may be queued for a game server at once during a sync
+BAN_SYNC_MAX_IN_FLIGHT = 32
+
+# Broadcast Configuration
+# SQLite file scheduled chat announcements are kept in, leave empty to disable them
+BROADCAST_DB_PATH = "broadcasts.db"
+
+# Status Cache Configuration
+# how long (in seconds) results of read-only commands are reused before asking the game server again
+# set to 0 to disable caching for a command
+STATUS_CACHE_TTL = {
+    "get-player-list": 2.0,
+    "get-mission": 10.0,
+    "get-mission-time": 1.0,
+}
+
+# Status Poller Configuration
+# how often (in seconds) the panel samples every server for the live dashboard
+# set to 0 to disable background polling
+POLL_INTERVAL = 5.0
+
+# Mission Rotation Configuration
+# JSON file with mission playlists and which server plays which, leave empty to disable
+# automatic rotation. see "Mission rotation" in README.md for the format
+ROTATION_PATH = ""
+# how long (in seconds) before a mission ends the next mission is picked and set
+ROTATION_LEAD = 60
+# how far (in seconds) a server's mission clock may be off the estimate before it is read again
+ROTATION_DRIFT_TOLERANCE = 10
+
+# Telemetry Configuration
+# SQLite file the background poller's samples are stored in, leave empty to disable history
+TELEMETRY_DB_PATH = "telemetry.db"
+# how long (in seconds) raw samples and the 1 minute / 1 hour rollups are kept
+TELEMETRY_RETENTION = {
+    "raw": 2 * 24 * 3600,
+    "1m": 30 * 24 * 3600,
+    "1h": 400 * 24 * 3600,
+}
 
 # Web Application Configuration
 FLASK_HOST = "0.0.0.0"
 FLASK_PORT = 5000
+# request handler threads when running with serve.py (production mode)
+# every open live status or player event stream keeps one thread busy
+SERVER_THREADS = 32
 
 # Security Configuration
 USERNAME = "admin"
 PASSWORD = "changeme"  # PLEASE CHANGE THIS!
+# users that can log in, replaces USERNAME/PASSWORD when not empty
+# create a password_hash with `python auth.py hash-password`
+# scopes: "status" (read-only), "moderation" (chat, kick, ban lists) or "admin" (everything),
+# each scope includes the ones before it
+USERS = {
+    # "moderator": {"password_hash": "pbkdf2_sha256$600000$...", "scopes": ["moderation"]},
+}
+# secret that signs the tokens from /auth/token, leave empty to generate one at startup
+# (tokens then stop working when the panel restarts)
+TOKEN_SECRET = ""
+# how long (in seconds) session tokens last, and the longest an API token may last
+SESSION_TOKEN_TTL = 12 * 3600
+API_TOKEN_TTL = 90 * 24 * 3600
 SSL_CERT_PATH = ""  # Path to your SSL certificate file (e.g., /path/to/cert.pem)
 SSL_KEY_PATH = ""   # Path to your SSL private key file (e.g., /path/to/key.pem)
@@ -0,0 +1,294 @@
+"""
+Per-port command queue between the panel and the game servers.
+
+Every command sent on behalf of a panel request waits in its server's
+priority queue: moderation commands (kicks, bans, chat) go before the other
+writes, and those before status reads, so a burst of dashboard reads can't
+hold up a kick. Bulk jobs like ban syncs queue behind everything else. Each
+port has a token bucket limiting how many commands per second reach the
+game's main thread (bulk commands have a bucket of their own), and a read
+that is already waiting in the queue is shared instead of being queued twice.
+"""
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+from status_cache import CACHED_COMMANDS
+
+Result = Tuple[str, Optional[Dict]]
+
+# Priorities, lower runs first
+MODERATION = 0
+CONTROL = 1
+STATUS = 2
+# Never picked by command_priority, given to submit() by bulk jobs (ban syncs)
+BULK = 3
+PRIORITY_NAMES = {MODERATION: "moderation", CONTROL: "control", STATUS: "status", BULK: "bulk"}
+
+MODERATION_COMMANDS = (
+    "kick-player", "unkick-player", "clear-kicked-players", "send-chat-message",
+    "banlist-add", "banlist-remove", "banlist-clear", "banlist-reload",
+)
+
+# Returned instead of sending a command that waited in the queue longer than max_wait
+QUEUE_TIMEOUT = "QueueTimeout"
+
+# How many recent queue waits per port the percentiles in stats() are taken from
+WAIT_SAMPLES = 1000
+
+# Callables notified when a command leaves the queue with
+# (port, priority_name, seconds_waited, commands_still_queued), e.g. to collect metrics.
+dispatch_observers: List[Callable[[int, str, float, int], None]] = []
+
+
+def command_priority(command_name: str) -> int:
+    if command_name in CACHED_COMMANDS:
+        return STATUS
+    if command_name in MODERATION_COMMANDS:
+        return MODERATION
+    return CONTROL
+
+
+def _percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class _Entry:
+    def __init__(self, command_name: str, arguments: List[str], priority: int, key: Optional[Tuple]):
+        self.command_name = command_name
+        self.arguments = arguments
+        self.priority = priority
+        # (command_name, arguments) for reads that later identical reads may share
+        self.key = key
+        self.queued_at = time.monotonic()
+        self.rate_limited = False
+        self.future: Future = Future()
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+
+    def seconds_until_token(self) -> float:
+        """Refills the bucket and returns how long until a token is available (0 if one is)."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take_token(self):
+        if self.rate > 0:
+            self.tokens -= 1
+
+
+class _PortQueue:
+    def __init__(self, lock: threading.Lock, rate: float, burst: int, bulk_rate: float):
+        self.changed = threading.Condition(lock)
+        self.heap: List[Tuple[int, int, _Entry]] = []
+        self.pending_reads: Dict[Tuple, _Entry] = {}
+        self.bucket = _TokenBucket(rate, burst)
+        # BULK commands only run when nothing else is queued, and have a budget of their own
+        self.bulk_bucket = _TokenBucket(bulk_rate, burst)
+        self.in_flight = 0
+        self.workers: List[threading.Thread] = []
+        self.dispatched = 0
+        self.deduplicated = 0
+        self.rate_limited = 0
+        self.timed_out = 0
+        self.waits: Deque[float] = collections.deque(maxlen=WAIT_SAMPLES)
+
+
+class CommandDispatcher:
+    """
+    Runs send(port, command_name, arguments) for queued commands, at most
+    concurrency at a time per port and at most rate per second (bursts of up
+    to burst; rate 0 means no limit). BULK commands are limited to bulk_rate
+    per second instead. Commands that waited more than max_wait seconds to be
+    sent return (QUEUE_TIMEOUT, None) without being sent.
+    """
+
+    def __init__(self, send: Callable[[int, str, List[str]], Result], concurrency: int = 1,
+                 rate: float = 0.0, burst: int = 1, max_wait: float = 10.0, bulk_rate: float = 0.0):
+        self.send = send
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.burst = burst
+        self.bulk_rate = bulk_rate
+        self.max_wait = max_wait
+        self._ports: Dict[int, _PortQueue] = {}
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def _queue(self, port: int) -> _PortQueue:
+        queue = self._ports.get(port)
+        if queue is None:
+            queue = self._ports[port] = _PortQueue(self._lock, self.rate, self.burst, self.bulk_rate)
+            for index in range(self.concurrency):
+                worker = threading.Thread(target=self._run, args=(port, queue),
+                                          name=f"dispatch-{port}-{index}", daemon=True)
+                worker.start()
+                queue.workers.append(worker)
+        return queue
+
+    def submit(self, port: int, command_name: str, arguments: List[str] = [],
+               priority: Optional[int] = None) -> Future:
+        """
+        Queues a command and returns a Future of its (status_code_name, response) result.
+        priority defaults to command_priority(command_name).
+        """
+        if priority is None:
+            priority = command_priority(command_name)
+        key = (command_name, tuple(arguments)) if priority == STATUS else None
+        with self._lock:
+            queue = self._queue(port)
+            if key is not None:
+                waiting = queue.pending_reads.get(key)
+                if waiting is not None:
+                    queue.deduplicated += 1
+                    return waiting.future
+            entry = _Entry(command_name, list(arguments), priority, key)
+            if key is not None:
+                queue.pending_reads[key] = entry
+            heapq.heappush(queue.heap, (priority, next(self._sequence), entry))
+            queue.changed.notify()
+        return entry.future
+
+    def send_command(self, port: int, command_name: str, arguments: List[str] = []) -> Result:
+        """Queues a command and waits for its result."""
+        return self.submit(port, command_name, arguments).result()
+
+    def run_batch(self, ports: Sequence[int], commands: Sequence[Tuple[str, List[str]]],
+                  timeout: float) -> Dict[int, List[Dict]]:
+        """
+        Queues the same list of (command_name, arguments) on every port at once.
+        Results that aren't back within max_wait + timeout seconds are reported
+        as TimeoutError. Returns a dict of port -> list of
+        {'command', 'status_code', 'response'} in command order, like fan_out.run_batch.
+        """
+        futures = {port: [(name, self.submit(port, name, arguments)) for name, arguments in commands]
+                   for port in ports}
+        deadline = time.monotonic() + self.max_wait + timeout
+        results = {}
+        for port, port_futures in futures.items():
+            results[port] = []
+            for name, future in port_futures:
+                try:
+                    status_code, response = future.result(max(0.0, deadline - time.monotonic()))
+                except FutureTimeoutError:
+                    status_code, response = "TimeoutError", None
+                results[port].append({'command': name, 'status_code': status_code, 'response': response})
+            if any(result['status_code'] == "TimeoutError" for result in results[port]):
+                print(f"Error: Server on port {port} timed out during batch.")
+        return results
+
+    def commander(self, port: int) -> "DispatchedCommander":
+        """Returns a commander for server_commands that sends through this dispatcher."""
+        return DispatchedCommander(self, port)
+
+    def _next_entry(self, port: int, queue: _PortQueue) -> Tuple[_Entry, Optional[Result]]:
+        """
+        Waits for the highest priority entry that may be sent now and takes it off the queue.
+        Returns (entry, result), where result is already set if the entry expired.
+        """
+        with queue.changed:
+            while True:
+                if not queue.heap:
+                    queue.changed.wait()
+                    continue
+                entry = queue.heap[0][2]
+                waited = time.monotonic() - entry.queued_at
+                expired = waited > self.max_wait
+                if not expired:
+                    bucket = queue.bulk_bucket if entry.priority == BULK else queue.bucket
+                    delay = bucket.seconds_until_token()
+                    if delay > 0:
+                        if not entry.rate_limited:
+                            entry.rate_limited = True
+                            queue.rate_limited += 1
+                        # wake up early if something more urgent is queued meanwhile
+                        queue.changed.wait(delay)
+                        continue
+                    bucket.take_token()
+                heapq.heappop(queue.heap)
+                if entry.key is not None:
+                    queue.pending_reads.pop(entry.key, None)
+                queue.waits.append(waited)
+                depth = len(queue.heap)
+                if expired:
+                    queue.timed_out += 1
+                else:
+                    queue.in_flight += 1
+                    queue.dispatched += 1
+                break
+
+        for observer in dispatch_observers:
+            try:
+                observer(port, PRIORITY_NAMES[entry.priority], waited, depth)
+            except Exception as e:
+                print(f"Error: Dispatch observer failed. {e}")
+        if expired:
+            print(f"Error: Command {entry.command_name} to port {port} waited {waited:.1f}s in the queue, dropped.")
+            return entry, (QUEUE_TIMEOUT, None)
+        return entry, None
+
+    def _run(self, port: int, queue: _PortQueue):
+        while True:
+            entry, result = self._next_entry(port, queue)
+            if result is not None:
+                entry.future.set_result(result)
+                continue
+            try:
+                result = self.send(port, entry.command_name, entry.arguments)
+            except Exception as e:
+                print(f"Error: Command {entry.command_name} to port {port} failed. {e}")
+                result = ("NetworkError", None)
+            finally:
+                with self._lock:
+                    queue.in_flight -= 1
+            entry.future.set_result(result)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Queue depth, in-flight commands, counters and recent queue wait times per port."""
+        result = {}
+        with self._lock:
+            for port, queue in self._ports.items():
+                queued = collections.Counter(PRIORITY_NAMES[priority] for priority, _, _ in queue.heap)
+                waits = sorted(queue.waits)
+                oldest = min((entry.queued_at for _, _, entry in queue.heap), default=None)
+                result[str(port)] = {
+                    'queued': {name: queued.get(name, 0) for name in PRIORITY_NAMES.values()},
+                    'in_flight': queue.in_flight,
+                    'oldest_wait': time.monotonic() - oldest if oldest is not None else 0.0,
+                    'dispatched': queue.dispatched,
+                    'deduplicated': queue.deduplicated,
+                    'rate_limited': queue.rate_limited,
+                    'timed_out': queue.timed_out,
+                    'wait_seconds': {'p50': _percentile(waits, 0.5), 'p95': _percentile(waits, 0.95),
+                                     'max': waits[-1] if waits else None},
+                }
+        return result
+
+
+class DispatchedCommander:
+    """Stands in for RemoteCommander in server_commands, sending through a CommandDispatcher."""
+
+    def __init__(self, dispatcher: CommandDispatcher, port: int):
+        self.dispatcher = dispatcher
+        self.port = port
+
+    def send_command(self, command_name: str, arguments: List[str] = []) -> Result:
+        return self.dispatcher.send_command(self.port, command_name, arguments)
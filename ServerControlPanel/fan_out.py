@@ -0,0 +1,66 @@
+"""
+Runs a batch of commands on several game servers at once.
+"""
+
+import asyncio
+from typing import Dict, List, Sequence, Tuple
+
+import commander_pool
+import federation
+
+
+async def _run_on_server(port: int, commands: Sequence[Tuple[str, List[str]]], timeout: float, limit: asyncio.Semaphore):
+    """Pipelines every command to one server, giving up on whatever is left after timeout seconds."""
+    async with limit:
+        commander = commander_pool.get_commander(port)
+        tasks = [asyncio.ensure_future(commander.send_command(name, arguments))
+                 for name, arguments in commands]
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"Error: Server on port {port} timed out during batch.")
+
+    results = [task.result() if task.done() and not task.cancelled() else ("TimeoutError", None)
+               for task in tasks]
+    return [{'command': name, 'status_code': status_code, 'response': response}
+            for (name, _), (status_code, response) in zip(commands, results)]
+
+
+async def _run_on_node(connection, ports: Dict[int, int], commands: Sequence[Tuple[str, List[str]]],
+                       timeout: float, limit: asyncio.Semaphore):
+    """Runs the batch on all of one agent's servers with a single request."""
+    async with limit:
+        results = await federation.run_node_batch(connection, ports, commands, timeout)
+    return {port: [{'command': name, 'status_code': status_code, 'response': response}
+                   for (name, _), (status_code, response) in zip(commands, results[port])]
+            for port in ports}
+
+
+async def _run_batch(ports: Sequence[int], commands: Sequence[Tuple[str, List[str]]], timeout: float, max_concurrency: int):
+    limit = asyncio.Semaphore(max(1, max_concurrency))
+    local, nodes = federation.group_by_node(ports)
+    results = await asyncio.gather(
+        *(_run_on_server(port, commands, timeout, limit) for port in local),
+        *(_run_on_node(connection, node_ports, commands, timeout, limit)
+          for connection, node_ports in nodes.items()))
+    by_port = dict(zip(local, results))
+    for node_results in results[len(local):]:
+        by_port.update(node_results)
+    return {port: by_port[port] for port in ports}
+
+
+def run_batch(ports: Sequence[int], commands: Sequence[Tuple[str, List[str]]], timeout: float, max_concurrency: int) -> Dict[int, List[Dict]]:
+    """
+    Sends the same list of (command_name, arguments) to every port concurrently.
+
+    Each server gets its own timeout, so a slow or dead server only affects its
+    own results. Returns a dict of port -> list of
+    {'command', 'status_code', 'response'} in command order.
+    """
+    # every server is bounded by its own timeout, the extra margin only covers
+    # servers that had to queue behind max_concurrency
+    waves = -(-len(ports) // max(1, max_concurrency))
+    return commander_pool.run(
+        _run_batch(list(ports), list(commands), timeout, max_concurrency),
+        timeout * max(1, waves) + 1)
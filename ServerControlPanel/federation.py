@@ -0,0 +1,360 @@
+"""
+Game servers on other hosts, reached through agents.
+
+An agent (agent.py) runs on each game host and keeps persistent connections
+to the servers there. The panel keeps one connection per agent and
+multiplexes every command for that host's servers over it: each request
+carries an id, so responses can come back in any order and a slow server
+doesn't hold up the others. A status batch for all of a host's servers (the
+background poller's snapshot) is a single request with a single, compressed
+response, and the agent answers repeated reads from its own cache.
+
+Frames on the agent connection are a 4-byte little-endian payload length, a
+flags byte (FLAG_COMPRESSED: the payload is zlib compressed) and the payload,
+a JSON object. Both sides prove they know AGENT_SECRET with an HMAC over
+each other's random nonce before anything else is sent. The connection
+isn't encrypted, run it over a private network or a VPN.
+
+Panel ports are mapped to nodes in config.AGENT_NODES; commander_pool and
+fan_out send commands for those ports through here instead of to 127.0.0.1.
+"""
+
+import asyncio
+import hashlib
+import hmac
+import itertools
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import codec
+import config
+from remote_commander import _check_gates, _notify_observers
+
+Result = Tuple[str, Optional[Dict]]
+
+PROTOCOL_VERSION = 1
+
+_HEADER = struct.Struct('<IB')
+FLAG_COMPRESSED = 1
+# Payloads larger than this many bytes are compressed
+COMPRESS_THRESHOLD = 1024
+# Largest frame either side accepts
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+# Largest frame accepted before the other side has authenticated; those frames are never compressed
+HANDSHAKE_FRAME_SIZE = 4096
+
+# Extra seconds the panel waits for an agent beyond the agent's own command timeout
+AGENT_MARGIN = 1.0
+
+
+class AgentError(Exception):
+    """The agent refused the connection or broke the protocol."""
+
+
+def encode_frame(message: Dict) -> bytes:
+    payload = codec.dumps(message)
+    flags = 0
+    if len(payload) > COMPRESS_THRESHOLD:
+        payload = zlib.compress(payload, 1)
+        flags |= FLAG_COMPRESSED
+    return _HEADER.pack(len(payload), flags) + payload
+
+
+async def read_frame(reader: asyncio.StreamReader, max_size: int = MAX_FRAME_SIZE,
+                     compressed: bool = True) -> Tuple[Dict, int]:
+    """
+    Reads one frame of at most max_size bytes and returns (message, frame size).
+    compressed=False refuses compressed frames, e.g. before authentication.
+    Raises AgentError for a bad frame.
+    """
+    length, flags = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    if length > max_size:
+        raise AgentError(f"Frame of {length} bytes is larger than the limit ({max_size}).")
+    if flags & FLAG_COMPRESSED and not compressed:
+        raise AgentError("Compressed frame where none is allowed.")
+    payload = await reader.readexactly(length)
+    try:
+        if flags & FLAG_COMPRESSED:
+            payload = zlib.decompressobj().decompress(payload, MAX_FRAME_SIZE)
+        message = codec.loads(payload)
+    except (zlib.error,) + codec.DECODE_ERRORS as e:
+        raise AgentError(f"Could not decode frame. {e}")
+    if not isinstance(message, dict):
+        raise AgentError("Frame is not a JSON object.")
+    return message, _HEADER.size + length
+
+
+def sign(secret: bytes, role: str, *nonces: str) -> str:
+    """HMAC proving knowledge of the shared secret, bound to who signs and both nonces."""
+    return hmac.new(secret, ":".join((role,) + nonces).encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+def new_nonce() -> str:
+    return os.urandom(16).hex()
+
+
+def parse_node_ports(ports) -> Dict[int, int]:
+    """A node's "ports": a list of ports, or {panel port: port on the node} when they differ."""
+    if isinstance(ports, dict):
+        return {int(panel_port): int(node_port) for panel_port, node_port in ports.items()}
+    return {int(port): int(port) for port in ports}
+
+
+class AgentConnection:
+    """
+    The panel's connection to one agent, opened on first use and reopened after
+    it drops. Must be used from coroutines on one event loop (commander_pool's).
+    """
+
+    def __init__(self, name: str, host: str, port: int, secret: str, timeout: Optional[float] = 10.0):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.secret = secret.encode('utf-8')
+        self.timeout = timeout
+        self.agent_ports: List[int] = []
+        self.connects = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            hello, _ = await asyncio.wait_for(read_frame(reader, HANDSHAKE_FRAME_SIZE, compressed=False),
+                                              self.timeout)
+            if hello.get('type') != 'hello' or hello.get('version') != PROTOCOL_VERSION:
+                raise AgentError(f"Unexpected greeting from agent {self.name}.")
+            agent_nonce = str(hello.get('nonce', ''))
+            nonce = new_nonce()
+            writer.write(encode_frame({'type': 'auth', 'nonce': nonce,
+                                       'mac': sign(self.secret, 'panel', agent_nonce, nonce)}))
+            welcome, _ = await asyncio.wait_for(read_frame(reader), self.timeout)
+            if welcome.get('type') != 'welcome':
+                raise AgentError(f"Agent {self.name} refused the connection: {welcome.get('error')}")
+            if not hmac.compare_digest(str(welcome.get('mac', '')), sign(self.secret, 'agent', nonce, agent_nonce)):
+                raise AgentError(f"Agent {self.name} doesn't know the shared secret.")
+        except BaseException:
+            writer.close()
+            raise
+        self.agent_ports = list(welcome.get('ports', []))
+        self.connects += 1
+        self._reader, self._writer = reader, writer
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+        print(f"Connected to agent {self.name} at {self.host}:{self.port}.")
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                message, size = await read_frame(reader)
+                self.bytes_received += size
+                future = self._pending.pop(message.get('id'), None)
+                # a response the panel stopped waiting for is dropped, it can't be mistaken for another
+                if future is not None and not future.done():
+                    future.set_result((message, size))
+        except asyncio.IncompleteReadError:
+            print(f"Error: Agent {self.name} closed the connection.")
+        except (OSError, AgentError) as e:
+            print(f"Error: Connection to agent {self.name} failed. {e}")
+        except asyncio.CancelledError:
+            return
+        if reader is self._reader:
+            self._reset()
+
+    def _reset(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        pending, self._pending = self._pending, {}
+        for future in pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f"Connection to agent {self.name} was lost."))
+
+    async def request(self, message: Dict, timeout: Optional[float]) -> Tuple[Dict, int, int]:
+        """
+        Sends a request and waits for its response. Returns (response, bytes_sent, bytes_received).
+        Raises OSError/ConnectionError/AgentError if the agent can't be reached
+        and asyncio.TimeoutError if it doesn't answer within timeout.
+        """
+        async with self._lock:
+            if not self.connected:
+                await self._connect()
+        request_id = next(self._ids)
+        frame = encode_frame(dict(message, id=request_id))
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            self._writer.write(frame)
+            self.bytes_sent += len(frame)
+            response, received = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+        return response, len(frame), received
+
+    async def close(self):
+        self._reset()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+    def stats(self) -> Dict:
+        return {'address': f"{self.host}:{self.port}", 'connected': self.connected, 'connects': self.connects,
+                'in_flight': len(self._pending), 'agent_ports': self.agent_ports,
+                'bytes_sent': self.bytes_sent, 'bytes_received': self.bytes_received}
+
+
+class AgentCommander:
+    """
+    Stands in for AsyncRemoteCommander for a panel port served by an agent.
+    Gates and observers see the panel port, like for a local server.
+    """
+
+    def __init__(self, connection: AgentConnection, port: int, node_port: int, timeout: Optional[float] = 10.0):
+        self.connection = connection
+        self.port = port
+        self.node_port = node_port
+        self.timeout = timeout
+
+    async def send_command(self, command_name: str, arguments: List[str] = [], gated: bool = True) -> Result:
+        """gated=False skips command_gates, like AsyncRemoteCommander.send_command."""
+        started = time.perf_counter()
+        refused = _check_gates(self.port, command_name) if gated else None
+        if refused is not None:
+            _notify_observers(self.port, command_name, refused, time.perf_counter() - started, 0, 0)
+            return refused, None
+        sent = received = 0
+        try:
+            response, sent, received = await self.connection.request(
+                {'type': 'command', 'port': self.node_port, 'name': command_name, 'arguments': list(arguments)},
+                None if self.timeout is None else self.timeout + AGENT_MARGIN)
+            result = (str(response.get('status', 'BadRequest')), response.get('body'))
+        except asyncio.TimeoutError:
+            print(f"Error: Timed out waiting for agent {self.connection.name} to answer {command_name}.")
+            result = ("TimeoutError", None)
+        except (OSError, AgentError) as e:
+            print(f"Network or connection error: {e}")
+            result = ("NetworkError", None)
+        _notify_observers(self.port, command_name, result[0], time.perf_counter() - started, sent, received)
+        return result
+
+    async def send_commands(self, commands: Sequence[Tuple[str, List[str]]]) -> List[Result]:
+        return list(await asyncio.gather(*(self.send_command(name, list(arguments)) for name, arguments in commands)))
+
+    async def close(self):
+        pass
+
+
+async def run_node_batch(connection: AgentConnection, ports: Dict[int, int],
+                         commands: Sequence[Tuple[str, List[str]]], timeout: float) -> Dict[int, List[Result]]:
+    """
+    Runs the same commands on several of one agent's servers with a single request.
+    ports maps panel ports to the node's ports. Returns panel port -> results in command order.
+    """
+    started = time.perf_counter()
+    results: Dict[int, List[Result]] = {}
+    send = {}
+    for port, node_port in ports.items():
+        refused = next((status for status in (_check_gates(port, name) for name, _ in commands)
+                        if status is not None), None)
+        if refused is not None:
+            results[port] = [(refused, None)] * len(commands)
+        else:
+            send[port] = node_port
+    if send:
+        sent = received = 0
+        try:
+            response, sent, received = await connection.request(
+                {'type': 'batch', 'ports': list(send.values()), 'timeout': timeout,
+                 'commands': [[name, list(arguments)] for name, arguments in commands]},
+                timeout + AGENT_MARGIN)
+            node_results = response.get('results', {})
+            for port, node_port in send.items():
+                results[port] = [tuple(result) for result in node_results.get(str(node_port), [])] \
+                    or [("BadRequest", None)] * len(commands)
+        except asyncio.TimeoutError:
+            print(f"Error: Agent {connection.name} timed out during batch.")
+            results.update({port: [("TimeoutError", None)] * len(commands) for port in send})
+        except (OSError, AgentError) as e:
+            print(f"Network or connection error: {e}")
+            results.update({port: [("NetworkError", None)] * len(commands) for port in send})
+        seconds = time.perf_counter() - started
+        # the traffic of the whole request is split evenly over its commands
+        count = len(send) * len(commands) or 1
+        for port in send:
+            for (name, _), (status, _) in zip(commands, results[port]):
+                _notify_observers(port, name, status, seconds, sent // count, received // count)
+    return results
+
+
+_connections: Dict[str, AgentConnection] = {}
+# panel port -> (node name, port on the node)
+_routes: Dict[int, Tuple[str, int]] = {}
+_load_lock = threading.Lock()
+
+
+def _load_nodes():
+    global _connections, _routes
+    if _connections or not config.AGENT_NODES:
+        return
+    with _load_lock:
+        if _connections:
+            return
+        connections = {}
+        routes = {}
+        for name, node in config.AGENT_NODES.items():
+            host, _, port = node['address'].rpartition(':')
+            connections[name] = AgentConnection(name, host, int(port), config.AGENT_SECRET, config.COMMAND_TIMEOUT)
+            for panel_port, node_port in parse_node_ports(node.get('ports', [])).items():
+                routes[panel_port] = (name, node_port)
+        # routes first: a thread that sees the connections skips the lock and relies on them
+        _routes = routes
+        _connections = connections
+
+
+def route(port: int) -> Optional[Tuple[AgentConnection, int]]:
+    """Returns (connection, port on the node) for a port served by an agent, or None for a local one."""
+    _load_nodes()
+    target = _routes.get(port)
+    if target is None:
+        return None
+    return _connections[target[0]], target[1]
+
+
+def get_commander(port: int, timeout: Optional[float]) -> Optional[AgentCommander]:
+    target = route(port)
+    if target is None:
+        return None
+    return AgentCommander(target[0], port, target[1], timeout)
+
+
+def group_by_node(ports: Sequence[int]) -> Tuple[List[int], Dict[AgentConnection, Dict[int, int]]]:
+    """Splits ports into local ones and {connection: {panel port: port on the node}}."""
+    local = []
+    nodes: Dict[AgentConnection, Dict[int, int]] = {}
+    for port in ports:
+        target = route(port)
+        if target is None:
+            local.append(port)
+        else:
+            nodes.setdefault(target[0], {})[port] = target[1]
+    return local, nodes
+
+
+def stats() -> Dict[str, Dict]:
+    """Connection state and traffic of every agent."""
+    _load_nodes()
+    return {name: connection.stats() for name, connection in _connections.items()}
@@ -0,0 +1,174 @@
+"""
+Tracks which game servers answer and fails commands to the ones that don't.
+
+While a game server restarts, every command to it waits for its connect
+timeout. After failure_threshold commands in a row couldn't reach a server
+it is marked down: commands to it return ServerDown straight away (through
+remote_commander.command_gates) and a background thread probes it every
+probe_interval seconds until it answers again.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Sequence
+
+# Port states: commands go through, commands fail fast, a probe is running (commands still fail fast)
+UP = "up"
+DOWN = "down"
+PROBING = "probing"
+
+# Status returned instead of sending a command to a server that is down
+SERVER_DOWN = "ServerDown"
+
+# Results that mean the game server couldn't be reached, rather than that it answered with an error
+UNREACHABLE = ("NetworkError", "ConnectionError", "TimeoutError")
+
+
+def is_unreachable(status_name: str) -> bool:
+    return status_name in UNREACHABLE or status_name.endswith("_ConnectionError")
+
+
+class _PortHealth:
+    def __init__(self):
+        self.state = UP
+        self.consecutive_failures = 0
+        self.last_status: Optional[str] = None
+        self.last_success: Optional[float] = None
+        self.down_since: Optional[float] = None
+        self.last_probe: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'last_status': self.last_status,
+            'last_success': self.last_success,
+            'down_since': self.down_since,
+            'last_probe': self.last_probe,
+        }
+
+
+class HealthTracker:
+    """
+    Per-port circuit breaker. observe_command and gate are meant to be added to
+    remote_commander.command_observers and remote_commander.command_gates.
+    probe(port) sends a cheap command without asking the gates (e.g. with a
+    gated=False commander) and returns its status name; it is the only thing
+    that reaches a server while it is down. Times in snapshot() are Unix
+    timestamps.
+    """
+
+    def __init__(self, ports: Sequence[int], failure_threshold: int, probe_interval: float,
+                 probe: Callable[[int], str]):
+        self.failure_threshold = max(1, failure_threshold)
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self._ports: Dict[int, _PortHealth] = {port: _PortHealth() for port in ports}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _health(self, port: int) -> _PortHealth:
+        health = self._ports.get(port)
+        if health is None:
+            health = self._ports[port] = _PortHealth()
+        return health
+
+    def gate(self, port: int, command_name: str) -> Optional[str]:
+        """remote_commander.command_gates callback, refuses commands to servers that are down."""
+        with self._lock:
+            health = self._ports.get(port)
+            if health is not None and health.state != UP:
+                return SERVER_DOWN
+        return None
+
+    def observe_command(self, port: int, command_name: str, status_name: str, seconds: float,
+                        bytes_sent: int, bytes_received: int):
+        """remote_commander.command_observers callback."""
+        if status_name == SERVER_DOWN:
+            return
+        with self._lock:
+            # everything but the probe is refused while probing, probe_once records the probe's result
+            if self._health(port).state == PROBING:
+                return
+        self._record(port, status_name)
+
+    def _record(self, port: int, status_name: str):
+        marked_down = False
+        with self._lock:
+            health = self._health(port)
+            health.last_status = status_name
+            if not is_unreachable(status_name):
+                if health.state != UP:
+                    print(f"Port {port}: Answering again after "
+                          f"{time.time() - health.down_since:.0f} seconds.")
+                health.state = UP
+                health.consecutive_failures = 0
+                health.last_success = time.time()
+                health.down_since = None
+                return
+            health.consecutive_failures += 1
+            if health.state == UP and health.consecutive_failures >= self.failure_threshold:
+                health.state = DOWN
+                health.down_since = time.time()
+                marked_down = True
+        if marked_down:
+            print(f"Port {port}: {self.failure_threshold} command(s) in a row failed ({status_name}), "
+                  f"failing fast until it answers a probe.")
+            self.start()
+
+    def state(self, port: int) -> str:
+        with self._lock:
+            health = self._ports.get(port)
+            return health.state if health is not None else UP
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Returns the health of every known port, keyed by port."""
+        with self._lock:
+            return {str(port): health.to_dict() for port, health in self._ports.items()}
+
+    def start(self):
+        """Starts the probe thread. Does nothing if it is already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="health-probe", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.probe_interval)
+            try:
+                self.probe_once()
+            except Exception as e:
+                print(f"Error: Health probe failed. {e}")
+
+    def probe_once(self):
+        """Probes every port that is down, all at once."""
+        with self._lock:
+            ports = [port for port, health in self._ports.items() if health.state == DOWN]
+            for port in ports:
+                self._ports[port].state = PROBING
+        if not ports:
+            return
+        with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            for port, status_name in zip(ports, executor.map(self._probe_port, ports)):
+                # SERVER_DOWN means the probe never reached the server
+                if is_unreachable(status_name) or status_name == SERVER_DOWN:
+                    with self._lock:
+                        health = self._ports[port]
+                        health.state = DOWN
+                        health.last_status = status_name
+                else:
+                    self._record(port, status_name)
+
+    def _probe_port(self, port: int) -> str:
+        try:
+            return self.probe(port)
+        except Exception as e:
+            print(f"Error: Health probe of port {port} failed. {e}")
+            return "NetworkError"
+        finally:
+            with self._lock:
+                self._ports[port].last_probe = time.time()
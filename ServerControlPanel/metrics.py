@@ -0,0 +1,114 @@
+"""
+Prometheus metrics for the control panel.
+
+Remote command latency, traffic and results are collected through
+remote_commander.command_observers, queue waits through
+dispatcher.dispatch_observers, and player counts / mission time come
+from the background poller's samples.
+"""
+
+from typing import Dict, Optional, Tuple
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter,
+                               Gauge, Histogram, generate_latest)
+
+# Commands documented in ServerCommands/Readme.md; anything else is labelled "other"
+# so arbitrary names sent through /command/batch can't blow up label cardinality
+KNOWN_COMMANDS = {
+    "update-ready", "send-chat-message", "reload-config", "get-mission-time",
+    "get-mission", "get-player-list", "set-time-remaining", "set-next-mission",
+    "kick-player", "unkick-player", "clear-kicked-players", "banlist-reload",
+    "banlist-add", "banlist-remove", "banlist-clear",
+}
+
+registry = CollectorRegistry()
+
+command_duration = Histogram(
+    'nuclear_option_command_duration_seconds',
+    'Time from connecting/sending a remote command to receiving its response.',
+    ['port', 'command'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+             0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    registry=registry)
+command_results = Counter(
+    'nuclear_option_command_results_total',
+    'Remote command results by status (StatusCode name or client error such as NetworkError).',
+    ['port', 'command', 'status'],
+    registry=registry)
+command_sent_bytes = Counter(
+    'nuclear_option_command_sent_bytes_total',
+    'Bytes sent to the game server command port.',
+    ['port', 'command'],
+    registry=registry)
+command_received_bytes = Counter(
+    'nuclear_option_command_received_bytes_total',
+    'Bytes received from the game server command port.',
+    ['port', 'command'],
+    registry=registry)
+
+players = Gauge(
+    'nuclear_option_players',
+    'Players connected to the game server.',
+    ['port'],
+    registry=registry)
+mission_time = Gauge(
+    'nuclear_option_mission_time_seconds',
+    'Elapsed time of the current mission.',
+    ['port'],
+    registry=registry)
+mission_max_time = Gauge(
+    'nuclear_option_mission_max_time_seconds',
+    'Maximum time of the current mission.',
+    ['port'],
+    registry=registry)
+command_queue_wait = Histogram(
+    'nuclear_option_command_queue_wait_seconds',
+    'Time commands from panel requests waited in their game server\'s queue.',
+    ['port', 'priority'],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    registry=registry)
+command_queue_depth = Gauge(
+    'nuclear_option_command_queue_depth',
+    'Commands still waiting in the game server\'s queue when the last one left it.',
+    ['port'],
+    registry=registry)
+server_up = Gauge(
+    'nuclear_option_server_up',
+    'Whether the last status poll of the game server succeeded.',
+    ['port'],
+    registry=registry)
+
+
+def observe_command(port: int, command_name: str, status_name: str, seconds: float, bytes_sent: int, bytes_received: int):
+    """remote_commander.command_observers callback."""
+    port = str(port)
+    command = command_name if command_name in KNOWN_COMMANDS else "other"
+    command_duration.labels(port, command).observe(seconds)
+    command_results.labels(port, command, status_name).inc()
+    command_sent_bytes.labels(port, command).inc(bytes_sent)
+    command_received_bytes.labels(port, command).inc(bytes_received)
+
+
+def observe_dispatch(port: int, priority: str, seconds: float, depth: int):
+    """dispatcher.dispatch_observers callback."""
+    command_queue_wait.labels(str(port), priority).observe(seconds)
+    command_queue_depth.labels(str(port)).set(depth)
+
+
+def on_status(port: int, sample: Dict[str, Tuple[str, Optional[Dict]]]):
+    """StatusPoller listener that updates the player and mission time gauges."""
+    port = str(port)
+    status_code, response = sample.get("get-player-list", ("", None))
+    server_up.labels(port).set(1 if status_code == "Success" else 0)
+    if status_code == "Success" and response:
+        players.labels(port).set(len(response.get('Players', [])))
+
+    status_code, response = sample.get("get-mission-time", ("", None))
+    if status_code == "Success" and response:
+        mission_time.labels(port).set(response.get('currentTime', 0))
+        mission_max_time.labels(port).set(response.get('maxTime', 0))
+
+
+def render() -> Tuple[bytes, str]:
+    """Returns the metrics in the Prometheus text format and its content type."""
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,72 @@
+"""
+Index of which server every known player is on.
+
+Looking a player up by steamId is a dict lookup, and display names are kept
+in a sorted list so a prefix search is a binary search plus the matches,
+instead of asking every server for its player list.
+"""
+
+import bisect
+import time
+from typing import Dict, List, Tuple
+
+
+def _name_key(display_name) -> str:
+    return str(display_name or "").casefold()
+
+
+class PlayerIndex:
+    """
+    Maps steamId to the ports a player was last seen on, and display names to
+    steamIds. Not thread safe on its own, PlayerTracker updates and reads it
+    under its lock.
+    """
+
+    def __init__(self):
+        # steamId -> port -> player dict from get-player-list
+        self._locations: Dict[str, Dict[int, Dict]] = {}
+        # sorted (casefolded display name, steamId, port)
+        self._names: List[Tuple[str, str, int]] = []
+        # port -> time.time() of the player list the index has for it
+        self._updated: Dict[int, float] = {}
+
+    def apply(self, port: int, previous: Dict[str, Dict], current: Dict[str, Dict]):
+        """Records the change from one player list of a server (keyed by steamId) to the next."""
+        self._updated[port] = time.time()
+        for steam_id, player in previous.items():
+            new = current.get(steam_id)
+            if new is None or new.get('displayName') != player.get('displayName'):
+                self._remove(port, steam_id, player)
+        for steam_id, player in current.items():
+            old = previous.get(steam_id)
+            if old is None or old.get('displayName') != player.get('displayName'):
+                bisect.insort(self._names, (_name_key(player.get('displayName')), steam_id, port))
+            self._locations.setdefault(steam_id, {})[port] = player
+
+    def _remove(self, port: int, steam_id: str, player: Dict):
+        entry = (_name_key(player.get('displayName')), steam_id, port)
+        position = bisect.bisect_left(self._names, entry)
+        if position < len(self._names) and self._names[position] == entry:
+            del self._names[position]
+        ports = self._locations.get(steam_id)
+        if ports is not None:
+            ports.pop(port, None)
+            if not ports:
+                del self._locations[steam_id]
+
+    def _location(self, port: int, player: Dict) -> Dict:
+        return dict(player, port=port, updated=self._updated.get(port))
+
+    def locate(self, steam_id: str) -> List[Dict]:
+        """Returns the player on every server they are on (normally one), with port and list time."""
+        return [self._location(port, player) for port, player in self._locations.get(steam_id, {}).items()]
+
+    def search(self, prefix: str, limit: int = 20) -> List[Dict]:
+        """Returns up to limit players whose display name starts with prefix (case-insensitive), by name."""
+        key = _name_key(prefix)
+        results = []
+        for name, steam_id, port in self._names[bisect.bisect_left(self._names, (key,)):]:
+            if not name.startswith(key) or len(results) >= limit:
+                break
+            results.append(self._location(port, self._locations[steam_id][port]))
+        return results
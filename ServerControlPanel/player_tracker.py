@@ -0,0 +1,122 @@
+"""
+Tracks who is on each game server and turns successive player lists into a
+stream of join, leave and faction-change events.
+
+Clients keep a cursor and ask for the changes since it, so each poll costs
+O(changes) instead of re-downloading and comparing the whole player list.
+"""
+
+import collections
+import itertools
+import threading
+import time
+from typing import Deque, Dict, List, Optional, Tuple
+
+from player_index import PlayerIndex
+
+# How many events are kept for clients to catch up on
+MAX_EVENTS = 10000
+
+
+class PlayerTracker:
+    """
+    Keeps the last player list of every server, keyed by steamId, and an
+    append-only log of the differences between consecutive lists.
+    Every event gets a cursor; cursors are consecutive integers starting at 1.
+    """
+
+    def __init__(self, max_events: int = MAX_EVENTS):
+        self._players: Dict[int, Dict[str, Dict]] = {}
+        self._index = PlayerIndex()
+        self._events: Deque[Dict] = collections.deque(maxlen=max_events)
+        self._next_cursor = 1
+        self._changed = threading.Condition()
+
+    def update(self, port: int, players: List[Dict]) -> List[Dict]:
+        """
+        Replaces the known player list of a server and returns the events for
+        what changed. The first list seen for a server reports everyone as joining.
+        """
+        current = {player['steamId']: player for player in players if 'steamId' in player}
+        now = time.time()
+
+        with self._changed:
+            previous = self._players.get(port, {})
+            self._players[port] = current
+            self._index.apply(port, previous, current)
+
+            events = []
+            for steam_id in current.keys() - previous.keys():
+                events.append(self._event(now, port, 'join', current[steam_id]))
+            for steam_id in previous.keys() - current.keys():
+                events.append(self._event(now, port, 'leave', previous[steam_id]))
+            for steam_id in current.keys() & previous.keys():
+                old_faction = previous[steam_id].get('faction')
+                if current[steam_id].get('faction') != old_faction:
+                    event = self._event(now, port, 'faction-change', current[steam_id])
+                    event['previousFaction'] = old_faction
+                    events.append(event)
+
+            if events:
+                self._changed.notify_all()
+            return events
+
+    def on_status(self, port: int, sample: Dict[str, Tuple[str, Optional[Dict]]]):
+        """StatusPoller listener that records every successful get-player-list sample."""
+        status_code, response = sample.get("get-player-list", ("", None))
+        if status_code == "Success" and response:
+            self.update(port, response.get('Players', []))
+
+    def players(self, port: int) -> List[Dict]:
+        """Returns the last known player list of a server."""
+        with self._changed:
+            return list(self._players.get(port, {}).values())
+
+    def locate(self, steam_id: str) -> List[Dict]:
+        """Returns the player with steam_id on every server they were last seen on, with its port."""
+        with self._changed:
+            return self._index.locate(steam_id)
+
+    def search(self, prefix: str, limit: int = 20) -> List[Dict]:
+        """Returns up to limit players on any server whose display name starts with prefix."""
+        with self._changed:
+            return self._index.search(prefix, limit)
+
+    def events_since(self, cursor: int, port: Optional[int] = None, timeout: float = 0) -> Tuple[List[Dict], int, bool]:
+        """
+        Returns (events, cursor, reset) for every event after cursor,
+        optionally only for one port. If there are none, waits up to timeout
+        seconds for some to arrive. reset is True if events after cursor have
+        already been dropped from the log, or cursor is ahead of the log (e.g.
+        from before a panel restart), in which case the caller should resync
+        from players() and continue from the returned cursor.
+        """
+        with self._changed:
+            if timeout > 0 and cursor == self._next_cursor - 1:
+                self._changed.wait_for(
+                    lambda: cursor < self._next_cursor - 1, timeout)
+
+            latest = self._next_cursor - 1
+            first_cursor = self._events[0]['cursor'] if self._events else self._next_cursor
+            reset = cursor < first_cursor - 1 or cursor > latest
+            # the newest events are at the right end, so only walk the ones being returned
+            count = min(len(self._events), max(0, latest - cursor))
+            events = list(itertools.islice(reversed(self._events), count))[::-1]
+
+        if port is not None:
+            events = [event for event in events if event['port'] == port]
+        return events, latest, reset
+
+    def _event(self, now: float, port: int, event_type: str, player: Dict) -> Dict:
+        event = {
+            'cursor': self._next_cursor,
+            'time': now,
+            'port': port,
+            'type': event_type,
+            'steamId': player.get('steamId'),
+            'displayName': player.get('displayName'),
+            'faction': player.get('faction'),
+        }
+        self._next_cursor += 1
+        self._events.append(event)
+        return event
@@ -0,0 +1,127 @@
+"""
+Background poller that samples the status of every game server on a fixed
+schedule and pushes what changed to subscribers (the dashboard's SSE stream).
+
+The load on the game servers stays the same no matter how many admins have
+the panel open.
+"""
+
+import queue
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import fan_out
+from status_cache import CACHED_COMMANDS, StatusCache
+
+# How many undelivered updates a subscriber may fall behind before it is resynced with a snapshot
+SUBSCRIBER_QUEUE_SIZE = 64
+
+
+class StatusPoller:
+    """
+    Polls get-player-list, get-mission and get-mission-time on every port and
+    keeps the latest result of each. Subscribers receive ('snapshot', state)
+    when they join and ('delta', changes) after every poll that changed something.
+    """
+
+    def __init__(self, ports: Sequence[int], interval: float, timeout: float, max_concurrency: int,
+                 status_cache: Optional[StatusCache] = None):
+        self.ports = list(ports)
+        self.interval = interval
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.status_cache = status_cache
+        self._state: Dict[str, Dict[str, Dict]] = {}
+        self._subscribers: List[queue.Queue] = []
+        self._listeners: List[Callable] = []
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Starts the polling thread. Does nothing if it is already running or polling is disabled."""
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="status-poller", daemon=True)
+            self._thread.start()
+
+    def snapshot(self) -> Dict[str, Dict[str, Dict]]:
+        """Returns the latest result of every command, keyed by port then command name."""
+        with self._lock:
+            return {port: dict(commands) for port, commands in self._state.items()}
+
+    def add_listener(self, listener: Callable[[int, Dict[str, Tuple[str, Optional[Dict]]]], None]):
+        """Registers a callback that receives every sample the poller takes."""
+        self._listeners.append(listener)
+
+    def subscribe(self) -> queue.Queue:
+        """Registers a new subscriber; its queue starts with a full snapshot."""
+        subscriber = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            subscriber.put(('snapshot', {port: dict(commands)
+                           for port, commands in self._state.items()}))
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.poll_once()
+            except Exception as e:
+                print(f"Error: Status poll failed. {e}")
+            time.sleep(max(0.0, self.interval - (time.monotonic() - started)))
+
+    def poll_once(self):
+        """Samples every server once and publishes the changes."""
+        commands = [(name, []) for name in CACHED_COMMANDS]
+        results = fan_out.run_batch(
+            self.ports, commands, self.timeout, self.max_concurrency)
+
+        delta = {}
+        with self._lock:
+            for port, port_results in results.items():
+                previous = self._state.setdefault(str(port), {})
+                for result in port_results:
+                    name = result['command']
+                    entry = {'status_code': result['status_code'],
+                             'response': result['response']}
+                    if self.status_cache is not None:
+                        self.status_cache.put(
+                            port, name, (entry['status_code'], entry['response']))
+                    if previous.get(name) != entry:
+                        previous[name] = entry
+                        delta.setdefault(str(port), {})[name] = entry
+
+            if delta:
+                for subscriber in self._subscribers:
+                    self._publish(subscriber, ('delta', delta))
+
+        for port, port_results in results.items():
+            sample = {result['command']: (result['status_code'], result['response'])
+                      for result in port_results}
+            for listener in self._listeners:
+                try:
+                    listener(port, sample)
+                except Exception as e:
+                    print(f"Error: Status listener failed. {e}")
+
+    def _publish(self, subscriber: queue.Queue, message):
+        try:
+            subscriber.put_nowait(message)
+        except queue.Full:
+            # the client has fallen behind, replace its backlog with the current state
+            while not subscriber.empty():
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    break
+            subscriber.put_nowait(('snapshot', {port: dict(commands)
+                                  for port, commands in self._state.items()}))
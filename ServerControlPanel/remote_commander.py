@@ -1,8 +1,16 @@
-import json
+import asyncio
+import collections
 import socket
 import struct
+import time
 from enum import IntEnum, auto
-from typing import List, Dict, Optional, Tuple
+from typing import Any, Callable, Deque, List, Dict, Optional, Sequence, Tuple
+
+import codec
+
+
+# Largest response body accepted, so a corrupt length header can't trigger a huge allocation
+DEFAULT_MAX_BODY_SIZE = 16 * 1024 * 1024
 
 
 class StatusCode(IntEnum):
@@ -21,6 +29,36 @@ class StatusCode(IntEnum):
 
     InternalServerError = 5000
     CommandError = 5001
+    ConfigError = 5002
+
+
+# Callables notified after every command with
+# (port, command_name, status_code_name, seconds, bytes_sent, bytes_received),
+# e.g. to collect metrics. Must be fast and must not raise.
+command_observers: List[Callable[[int, str, str, float, int, int], None]] = []
+
+
+def _notify_observers(port: int, command_name: str, status_name: str, seconds: float, bytes_sent: int, bytes_received: int):
+    for observer in command_observers:
+        try:
+            observer(port, command_name, status_name,
+                     seconds, bytes_sent, bytes_received)
+        except Exception as e:
+            print(f"Error: Command observer failed. {e}")
+
+
+# Callables asked before every command with (port, command_name). If one returns a
+# status name the command isn't sent and returns (status_name, None) instead,
+# e.g. so a circuit breaker can fail fast on a server that is known to be down.
+command_gates: List[Callable[[int, str], Optional[str]]] = []
+
+
+def _check_gates(port: int, command_name: str) -> Optional[str]:
+    for gate in command_gates:
+        refused = gate(port, command_name)
+        if refused is not None:
+            return refused
+    return None
 
 
 class RemoteCommander:
@@ -29,9 +67,19 @@ class RemoteCommander:
     with built-in protocol handling for the response header (status/length).
     """
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, max_body_size: int = DEFAULT_MAX_BODY_SIZE,
+                 typed_responses: bool = False, timeout: Optional[float] = None,
+                 connect_timeout: Optional[float] = None, gated: bool = True):
         self.host = host
         self.port = port
+        self.max_body_size = max_body_size
+        # decode the documented responses into codec's dataclasses instead of dicts
+        self.typed_responses = typed_responses
+        # seconds the whole command may take once connected, and seconds to connect (defaults to timeout)
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout if connect_timeout is not None else timeout
+        # False skips command_gates, for health probes of a server that is marked down
+        self.gated = gated
 
     def send_command(self, command_name: str, arguments: List[str] = []) -> Tuple[str, Optional[Dict]]:
         """
@@ -42,33 +90,61 @@ class RemoteCommander:
         status_code_name is the name of the StatusCode enum (e.g., "Success", "BadRequest").
         For network/parsing errors, returns descriptive error names like "NetworkError".
         """
+        started = time.perf_counter()
+        traffic = {'sent': 0, 'received': 0}
+        refused = _check_gates(self.port, command_name) if self.gated else None
+        if refused is not None:
+            result = (refused, None)
+        else:
+            result = self._send_command(command_name, arguments, traffic)
+        _notify_observers(self.port, command_name, result[0], time.perf_counter() - started,
+                          traffic['sent'], traffic['received'])
+        return result
+
+    def _send_command(self, command_name: str, arguments: List[str], traffic: Dict[str, int]) -> Tuple[str, Optional[Dict]]:
         try:
-            payload = {"name": command_name, "arguments": arguments}
-            json_data = json.dumps(payload).encode('utf-8')
-            message = struct.pack('<i', len(json_data)) + json_data
+            message = _encode_command(command_name, arguments)
 
             with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                s.settimeout(self.connect_timeout)
                 s.connect((self.host, self.port))
+                deadline = None
+                if self.timeout is not None:
+                    deadline = time.monotonic() + self.timeout
+                    s.settimeout(self.timeout)
                 s.sendall(message)
+                traffic['sent'] = len(message)
 
                 print(f"Successfully sent command: {command_name}")
-                return self._receive_response(s)
+                response_type = codec.RESPONSE_TYPES.get(
+                    command_name) if self.typed_responses else None
+                return self._receive_response(s, traffic, response_type, deadline)
 
+        except socket.timeout:
+            print(f"Error: Command {command_name} to port {self.port} timed out.")
+            return "TimeoutError", None
         except (socket.error, OverflowError) as e:
             print(f"Network or connection error: {e}")
             return "NetworkError", None
 
-    def _receive_response(self, sock: socket.socket) -> Tuple[str, Optional[Dict]]:
+    def _receive_response(self, sock: socket.socket, traffic: Optional[Dict[str, int]] = None,
+                          response_type: Optional[type] = None, deadline: Optional[float] = None) -> Tuple[str, Any]:
         """
         Handles receiving the response from the server.
         Format: 4 bytes status code | 4 bytes body length | JSON body (variable)
         
         Returns (status_code_name, response_body_dict_or_None).
         status_code_name is the name of the StatusCode enum or an error name for parsing failures.
+        If traffic is given, the number of bytes read is added to traffic['received'].
+        If response_type is given, the body is decoded into it (see codec.decode_typed).
+        If deadline (a time.monotonic() value) is given, socket.timeout is raised once it passes.
         """
+        if traffic is None:
+            traffic = {'received': 0}
         try:
             # Protocol uses little-endian ('<') 4-byte integers ('i')
-            header = self._recv_n(sock, 8)
+            header = self._recv_n(sock, 8, deadline)
+            traffic['received'] += len(header)
             status_int, body_length = struct.unpack('<ii', header)
 
         except ConnectionResetError as e:
@@ -78,24 +154,19 @@ class RemoteCommander:
             print("Error: Failed to unpack response header (corrupt data).")
             return "ParseError", None
 
-        try:
-            status_code = StatusCode(status_int)
-        except ValueError:
-            print(f"Error: Server returned unknown status code: {status_int}")
+        status_code = _parse_status(status_int)
+        if status_code is None:
             return f"UnknownStatus_{status_int}", None
 
-        data = None
+        if body_length > self.max_body_size:
+            print(
+                f"Error: Received body length ({body_length}) is larger than the limit ({self.max_body_size}).")
+            return f"{status_code.name}_OverflowError", None
+
         if body_length > 0:
             try:
-                json_body = self._recv_n(sock, body_length)
-                body_str = json_body.decode('utf-8', errors='ignore')
-                try:
-                    data = json.loads(body_str)
-                except json.JSONDecodeError:
-                    print(
-                        "Error: Successfully received response, but failed to parse JSON body.")
-                    return f"{status_code.name}_JsonParseError", data
-
+                json_body = self._recv_n(sock, body_length, deadline)
+                traffic['received'] += len(json_body)
             except ConnectionResetError as e:
                 print(f"Error: Connection reset during body read. {e}")
                 return f"{status_code.name}_ConnectionError", None
@@ -103,24 +174,274 @@ class RemoteCommander:
                 print(
                     f"Error: Received body length ({body_length}) is too large.")
                 return f"{status_code.name}_OverflowError", None
+            return _parse_body(status_code, json_body, response_type)
 
-        # Return the status code name and the data (which may be None for errors)
-        print(
-            f"Server returned status code {status_code.value} ({status_code.name}).")
-        if data is not None and status_code != StatusCode.Success:
-            print(f"Error body: {data}")
-        return status_code.name, data
+        return _parse_body(status_code, None)
 
-    def _recv_n(self, sock: socket.socket, n: int) -> bytes:
+    def _recv_n(self, sock: socket.socket, n: int, deadline: Optional[float] = None) -> bytearray:
         """
         Helper to ensure exactly N bytes are received, handling partial reads.
-        Raises ConnectionResetError if the connection closes prematurely.
+        Reads straight into one preallocated buffer so large bodies aren't copied per chunk.
+        Raises ConnectionResetError if the connection closes prematurely,
+        and socket.timeout if deadline passes first.
         """
-        data = b''
-        while len(data) < n:
-            chunk = sock.recv(n - len(data))
-            if not chunk:
+        data = bytearray(n)
+        view = memoryview(data)
+        received = 0
+        while received < n:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout("timed out")
+                sock.settimeout(remaining)
+            count = sock.recv_into(view[received:], n - received)
+            if not count:
                 raise ConnectionResetError(
                     "Connection closed unexpectedly before full message was received.")
-            data += chunk
+            received += count
         return data
+
+
+def _encode_command(command_name: str, arguments: List[str]) -> bytes:
+    """
+    Serializes a CommandMessage with its 4-byte little-endian length prefix.
+    """
+    payload = {"name": command_name, "arguments": arguments}
+    json_data = codec.dumps(payload)
+    return struct.pack('<i', len(json_data)) + json_data
+
+
+def _parse_status(status_int: int) -> Optional[StatusCode]:
+    """
+    Converts the raw status integer from a response header into a StatusCode.
+    Returns None (after logging) if the server sent a code we don't know.
+    """
+    try:
+        return StatusCode(status_int)
+    except ValueError:
+        print(f"Error: Server returned unknown status code: {status_int}")
+        return None
+
+
+def _decode_body(json_body: bytes, response_type: Optional[type]) -> Any:
+    if response_type is not None:
+        return codec.decode_typed(response_type, json_body)
+    return codec.loads(json_body)
+
+
+def _parse_body(status_code: StatusCode, json_body: Optional[bytes],
+                response_type: Optional[type] = None) -> Tuple[str, Any]:
+    """
+    Decodes the JSON body of a response (if any) and builds the
+    (status_code_name, response_body_dict_or_None) result tuple.
+    """
+    data = None
+    if json_body:
+        try:
+            try:
+                data = _decode_body(json_body, response_type)
+            except codec.DECODE_ERRORS:
+                # the server only sends UTF-8, but don't fail the whole response over a bad byte
+                data = _decode_body(bytes(json_body).decode(
+                    'utf-8', errors='ignore').encode('utf-8'), response_type)
+        except codec.DECODE_ERRORS:
+            print(
+                "Error: Successfully received response, but failed to parse JSON body.")
+            return f"{status_code.name}_JsonParseError", data
+
+    # Return the status code name and the data (which may be None for errors)
+    print(
+        f"Server returned status code {status_code.value} ({status_code.name}).")
+    if data is not None and status_code != StatusCode.Success:
+        print(f"Error body: {data}")
+    return status_code.name, data
+
+
+class AsyncRemoteCommander:
+    """
+    Asyncio counterpart of RemoteCommander.
+
+    Keeps a small pool of persistent connections to one game server and
+    pipelines commands over them: requests are written back to back and the
+    responses are matched up in order as they arrive. If the game server
+    restarts (or the connection drops for any other reason) the commands that
+    were waiting get an error result and the next command reconnects.
+
+    send_command returns the same (status_code_name, response_body_dict_or_None)
+    tuples as RemoteCommander, so the functions in server_commands can be
+    awaited with this class in place of RemoteCommander.
+    """
+
+    def __init__(self, host: str, port: int, pool_size: int = 1, timeout: Optional[float] = 10.0,
+                 max_body_size: int = DEFAULT_MAX_BODY_SIZE, typed_responses: bool = False):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.typed_responses = typed_responses
+        self._connections = [_PipelinedConnection(host, port, timeout, max_body_size)
+                             for _ in range(max(1, pool_size))]
+        self._next_connection = 0
+
+    async def send_command(self, command_name: str, arguments: List[str] = [],
+                           gated: bool = True) -> Tuple[str, Optional[Dict]]:
+        """
+        Sends a command over one of the pooled connections and waits for its response.
+        gated=False skips command_gates, for health probes of a server that is marked down.
+        """
+        connection = self._connections[self._next_connection]
+        self._next_connection = (
+            self._next_connection + 1) % len(self._connections)
+
+        started = time.perf_counter()
+        refused = _check_gates(self.port, command_name) if gated else None
+        if refused is not None:
+            _notify_observers(self.port, command_name, refused, time.perf_counter() - started, 0, 0)
+            return refused, None
+        message = _encode_command(command_name, arguments)
+        response_type = codec.RESPONSE_TYPES.get(
+            command_name) if self.typed_responses else None
+        result, bytes_received = await connection.send(command_name, message, response_type)
+        _notify_observers(self.port, command_name, result[0], time.perf_counter() - started,
+                          len(message), bytes_received)
+        return result
+
+    async def send_commands(self, commands: Sequence[Tuple[str, List[str]]]) -> List[Tuple[str, Optional[Dict]]]:
+        """
+        Pipelines several (command_name, arguments) pairs and returns their
+        results in the same order.
+        """
+        return list(await asyncio.gather(
+            *(self.send_command(name, list(arguments)) for name, arguments in commands)))
+
+    async def close(self):
+        """Closes all pooled connections."""
+        for connection in self._connections:
+            await connection.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+
+class _PipelinedConnection:
+    """
+    A single persistent connection used by AsyncRemoteCommander.
+    Responses arrive in the order requests were written, so every request
+    queues a future that the reader task resolves with the next response
+    (as a (result, bytes_received) pair).
+    """
+
+    def __init__(self, host: str, port: int, timeout: Optional[float], max_body_size: int):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.max_body_size = max_body_size
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Deque[Tuple[asyncio.Future, Optional[type]]] = collections.deque()
+        self._lock = asyncio.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    async def send(self, command_name: str, message: bytes,
+                   response_type: Optional[type] = None) -> Tuple[Tuple[str, Any], int]:
+        """Sends one command and returns (result, bytes_received)."""
+        async with self._lock:
+            if not self.connected:
+                try:
+                    await self._connect()
+                except (OSError, asyncio.TimeoutError) as e:
+                    print(f"Network or connection error: {e}")
+                    return ("NetworkError", None), 0
+
+            future = asyncio.get_running_loop().create_future()
+            self._pending.append((future, response_type))
+            try:
+                self._writer.write(message)
+                await self._writer.drain()
+            except OSError as e:
+                print(f"Network or connection error: {e}")
+                self._reset(("NetworkError", None))
+                return ("NetworkError", None), 0
+
+        print(f"Successfully sent command: {command_name}")
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            # A late response would be matched to the wrong request, so the
+            # connection can't be reused once a response goes missing.
+            print(f"Error: Timed out waiting for response to {command_name}.")
+            self._reset(("TimeoutError", None))
+            return ("TimeoutError", None), 0
+
+    async def close(self):
+        self._reset(("ConnectionError", None))
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            self._reader_task = None
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        self._reader_task = asyncio.create_task(
+            self._read_loop(self._reader))
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                header = await reader.readexactly(8)
+                status_int, body_length = struct.unpack('<ii', header)
+                if body_length > self.max_body_size:
+                    # the rest of the stream can't be trusted after a bad header
+                    print(
+                        f"Error: Received body length ({body_length}) is larger than the limit ({self.max_body_size}).")
+                    status_code = _parse_status(status_int)
+                    name = status_code.name if status_code is not None else f"UnknownStatus_{status_int}"
+                    if self._pending and not self._pending[0][0].done():
+                        self._pending.popleft()[0].set_result(
+                            ((f"{name}_OverflowError", None), len(header)))
+                    break
+                body = await reader.readexactly(body_length) if body_length > 0 else None
+
+                if not self._pending:
+                    print("Error: Received a response with no command waiting for it.")
+                    break
+                future, response_type = self._pending.popleft()
+                if future.done():
+                    continue
+
+                bytes_received = len(header) + max(0, body_length)
+                status_code = _parse_status(status_int)
+                if status_code is None:
+                    future.set_result(
+                        ((f"UnknownStatus_{status_int}", None), bytes_received))
+                else:
+                    future.set_result(
+                        (_parse_body(status_code, body, response_type), bytes_received))
+        except asyncio.IncompleteReadError:
+            if self._pending:
+                print("Error: Connection closed before all responses were received.")
+        except (OSError, ValueError) as e:
+            print(f"Error: Connection failed while reading responses. {e}")
+        except asyncio.CancelledError:
+            return
+        if reader is self._reader:
+            self._reset(("ConnectionError", None))
+
+    def _reset(self, result: Tuple[str, Optional[Dict]]):
+        """Drops the connection and fails every command still waiting on it."""
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = None
+        self._writer = None
+        while self._pending:
+            future, _ = self._pending.popleft()
+            if not future.done():
+                future.set_result((result, 0))
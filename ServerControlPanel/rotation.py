@@ -0,0 +1,354 @@
+"""
+Automatic mission rotation from playlists.
+
+Instead of polling every server, the engine reads a server's
+get-mission-time once, works out when the mission ends and puts two timers
+on a TimerWheel: one shortly before the end that picks the next mission from
+the server's playlist and sends set-next-mission, and one just after the end
+that reads the time of the new mission. The only reads are one to check the
+estimate before picking and one per new mission. Status samples from the
+background poller, and set-time-remaining / update-ready / reload-config
+sent through the panel, move the timers when the estimate has drifted.
+"""
+
+import json
+import math
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from timer_wheel import Timer, TimerWheel
+
+Result = Tuple[str, Optional[Dict]]
+
+PLAYLIST_MODES = ("weighted", "sequence")
+
+# Seconds after the estimated end of a mission before the new one is read
+SYNC_GRACE = 30
+# Seconds before trying again when a server didn't answer
+RETRY_INTERVAL = 60
+# Seconds between checks of an empty server, whose mission clock doesn't run
+IDLE_RECHECK = 300
+
+# Commands that change when the current mission ends
+RESYNC_AFTER = ("set-time-remaining", "update-ready", "reload-config")
+
+
+class Playlist:
+    """
+    Missions a server rotates through. Each mission is a dict with group, name
+    and max_time, and optionally weight (default 1), hours ([start, end) local
+    hours it may be picked in, may wrap past midnight) and min_players /
+    max_players. mode "weighted" picks randomly by weight, "sequence" takes
+    the missions in order; both skip the missions that don't fit right now.
+    """
+
+    def __init__(self, name: str, missions: List[Dict], mode: str = "weighted"):
+        if mode not in PLAYLIST_MODES:
+            raise ValueError(f"Playlist {name}: unknown mode '{mode}', expected one of {', '.join(PLAYLIST_MODES)}.")
+        if not isinstance(missions, list) or not missions:
+            raise ValueError(f"Playlist {name} has no missions.")
+        self.name = name
+        self.missions = [self._check_mission(name, mission) for mission in missions]
+        self.mode = mode
+
+    @staticmethod
+    def _check_mission(name: str, mission: Dict) -> Dict:
+        """Returns a copy of mission with its numbers parsed. Raises ValueError if a field is invalid."""
+        if not isinstance(mission, dict) or not mission.get('group') or not mission.get('name'):
+            raise ValueError(f"Playlist {name}: every mission needs a group and a name.")
+        label = f"Playlist {name}: mission {mission['name']}"
+        checked = dict(mission)
+        try:
+            checked['max_time'] = float(mission.get('max_time', 0))
+            checked['weight'] = float(mission.get('weight', 1))
+        except (TypeError, ValueError):
+            checked['max_time'] = checked['weight'] = -1.0
+        # written so NaN fails too
+        if not 0 < checked['max_time'] < math.inf or not 0 <= checked['weight'] < math.inf:
+            raise ValueError(f"{label} needs a positive max_time and weight.")
+        hours = mission.get('hours')
+        if hours is not None:
+            if not isinstance(hours, list) or len(hours) != 2 or hours[0] == hours[1] \
+                    or not all(isinstance(hour, int) and not isinstance(hour, bool) and 0 <= hour <= 24
+                               for hour in hours):
+                raise ValueError(f"{label}: hours must be [start, end], two different whole hours from 0 to 24.")
+        for key in ('min_players', 'max_players'):
+            value = mission.get(key)
+            if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value < 0):
+                raise ValueError(f"{label}: {key} must be a whole number of at least 0.")
+        if mission.get('max_players') is not None and mission.get('max_players') < mission.get('min_players', 0):
+            raise ValueError(f"{label}: max_players is less than min_players.")
+        return checked
+
+    @staticmethod
+    def fits(mission: Dict, hour: int, players: int) -> bool:
+        hours = mission.get('hours')
+        if hours:
+            start, end = hours
+            if not (start <= hour < end if start <= end else hour >= start or hour < end):
+                return False
+        if players < mission.get('min_players', 0):
+            return False
+        max_players = mission.get('max_players')
+        return max_players is None or players <= max_players
+
+    def choose(self, hour: int, players: int, previous: Optional[int] = None) -> Optional[int]:
+        """Returns the index of the next mission, or None if none fits."""
+        eligible = [index for index, mission in enumerate(self.missions) if self.fits(mission, hour, players)]
+        if not eligible:
+            return None
+        if self.mode == "sequence":
+            start = -1 if previous is None else previous
+            return min(eligible, key=lambda index: (index - start - 1) % len(self.missions))
+        if len(eligible) > 1 and previous in eligible:
+            # don't play the same mission twice in a row when there is a choice
+            eligible.remove(previous)
+        weights = [float(self.missions[index].get('weight', 1)) for index in eligible]
+        if not any(weights):
+            return random.choice(eligible)
+        return random.choices(eligible, weights)[0]
+
+
+def load_rotation(path: str) -> Tuple[Dict[str, Playlist], Dict[str, str]]:
+    """
+    Reads {"playlists": {name: {"mode": ..., "missions": [...]}}, "servers": {port or "*": name}}.
+    Raises ValueError if the file is missing or invalid.
+    """
+    try:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Could not read rotation file {path}: {e}")
+    if not isinstance(data, dict) or not isinstance(data.get('playlists', {}), dict) \
+            or not isinstance(data.get('servers', {}), dict) \
+            or not all(isinstance(playlist, dict) for playlist in data.get('playlists', {}).values()):
+        raise ValueError(f"Rotation file {path} must hold an object with playlists and servers objects.")
+    playlists = {name: Playlist(name, playlist.get('missions', []), playlist.get('mode', 'weighted'))
+                 for name, playlist in data.get('playlists', {}).items()}
+    servers = {str(port): name for port, name in data.get('servers', {}).items()}
+    for port, name in servers.items():
+        if name not in playlists:
+            raise ValueError(f"Server {port} uses unknown playlist {name}.")
+    return playlists, servers
+
+
+class _ServerRotation:
+    def __init__(self, playlist: Playlist):
+        self.playlist = playlist
+        self.state = "starting"
+        self.end: Optional[float] = None
+        self.timer: Optional[Timer] = None
+        self.next_action: Optional[str] = None
+        self.previous: Optional[int] = None
+        self.last_choice: Optional[Dict] = None
+        # end (monotonic) of the mission whose next mission was already set, by us or by hand
+        self.next_set_for: Optional[float] = None
+        self.set_by_hand = False
+        self.sending = False
+        self.last_sync: Optional[float] = None
+
+
+class RotationEngine:
+    """
+    Rotates missions on every port that has a playlist. send(port, name, arguments)
+    sends a remote command, player_count(port) returns the last known number of
+    players. set-next-mission goes out lead seconds before a mission ends, and a
+    mission clock more than drift_tolerance seconds off the estimate is resynced.
+    """
+
+    def __init__(self, wheel: TimerWheel, send: Callable[[int, str, List[str]], Result],
+                 player_count: Callable[[int], int], lead: float = 60, drift_tolerance: float = 10):
+        self.wheel = wheel
+        self.send = send
+        self.player_count = player_count
+        self.lead = lead
+        self.drift_tolerance = drift_tolerance
+        self._servers: Dict[int, _ServerRotation] = {}
+        self._lock = threading.Lock()
+
+    def load(self, playlists: Dict[str, Playlist], servers: Dict[str, str], ports: List[int]):
+        """(Re)assigns playlists to ports ("*" for every other port) and resyncs every port."""
+        with self._lock:
+            for rotation in self._servers.values():
+                if rotation.timer is not None:
+                    rotation.timer.cancel()
+            self._servers = {}
+            for port in ports:
+                name = servers.get(str(port), servers.get("*"))
+                if name is not None:
+                    self._servers[port] = _ServerRotation(playlists[name])
+            # spread the first reads out instead of hitting every server in the same tick
+            for index, port in enumerate(self._servers):
+                self._schedule(port, self._servers[port], index % 10, "sync")
+        self.wheel.start()
+
+    def _schedule(self, port: int, rotation: _ServerRotation, delay: float, action: str):
+        """Replaces the port's pending timer. Call with the lock held."""
+        if rotation.timer is not None:
+            rotation.timer.cancel()
+        rotation.next_action = action
+        callback = self._sync if action == "sync" else self._set_next
+        rotation.timer = self.wheel.schedule(delay, self._guarded, callback, port, rotation)
+
+    def _guarded(self, callback: Callable[[int, _ServerRotation], None], port: int, rotation: _ServerRotation):
+        """Runs a timer's callback, and reads the clock again later if it failed so the rotation never stops."""
+        try:
+            callback(port, rotation)
+        except Exception as e:
+            print(f"Port {port}: Rotation failed, retrying later. {e}")
+            with self._lock:
+                rotation.sending = False
+                if self._servers.get(port) is rotation:
+                    rotation.state = "error"
+                    self._schedule(port, rotation, RETRY_INTERVAL, "sync")
+
+    def _plan(self, port: int, rotation: _ServerRotation, current_time: float, max_time: float):
+        """Schedules the next step from a mission clock reading. Call with the lock held."""
+        rotation.last_sync = time.time()
+        if max_time <= 0:
+            # the game reports 0 for both times while nobody is playing
+            rotation.state = "idle"
+            rotation.end = None
+            self._schedule(port, rotation, IDLE_RECHECK, "sync")
+            return
+        now = time.monotonic()
+        # the clock of the same mission moved (e.g. set-time-remaining): the next mission stays set
+        keep_next = rotation.end is not None and now < rotation.end and rotation.next_set_for == rotation.end
+        rotation.state = "running"
+        rotation.end = now + max(0.0, max_time - current_time)
+        if keep_next:
+            rotation.next_set_for = rotation.end
+        if rotation.next_set_for is not None and abs(rotation.next_set_for - rotation.end) <= self.drift_tolerance:
+            self._schedule(port, rotation, rotation.end - now + SYNC_GRACE, "sync")
+        else:
+            rotation.set_by_hand = False
+            self._schedule(port, rotation, rotation.end - now - self.lead, "set-next")
+
+    def _read_clock(self, port: int, rotation: _ServerRotation) -> Optional[Tuple[float, float]]:
+        status_code, response = self.send(port, "get-mission-time", [])
+        if status_code != "Success" or not response:
+            print(f"Port {port}: Rotation could not read the mission time ({status_code}), retrying later.")
+            with self._lock:
+                if self._servers.get(port) is rotation:
+                    rotation.state = "unreachable"
+                    self._schedule(port, rotation, RETRY_INTERVAL, "sync")
+            return None
+        return float(response.get('currentTime', 0)), float(response.get('maxTime', 0))
+
+    def _sync(self, port: int, rotation: _ServerRotation):
+        clock = self._read_clock(port, rotation)
+        if clock is None:
+            return
+        with self._lock:
+            if self._servers.get(port) is rotation:
+                self._plan(port, rotation, *clock)
+
+    def _set_next(self, port: int, rotation: _ServerRotation):
+        clock = self._read_clock(port, rotation)
+        if clock is None:
+            return
+        # may send a command itself, so not under the lock
+        players = self.player_count(port)
+        with self._lock:
+            if self._servers.get(port) is not rotation:
+                return
+            end = rotation.end
+            self._plan(port, rotation, *clock)
+            if rotation.next_action != "set-next" or end is None \
+                    or abs(rotation.end - end) > self.drift_tolerance:
+                # idle, or the clock moved since the estimate: _plan already rescheduled
+                return
+            if rotation.end - time.monotonic() > self.lead + self.wheel.tick:
+                return
+            index = rotation.playlist.choose(time.localtime().tm_hour, players, rotation.previous)
+            if index is None:
+                print(f"Port {port}: No mission in playlist {rotation.playlist.name} fits right now.")
+                rotation.next_set_for = rotation.end
+                self._schedule(port, rotation, rotation.end - time.monotonic() + SYNC_GRACE, "sync")
+                return
+            mission = rotation.playlist.missions[index]
+            rotation.sending = True
+
+        status_code, _ = self.send(port, "set-next-mission",
+                                   [mission['group'], mission['name'], str(float(mission['max_time']))])
+        with self._lock:
+            rotation.sending = False
+            if self._servers.get(port) is not rotation:
+                return
+            if status_code == "Success":
+                print(f"Port {port}: Next mission set to {mission['group']}/{mission['name']}.")
+                rotation.previous = index
+                rotation.last_choice = dict(mission, time=time.time())
+                rotation.next_set_for = rotation.end
+                self._schedule(port, rotation, rotation.end - time.monotonic() + SYNC_GRACE, "sync")
+            else:
+                print(f"Port {port}: set-next-mission failed with status: {status_code}")
+                self._schedule(port, rotation, min(RETRY_INTERVAL, max(1, rotation.end - time.monotonic())), "set-next")
+
+    def on_status(self, port: int, sample: Dict[str, Result]):
+        """StatusPoller listener, replans a port when its mission clock drifted from the estimate."""
+        status_code, response = sample.get("get-mission-time", ("", None))
+        if status_code != "Success" or not response:
+            return
+        current_time = float(response.get('currentTime', 0))
+        max_time = float(response.get('maxTime', 0))
+        with self._lock:
+            rotation = self._servers.get(port)
+            if rotation is None or rotation.sending:
+                return
+            if max_time <= 0:
+                drifted = rotation.state == "running"
+            elif rotation.end is None:
+                drifted = True
+            else:
+                drifted = abs(time.monotonic() + max_time - current_time - rotation.end) > self.drift_tolerance
+            if drifted:
+                self._plan(port, rotation, current_time, max_time)
+
+    def observe_command(self, port: int, command_name: str, status_name: str, seconds: float,
+                        bytes_sent: int, bytes_received: int):
+        """
+        remote_commander.command_observers callback. Resyncs a port after commands
+        that move its mission clock, and leaves a next mission set by hand alone.
+        """
+        if status_name != "Success":
+            return
+        with self._lock:
+            rotation = self._servers.get(port)
+            if rotation is None:
+                return
+            if command_name in RESYNC_AFTER:
+                self._schedule(port, rotation, 0, "sync")
+            elif command_name == "set-next-mission" and not rotation.sending:
+                print(f"Port {port}: Next mission was set by hand, rotation skips this one.")
+                rotation.set_by_hand = True
+                rotation.next_set_for = rotation.end
+                if rotation.end is not None and rotation.next_action == "set-next":
+                    self._schedule(port, rotation, rotation.end - time.monotonic() + SYNC_GRACE, "sync")
+
+    def resync(self, port: int) -> bool:
+        """Reads the port's mission clock again right away. Returns False if it has no playlist."""
+        with self._lock:
+            rotation = self._servers.get(port)
+            if rotation is None:
+                return False
+            self._schedule(port, rotation, 0, "sync")
+            return True
+
+    def status(self) -> Dict[str, Dict]:
+        """Rotation state of every port with a playlist. Times are Unix timestamps."""
+        offset = time.time() - time.monotonic()
+        with self._lock:
+            return {str(port): {
+                'playlist': rotation.playlist.name,
+                'state': rotation.state,
+                'mission_end': rotation.end + offset if rotation.end is not None else None,
+                'next_action': rotation.next_action,
+                'next_action_at': rotation.timer.due + offset if rotation.timer is not None else None,
+                'next_mission_set': rotation.end is not None and rotation.next_set_for == rotation.end,
+                'set_by_hand': rotation.set_by_hand,
+                'last_choice': rotation.last_choice,
+                'last_sync': rotation.last_sync,
+            } for port, rotation in self._servers.items()}
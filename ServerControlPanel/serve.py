@@ -0,0 +1,85 @@
+"""
+Production server for the control panel.
+
+Runs app.py under gunicorn instead of Flask's development server: one worker
+process (the status cache, poller, player events and ban sync jobs live in
+memory, so they must not be split across processes) with a pool of
+config.SERVER_THREADS request threads. A game server that stops answering
+only holds the threads of the requests waiting on it, and only for
+config.COMMAND_TIMEOUT seconds. TLS uses SSL_CERT_PATH/SSL_KEY_PATH like app.py.
+
+Usage: python serve.py [--bind HOST:PORT] [--threads N]
+"""
+
+import argparse
+
+from gunicorn.app.base import BaseApplication
+
+import config
+
+
+class PanelServer(BaseApplication):
+    """Embedded gunicorn application serving app.app."""
+
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # imported in the worker so the poller's thread runs in the process serving requests
+        from app import app, broadcast_scheduler, rotation_engine, start_rotation, status_poller
+        status_poller.start()
+        if rotation_engine is not None:
+            start_rotation()
+        if broadcast_scheduler is not None:
+            broadcast_scheduler.start()
+        return app
+
+
+def server_options(bind: str, threads: int) -> dict:
+    """gunicorn settings for the panel."""
+    options = {
+        'bind': bind,
+        'workers': 1,
+        'worker_class': 'gthread',
+        'threads': threads,
+        # live status and player event streams stay open, idle keep-alive connections don't need to
+        'keepalive': 5,
+        'graceful_timeout': 10,
+        'accesslog': '-',
+    }
+    if config.SSL_CERT_PATH and config.SSL_KEY_PATH:
+        options['certfile'] = config.SSL_CERT_PATH
+        options['keyfile'] = config.SSL_KEY_PATH
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bind', default=f"{config.FLASK_HOST}:{config.FLASK_PORT}",
+                        help="address to listen on (default: FLASK_HOST:FLASK_PORT from config.py)")
+    parser.add_argument('--threads', type=int, default=config.SERVER_THREADS,
+                        help="request handler threads (default: SERVER_THREADS from config.py)")
+    parser.add_argument('--quiet', action='store_true', help="don't log every request")
+    args = parser.parse_args()
+
+    if config.ROTATION_PATH:
+        from rotation import load_rotation
+        try:
+            load_rotation(config.ROTATION_PATH)
+        except ValueError as e:
+            print(f"Error: {e}")
+            raise SystemExit(1)
+
+    options = server_options(args.bind, args.threads)
+    if args.quiet:
+        options['accesslog'] = None
+    PanelServer(options).run()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Short-lived cache for the read-only status commands.
+
+Concurrent requests for the same (port, command) share one in-flight fetch,
+so any number of dashboards waiting on a cold entry cause a single call to
+the game server.
+"""
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# Read commands whose results are cached
+CACHED_COMMANDS = ("get-player-list", "get-mission", "get-mission-time")
+
+# Which cached reads each write command makes stale
+INVALIDATED_BY = {
+    "kick-player": ("get-player-list",),
+    "banlist-add": ("get-player-list",),
+    "banlist-remove": ("get-player-list",),
+    "banlist-reload": ("get-player-list",),
+    "banlist-clear": ("get-player-list",),
+    "set-next-mission": ("get-mission",),
+    "set-time-remaining": ("get-mission-time",),
+    "reload-config": CACHED_COMMANDS,
+    "update-ready": CACHED_COMMANDS,
+}
+
+Result = Tuple[str, Optional[Dict]]
+
+
+class StatusCache:
+    """
+    Caches successful results of read commands per (port, command) for a
+    configurable TTL and coalesces concurrent fetches of the same entry.
+    """
+
+    def __init__(self, ttls: Dict[str, float]):
+        self.ttls = ttls
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[int, str], Tuple[float, Result]] = {}
+        self._in_flight: Dict[Tuple[int, str], Future] = {}
+        # bumped on invalidation so a fetch that started before it isn't cached
+        self._generations: Dict[Tuple[int, str], int] = {}
+
+    def get(self, port: int, command_name: str, fetch: Callable[[], Result]) -> Result:
+        """
+        Returns the cached result for command_name on port, calling fetch()
+        if it is missing or expired. Only one fetch per entry runs at a time;
+        other callers wait for its result.
+        """
+        key = (port, command_name)
+        ttl = self.ttls.get(command_name, 0)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] < ttl:
+                return entry[1]
+
+            future = self._in_flight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._in_flight[key] = future
+                generation = self._generations.get(key, 0)
+
+        if not is_owner:
+            return future.result()
+
+        try:
+            result = fetch()
+        except BaseException as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._in_flight.pop(key, None)
+            if result[0] == "Success" and ttl > 0 and self._generations.get(key, 0) == generation:
+                self._entries[key] = (time.monotonic(), result)
+        future.set_result(result)
+        return result
+
+    def put(self, port: int, command_name: str, result: Result):
+        """Stores a result fetched elsewhere (e.g. by a background poller)."""
+        if result[0] != "Success":
+            return
+        with self._lock:
+            self._entries[(port, command_name)] = (time.monotonic(), result)
+
+    def invalidate(self, port: int, command_names: Iterable[str] = CACHED_COMMANDS):
+        """Drops the cached entries for command_names on port."""
+        with self._lock:
+            for command_name in command_names:
+                key = (port, command_name)
+                self._entries.pop(key, None)
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def invalidate_after(self, port: int, write_command: str):
+        """Drops whatever cached reads write_command makes stale on port."""
+        affected = INVALIDATED_BY.get(write_command)
+        if affected:
+            self.invalidate(port, affected)
@@ -0,0 +1,238 @@
+"""
+Embedded SQLite time-series store for server telemetry.
+
+Every poll of a server is stored as a raw sample and folded straight into
+1-minute and 1-hour rollups, so old raw samples can be dropped while long
+range queries are answered from the small rollup tables. Completed mission
+rounds are recorded separately to answer questions like "how long do
+Escalation rounds really run".
+"""
+
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Rollup tables and their bucket size in seconds
+ROLLUPS = {
+    '1m': ('rollup_1m', 60),
+    '1h': ('rollup_1h', 3600),
+}
+
+# Ranges up to this long (in seconds) are answered from the finer table when no resolution is given
+AUTO_RAW_MAX_RANGE = 6 * 3600
+AUTO_1M_MAX_RANGE = 7 * 24 * 3600
+
+# How often old rows are pruned, in seconds
+PRUNE_INTERVAL = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples_raw (
+    port INTEGER NOT NULL,
+    time REAL NOT NULL,
+    players INTEGER NOT NULL,
+    mission TEXT,
+    mission_time REAL,
+    max_time REAL
+);
+CREATE INDEX IF NOT EXISTS samples_raw_port_time ON samples_raw (port, time);
+CREATE INDEX IF NOT EXISTS samples_raw_time ON samples_raw (time);
+
+CREATE TABLE IF NOT EXISTS rounds (
+    port INTEGER NOT NULL,
+    mission TEXT,
+    started REAL NOT NULL,
+    ended REAL NOT NULL,
+    duration REAL NOT NULL,
+    max_time REAL
+);
+CREATE INDEX IF NOT EXISTS rounds_mission_started ON rounds (mission, started);
+CREATE INDEX IF NOT EXISTS rounds_started ON rounds (started);
+"""
+
+_ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS {table} (
+    port INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    samples INTEGER NOT NULL,
+    players_sum INTEGER NOT NULL,
+    players_min INTEGER NOT NULL,
+    players_max INTEGER NOT NULL,
+    mission TEXT,
+    PRIMARY KEY (port, bucket)
+) WITHOUT ROWID;
+"""
+
+_ROLLUP_UPSERT = """
+INSERT INTO {table} (port, bucket, samples, players_sum, players_min, players_max, mission)
+VALUES (?, ?, 1, ?, ?, ?, ?)
+ON CONFLICT (port, bucket) DO UPDATE SET
+    samples = samples + 1,
+    players_sum = players_sum + excluded.players_sum,
+    players_min = min(players_min, excluded.players_min),
+    players_max = max(players_max, excluded.players_max),
+    mission = coalesce(excluded.mission, mission)
+"""
+
+
+def mission_name(response: Optional[Dict]) -> Optional[str]:
+    """Returns "Group/Name" of the current mission from a get-mission response."""
+    try:
+        key = response['currentMission']['Key']
+        return f"{key['Group']}/{key['Name']}"
+    except (KeyError, TypeError):
+        return None
+
+
+class TelemetryStore:
+    """
+    Stores samples in SQLite and serves range queries from the raw table or
+    the rollups depending on the requested resolution.
+
+    retention is a dict of table resolution ('raw', '1m', '1h') -> seconds to keep.
+    """
+
+    def __init__(self, path: str, retention: Dict[str, float]):
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.executescript(_SCHEMA)
+            for table, _ in ROLLUPS.values():
+                self._db.executescript(_ROLLUP_SCHEMA.format(table=table))
+        # port -> (mission, started, last mission_time, max_time) of the round in progress
+        self._rounds: Dict[int, Tuple[Optional[str], float, float, float]] = {}
+        self._last_prune = 0.0
+
+    def on_status(self, port: int, sample: Dict[str, Tuple[str, Optional[Dict]]]):
+        """StatusPoller listener that records a sample whenever the player list was fetched."""
+        status_code, players = sample.get("get-player-list", ("", None))
+        if status_code != "Success" or players is None:
+            return
+
+        mission = None
+        status_code, response = sample.get("get-mission", ("", None))
+        if status_code == "Success":
+            mission = mission_name(response)
+
+        mission_time = max_time = None
+        status_code, response = sample.get("get-mission-time", ("", None))
+        if status_code == "Success" and response:
+            mission_time = response.get('currentTime')
+            max_time = response.get('maxTime')
+
+        self.record(port, time.time(), len(players.get('Players', [])),
+                    mission, mission_time, max_time)
+
+    def record(self, port: int, timestamp: float, players: int, mission: Optional[str],
+               mission_time: Optional[float], max_time: Optional[float]):
+        """Stores one sample and updates the rollups and rounds."""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO samples_raw (port, time, players, mission, mission_time, max_time) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (port, timestamp, players, mission, mission_time, max_time))
+            for table, bucket_size in ROLLUPS.values():
+                bucket = int(timestamp // bucket_size) * bucket_size
+                self._db.execute(_ROLLUP_UPSERT.format(table=table),
+                                 (port, bucket, players, players, players, mission))
+            if mission_time is not None:
+                self._track_round(port, timestamp, mission,
+                                  mission_time, max_time or 0)
+
+            if timestamp - self._last_prune >= PRUNE_INTERVAL:
+                self._prune(timestamp)
+                self._last_prune = timestamp
+
+    def _track_round(self, port: int, timestamp: float, mission: Optional[str], mission_time: float, max_time: float):
+        """
+        Closes the current round when the mission changes, the clock goes back or the server empties.
+        A sample whose mission couldn't be read (None) counts as the current mission, and doesn't start a round.
+        """
+        current = self._rounds.get(port)
+        if mission is None:
+            if current is None:
+                return
+            mission = current[0]
+        if current is not None:
+            current_mission, started, last_time, current_max = current
+            if mission != current_mission or mission_time < last_time or max_time == 0:
+                self._db.execute(
+                    "INSERT INTO rounds (port, mission, started, ended, duration, max_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (port, current_mission, started, timestamp, last_time, current_max))
+                current = None
+
+        if max_time == 0:
+            self._rounds.pop(port, None)
+        elif current is None:
+            self._rounds[port] = (mission, timestamp -
+                                  mission_time, mission_time, max_time)
+        else:
+            self._rounds[port] = (
+                current[0], current[1], mission_time, max_time)
+
+    def _prune(self, now: float):
+        """Drops rows older than each table's retention."""
+        tables = {'raw': ('samples_raw', 'time')}
+        tables.update({resolution: (table, 'bucket')
+                      for resolution, (table, _) in ROLLUPS.items()})
+        for resolution, (table, column) in tables.items():
+            keep = self.retention.get(resolution)
+            if keep:
+                self._db.execute(
+                    f"DELETE FROM {table} WHERE {column} < ?", (now - keep,))
+
+    def query(self, port: int, start: float, end: float, resolution: Optional[str] = None) -> Tuple[str, List[Dict]]:
+        """
+        Returns (resolution, points) for port between start and end.
+        resolution is 'raw', '1m' or '1h'; if None the coarsest table that
+        still gives a useful number of points is picked.
+        Rollup points have players_avg/min/max, raw points have players.
+        """
+        if resolution is None:
+            span = end - start
+            if span <= AUTO_RAW_MAX_RANGE:
+                resolution = 'raw'
+            elif span <= AUTO_1M_MAX_RANGE:
+                resolution = '1m'
+            else:
+                resolution = '1h'
+
+        with self._lock:
+            if resolution == 'raw':
+                rows = self._db.execute(
+                    "SELECT time, players, mission, mission_time, max_time FROM samples_raw "
+                    "WHERE port = ? AND time >= ? AND time <= ? ORDER BY time",
+                    (port, start, end)).fetchall()
+                return resolution, [
+                    {'time': row[0], 'players': row[1], 'mission': row[2],
+                     'mission_time': row[3], 'max_time': row[4]} for row in rows]
+
+            if resolution not in ROLLUPS:
+                raise ValueError(f"Unknown resolution: {resolution}")
+            table, bucket_size = ROLLUPS[resolution]
+            rows = self._db.execute(
+                f"SELECT bucket, samples, players_sum, players_min, players_max, mission FROM {table} "
+                "WHERE port = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket",
+                (port, int(start // bucket_size) * bucket_size, end)).fetchall()
+        return resolution, [
+            {'time': row[0], 'players_avg': row[2] / row[1], 'players_min': row[3],
+             'players_max': row[4], 'mission': row[5]} for row in rows]
+
+    def rounds(self, start: float, end: float, mission: Optional[str] = None, port: Optional[int] = None) -> List[Dict]:
+        """Returns the completed rounds that started between start and end."""
+        sql = "SELECT port, mission, started, ended, duration, max_time FROM rounds WHERE started >= ? AND started <= ?"
+        params: list = [start, end]
+        if mission is not None:
+            sql += " AND mission = ?"
+            params.append(mission)
+        if port is not None:
+            sql += " AND port = ?"
+            params.append(port)
+        with self._lock:
+            rows = self._db.execute(sql + " ORDER BY started", params).fetchall()
+        return [{'port': row[0], 'mission': row[1], 'started': row[2], 'ended': row[3],
+                 'duration': row[4], 'max_time': row[5]} for row in rows]
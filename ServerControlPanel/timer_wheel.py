@@ -0,0 +1,110 @@
+"""
+Hashed timer wheel for scheduling many one-off callbacks on one thread.
+
+Timers are dropped into one of a fixed number of slots by their due tick,
+and one thread visits a slot per tick, so scheduling and cancelling are
+O(1) and the background cost doesn't depend on how many timers are waiting
+far in the future. Callbacks run on a small thread pool so a slow one
+(e.g. a remote command to a dead server) doesn't hold up the others.
+"""
+
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+
+class Timer:
+    """A scheduled callback, returned by TimerWheel.schedule so it can be cancelled."""
+
+    __slots__ = ('due', 'callback', 'args', 'rounds', 'cancelled')
+
+    def __init__(self, due: float, callback: Callable, args: tuple, rounds: int):
+        # time.monotonic() the callback is due at (rounded up to the next tick)
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.rounds = rounds
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Runs callbacks after a delay with tick seconds of resolution. A wheel of
+    slots covers tick * slots seconds per turn; longer delays wait for more
+    turns in their slot.
+    """
+
+    def __init__(self, tick: float = 1.0, slots: int = 512, workers: int = 4):
+        self.tick = tick
+        self._slots: List[List[Timer]] = [[] for _ in range(slots)]
+        self._lock = threading.Lock()
+        self._ticks = 0
+        self._started_at = time.monotonic()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="timer-wheel")
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Starts turning the wheel. Does nothing if it is already running."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._started_at = time.monotonic() - self._ticks * self.tick
+            self._thread = threading.Thread(target=self._run, name="timer-wheel", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stops the wheel; pending timers never run."""
+        self._stop.set()
+        self._executor.shutdown(wait=False)
+
+    def schedule(self, delay: float, callback: Callable, *args) -> Timer:
+        """Calls callback(*args) in about delay seconds (at least one tick)."""
+        with self._lock:
+            ticks = max(1, math.ceil(delay / self.tick))
+            slot = (self._ticks + ticks) % len(self._slots)
+            timer = Timer(self._started_at + (self._ticks + ticks) * self.tick, callback, args,
+                          (ticks - 1) // len(self._slots))
+            self._slots[slot].append(timer)
+        return timer
+
+    def pending(self) -> int:
+        """How many timers are waiting, including cancelled ones not swept yet."""
+        with self._lock:
+            return sum(len(slot) for slot in self._slots)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # sleep to the next tick boundary so the wheel doesn't drift
+            delay = self._started_at + (self._ticks + 1) * self.tick - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                return
+            with self._lock:
+                self._ticks += 1
+                index = self._ticks % len(self._slots)
+                waiting = self._slots[index]
+                due = []
+                later = []
+                for timer in waiting:
+                    if timer.cancelled:
+                        continue
+                    if timer.rounds > 0:
+                        timer.rounds -= 1
+                        later.append(timer)
+                    else:
+                        due.append(timer)
+                self._slots[index] = later
+            for timer in due:
+                self._executor.submit(self._call, timer)
+
+    @staticmethod
+    def _call(timer: Timer):
+        try:
+            timer.callback(*timer.args)
+        except Exception as e:
+            print(f"Error: Timer callback failed. {e}")